@@ -0,0 +1,303 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import Future
+from threading import Thread, Event, get_ident
+from typing import Coroutine
+
+from ConnectionInterface import ConnectionInterface
+from Instrumentation import DeviceStatistics
+
+
+#------------------------------------------------------------------------------
+# Device Event Loop
+#------------------------------------------------------------------------------
+class DeviceEventLoop:
+    """
+    Runs a single asyncio event loop on a background thread that is shared by all the device connections.
+    The connections submit their coroutines to the loop, so that waiting for a response from one device never blocks
+    the communication with any of the other devices.
+    """
+    def __init__(self, name: str = "Device I/O Event Loop"):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._threadIdentifier = None
+
+
+    def start(self):
+        if self.isRunning():
+            return
+
+        loopStarted = Event()
+
+        def runEventLoop():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._threadIdentifier = get_ident()
+            loopStarted.set()
+            try:
+                self._loop.run_forever()
+            finally:
+                self._loop.close()
+                self._loop = None
+                self._threadIdentifier = None
+
+        self._thread = Thread(target=runEventLoop, name=self.name)
+        self._thread.daemon = True
+        self._thread.start()
+        loopStarted.wait()
+
+
+    def stop(self):
+        if not self.isRunning():
+            return
+
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        if not self.isEventLoopThread():
+            self._thread.join()
+        self._thread = None
+
+
+    def isRunning(self) -> bool:
+        return (self._thread is not None) and self._thread.is_alive()
+
+
+    def isEventLoopThread(self) -> bool:
+        return get_ident() == self._threadIdentifier
+
+
+    def submit(self, coroutine: Coroutine) -> Future:
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+
+#------------------------------------------------------------------------------
+# Asyncio LAN Connection
+#------------------------------------------------------------------------------
+class AsyncLANConnection(ConnectionInterface):
+    """
+    An implementation of the ConnectionInterface that performs all of its socket I/O on a shared DeviceEventLoop.
+    The blocking connect, sendCommand, getResponse and disconnect methods keep the contract of the LANConnection, but only block
+    the calling thread, while the non-blocking exchange method returns a Future that is completed on the event loop.
+    Timeouts are handled by the event loop, so a device that does not respond never holds up the other device channels.
+    """
+    BUFFER_SIZE = 1024
+    FLUSH_TIMEOUT = 0.005
+
+    def __init__(self, ipAddress: str, port: int, eventLoop: DeviceEventLoop, name: str = "", timeout: float = 1.000):
+        self._ipAddress = ipAddress
+        self._port = port
+        self._eventLoop = eventLoop
+        self.name = name
+        self.timeout = timeout
+
+        self._reader = None
+        self._writer = None
+        self._lock = None
+        self._flushPending = False
+
+
+    def __str__(self) -> str:
+        return self.connectionDetails()
+
+
+    def connectionDetails(self) -> str:
+        return f"{self.name} ({self._ipAddress}:{self._port})"
+
+
+#------------------------------------------------------------------------------
+# Connection Interface Methods
+#------------------------------------------------------------------------------
+    def connect(self) -> bool:
+        try:
+            return self._eventLoop.submit(self._connect()).result()
+        except (OSError, TimeoutError) as connectionError:
+            logging.exception(f"Unable to connect to {self.connectionDetails()}", exc_info=connectionError)
+            return False
+
+
+    def sendCommand(self, command: bytes) -> bool:
+        if not self.isConnected():
+            return False
+
+        try:
+            return self._eventLoop.submit(self._send(command)).result()
+        except OSError as connectionError:
+            logging.exception(f"Unable to send the command {command} to {self.connectionDetails()}", exc_info=connectionError)
+            return False
+
+
+    def getResponse(self) -> bytes:
+        if not self.isConnected():
+            return None
+
+        return self._eventLoop.submit(self._receive()).result()
+
+
+    def isConnected(self) -> bool:
+        return (self._writer is not None) and (not self._writer.is_closing())
+
+
+    def disconnect(self):
+        if self._writer is None:
+            return
+
+        if self._eventLoop.isEventLoopThread():
+            self._close()
+        else:
+            self._eventLoop.submit(self._disconnect()).result()
+
+
+#------------------------------------------------------------------------------
+# Non-blocking Methods
+#------------------------------------------------------------------------------
+    def exchange(self, command: bytes) -> Future:
+        """
+        Sends the command and waits for the response on the event loop without blocking the calling thread.
+        The returned Future resolves to the response bytes, or raises a TimeoutError if the device did not respond in time.
+        Exchanges on the same connection are serialised, so that every response is matched to the command that requested it.
+        """
+        return self._eventLoop.submit(self._exchange(command))
+
+
+#------------------------------------------------------------------------------
+# Coroutines
+#------------------------------------------------------------------------------
+    async def _connect(self) -> bool:
+        if self.isConnected():
+            return True
+
+        self._reader, self._writer = await asyncio.wait_for(asyncio.open_connection(self._ipAddress, self._port), self.timeout)
+        self._lock = asyncio.Lock()
+        self._flushPending = False
+        return True
+
+
+    async def _send(self, command: bytes) -> bool:
+        if self._flushPending:
+            await self._flush()
+
+        if self._writer is None:
+            raise ConnectionResetError(f"The connection to {self.connectionDetails()} was closed")
+
+        try:
+            self._writer.write(command)
+            await self._writer.drain()
+        except OSError:
+            self._close()
+            raise
+
+        return True
+
+
+    async def _receive(self) -> bytes:
+        try:
+            response = await asyncio.wait_for(self._reader.read(self.BUFFER_SIZE), self.timeout)
+        except asyncio.TimeoutError:
+            # The response may still arrive, and must not be read as the response to the next command
+            self._flushPending = True
+            raise TimeoutError(f"No response was received from {self.connectionDetails()} within {self.timeout} seconds")
+        except OSError as connectionError:
+            logging.error(f"The connection to {self.connectionDetails()} failed: {connectionError}")
+            self._close()
+            return None
+
+        if not response:
+            logging.error(f"The connection was closed by {self.connectionDetails()}")
+            self._close()
+            return None
+
+        return response
+
+
+    async def _exchange(self, command: bytes) -> bytes:
+        if not self.isConnected():
+            return None
+
+        async with self._lock:
+            try:
+                await self._send(command)
+            except OSError as connectionError:
+                logging.error(f"Unable to send the command {command} to {self.connectionDetails()}: {connectionError}")
+                return None
+
+            return await self._receive()
+
+
+    async def _flush(self):
+        """
+        Discards the bytes that are received before the next command is sent, such as a late response to a command that timed out
+        """
+        self._flushPending = False
+        discardedBytes = 0
+
+        while self._reader is not None:
+            try:
+                data = await asyncio.wait_for(self._reader.read(self.BUFFER_SIZE), self.FLUSH_TIMEOUT)
+            except asyncio.TimeoutError:
+                break
+            except OSError:
+                self._close()
+                break
+
+            if not data:
+                self._close()
+                break
+
+            discardedBytes += len(data)
+
+        if discardedBytes:
+            logging.warning(f"Discarded {discardedBytes} late bytes received from {self.connectionDetails()}")
+
+
+    async def _disconnect(self):
+        writer = self._writer
+        if writer is None:
+            return
+
+        self._close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+        self._reader = None
+        self._writer = None
+
+
+#------------------------------------------------------------------------------
+# Helper Functions
+#------------------------------------------------------------------------------
+def sendCommandAndGetResponse(connection: ConnectionInterface, command: bytes, statistics: DeviceStatistics = None) -> bytes:
+    """
+    Performs a blocking request/response exchange on any ConnectionInterface.
+    On an AsyncLANConnection the exchange is performed as a single operation on the event loop, so that it cannot be interleaved
+    with an exchange that was started from another thread.
+    If statistics are given, the round-trip time, the timeouts and the number of bytes exchanged are recorded in them.
+    """
+    requestTime = time.monotonic()
+
+    try:
+        if isinstance(connection, AsyncLANConnection):
+            response = connection.exchange(command).result()
+        else:
+            response = connection.getResponse() if connection.sendCommand(command) else None
+    except TimeoutError:
+        if statistics is not None:
+            statistics.recordTimeout(len(command))
+        raise
+    except OSError as connectionError:
+        logging.error(f"The connection to {connection} failed during an exchange and has been closed: {connectionError}")
+        connection.disconnect()
+        return None
+
+    if (statistics is not None) and (response is not None):
+        statistics.recordExchange(time.monotonic() - requestTime, len(command), len(response))
+
+    return response
@@ -0,0 +1,310 @@
+import asyncio
+import logging
+
+from ConfigurationManager import ConfigurationManager
+from AsyncConnection import DeviceEventLoop
+from MotionExecutor import MoveResult
+from ScanPlan import PointArrival, ScanResult, loadScanPlan, parseScanPoint, resolveScanPlanPath
+from TCPServer import CommandFramer, TCPCallbacks, encodeResponse, formatMoveResult, formatPointArrival, formatScanResult, matchCommand
+
+
+#------------------------------------------------------------------------------
+# Asyncio TCP Server
+#------------------------------------------------------------------------------
+class AsyncTCPServer:
+    """
+    A drop-in replacement for the TCPServer that serves the same protocol from a single asyncio event loop on a background thread,
+    with one coroutine per client instead of one thread per client and one more thread per move.
+    The completion of a move is reported from the done callback of its MoveHandle, and the blocking callbacks that stop the turn
+    table are run on the default executor, so that no client can hold up the event loop.
+    """
+    def __init__(self, settingsManager: ConfigurationManager, callbacks: TCPCallbacks, eventLoop: DeviceEventLoop = None):
+        self._callbacks = callbacks
+        self._settingsManager = settingsManager
+        self._ownsEventLoop = eventLoop is None
+        self._eventLoop = DeviceEventLoop(name="TCP Server Event Loop") if self._ownsEventLoop else eventLoop
+        self._server = None
+        self._clientTasks = set()
+        self._connected = False
+
+
+    def connect(self):
+        if self._connected:
+            return
+
+        try:
+            self._server = self._eventLoop.submit(self._start()).result()
+        except OSError as connectionError:
+            logging.exception(f"Unable to start the TCP server on {self._settingsManager.tcpServerIPAddress}:{self._settingsManager.tcpServerPort}", exc_info=connectionError)
+            return
+
+        self._connected = True
+
+
+    def disconnect(self):
+        if not self._connected:
+            return
+
+        self._connected = False
+
+        if self._eventLoop.isEventLoopThread():
+            asyncio.ensure_future(self._stop()).add_done_callback(self._stopEventLoop)
+        else:
+            self._eventLoop.submit(self._stop()).result(timeout=self._settingsManager.timeout)
+            if self._ownsEventLoop:
+                self._eventLoop.stop()
+
+
+    def isConnected(self):
+        return self._connected
+
+
+#------------------------------------------------------------------------------
+# Coroutines
+#------------------------------------------------------------------------------
+    async def _start(self) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self._serveClient, self._settingsManager.tcpServerIPAddress, self._settingsManager.tcpServerPort)
+
+
+    async def _stop(self):
+        server = self._server
+        self._server = None
+
+        if server is not None:
+            server.close()
+
+        # The task of a client that is waiting for a callback, e.g. the one that stops the server, is cancelled as well
+        clientTasks = [task for task in self._clientTasks if task is not asyncio.current_task()]
+        for task in clientTasks:
+            task.cancel()
+        await asyncio.gather(*clientTasks, return_exceptions=True)
+
+        if server is not None:
+            await server.wait_closed()
+
+
+    async def _serveClient(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = ClientSession(self._callbacks, self._settingsManager, reader, writer, self._halt)
+        task = asyncio.current_task()
+        self._clientTasks.add(task)
+        try:
+            await session.run()
+        except asyncio.CancelledError:
+            # The server is stopped, the session has already closed its connection
+            pass
+        finally:
+            self._clientTasks.discard(task)
+
+
+    async def _halt(self):
+        await self._stop()
+        self._connected = False
+
+        # The event loop is stopped once the session that halted the server has closed its connection
+        asyncio.current_task().add_done_callback(self._stopEventLoop)
+
+
+    def _stopEventLoop(self, task: asyncio.Future = None):
+        if self._ownsEventLoop:
+            self._eventLoop.stop()
+
+
+#------------------------------------------------------------------------------
+# Client Session
+#------------------------------------------------------------------------------
+class ClientSession:
+    """
+    The connection of a single client of the AsyncTCPServer.
+    Responses can be sent from any thread, e.g. from the done callback of a move or from the scan plan executor. They are queued
+    for the client and written by the sender coroutine of the session. The queue and the write buffer of the socket are bounded:
+    a reply to a command waits for space in the queue, which stops reading further commands from a client that pipelines commands
+    without reading the replies, while a client whose queue overflows with notifications is disconnected.
+    """
+    # The size of a single read, a command can span several reads
+    RECEIVE_BUFFER_SIZE = 8192
+    SEND_QUEUE_SIZE = 256
+    WRITE_BUFFER_LIMIT = 65536
+
+    def __init__(self, callbacks: TCPCallbacks, settingsManager: ConfigurationManager, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, halt):
+        self._callbacks = callbacks
+        self._settingsManager = settingsManager
+        self._reader = reader
+        self._writer = writer
+        self._halt = halt
+        self._loop = asyncio.get_running_loop()
+        self._responses = asyncio.Queue(maxsize=self.SEND_QUEUE_SIZE)
+        self._closed = False
+        self._task = None
+        self.clientAddress = writer.get_extra_info('peername')
+
+        writer.transport.set_write_buffer_limits(high=self.WRITE_BUFFER_LIMIT)
+
+
+    async def run(self):
+        logging.info(f"Client {self.clientAddress} connected")
+        self._task = asyncio.current_task()
+        sender = asyncio.ensure_future(self._sendResponses())
+
+        framer = CommandFramer(name=str(self.clientAddress))
+
+        try:
+            while not self._closed:
+                try:
+                    received = await asyncio.wait_for(self._reader.read(self.RECEIVE_BUFFER_SIZE), framer.flushTimeout)
+                except asyncio.TimeoutError:
+                    received = None
+
+                receivedCommands = framer.flush() if not received else framer.feed(received)
+
+                for receivedCommand in receivedCommands:
+                    logging.debug(f"Received Request: {receivedCommand}")
+                    if not await self._handleCommand(receivedCommand):
+                        return
+
+                # The client has closed the connection
+                if received == b'':
+                    break
+        except OSError as connectionError:
+            logging.warning(f"The connection to {self.clientAddress} failed: {connectionError}")
+        finally:
+            self.close()
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
+            logging.info(f"Client {self.clientAddress} disconnected")
+
+
+    def close(self):
+        if self._closed:
+            return
+
+        self._closed = True
+        self._writer.close()
+
+        # The session may be waiting for space in the queue of a client that does not read its replies
+        if (self._task is not None) and (self._task is not asyncio.current_task()):
+            self._task.cancel()
+
+
+    def sendResponse(self, response: str):
+        """
+        Queues the response for the client. Can be called from any thread
+        """
+        if self._loop.is_closed():
+            return
+
+        try:
+            self._loop.call_soon_threadsafe(self._queueResponse, response)
+        except RuntimeError:
+            # The event loop was closed after the check
+            pass
+
+
+    def sendPointArrival(self, arrival: PointArrival):
+        self.sendResponse(formatPointArrival(arrival))
+
+
+    def sendScanResult(self, result: ScanResult):
+        self.sendResponse(formatScanResult(result))
+
+
+    def sendMoveResult(self, result: MoveResult):
+        self.sendResponse(formatMoveResult(result))
+
+
+#------------------------------------------------------------------------------
+# Session Helper Methods
+#------------------------------------------------------------------------------
+    def _queueResponse(self, response: str):
+        if self._closed:
+            return
+
+        try:
+            self._responses.put_nowait(response)
+        except asyncio.QueueFull:
+            logging.warning(f"Disconnecting {self.clientAddress}, which did not read its last {self.SEND_QUEUE_SIZE} responses")
+            self.close()
+
+
+    async def _reply(self, response: str):
+        # Replies wait for space in the queue, so that a client that pipelines commands faster than it reads the replies is slowed down
+        if not self._closed:
+            await self._responses.put(response)
+
+
+    async def _sendResponses(self):
+        encoding = self._settingsManager.Encoding
+
+        try:
+            while True:
+                response = await self._responses.get()
+                self._writer.write(encodeResponse(response, encoding))
+                await self._writer.drain()
+        except OSError as connectionError:
+            logging.warning(f"Unable to send a response to {self.clientAddress}: {connectionError}")
+            self.close()
+
+
+    async def _handleCommand(self, receivedCommand: str) -> bool:
+        """
+        Handles a single command, and returns False if the session has to be closed
+        """
+        callbacks = self._callbacks
+        matches = matchCommand(receivedCommand)
+
+        if matches.HALT:
+            await self._loop.run_in_executor(None, callbacks.stop)
+            await self._halt()
+            return False
+
+        if matches.STOP:
+            await self._loop.run_in_executor(None, callbacks.stop)
+            return True
+
+        if matches.GETPOSITION:
+            planeName = matches.GETPOSITION.group(1)
+            angle = callbacks.getAzimuth() if (planeName == "AZIMUTH") else callbacks.getElevation()
+            await self._reply(f"CURRENT_{planeName} {angle:.3f}")
+            return True
+
+        if matches.GETVELOCITY:
+            await self._reply(f"CURRENT_VELOCITY {callbacks.getVelocity():.3f}")
+            return True
+
+        if matches.SCAN or matches.SCANFILE:
+            try:
+                if matches.SCANFILE:
+                    path = resolveScanPlanPath(self._settingsManager.scanPlanDirectory, matches.SCANFILE.group(1).strip())
+                    points = await self._loop.run_in_executor(None, loadScanPlan, path)
+                else:
+                    points = [parseScanPoint(point) for point in matches.SCAN.group(1).split()]
+                scanPlan = callbacks.startScan(points, self.sendPointArrival, self.sendScanResult)
+            except (OSError, ValueError) as exception:
+                logging.exception(f"Unable to read the scan plan received from {self.clientAddress}", exc_info=exception)
+                await self._reply("SCAN_ERROR")
+                return True
+
+            if scanPlan is not None:
+                await self._reply(f"SCAN_STARTED {len(points)} {scanPlan.optimizedTime:.3f} {scanPlan.originalTime:.3f}")
+            else:
+                await self._reply("SCAN_BUSY")
+            return True
+
+        if matches.PAUSESCAN:
+            callbacks.pauseScan()
+            await self._reply("SCAN_PAUSED")
+            return True
+
+        if matches.RESUMESCAN:
+            callbacks.resumeScan()
+            await self._reply("SCAN_RESUMED")
+            return True
+
+        if matches.SETPOSITION:
+            planeName = matches.SETPOSITION.group(1)
+            value = float(matches.SETPOSITION.group(2))
+            moveHandle = callbacks.setAzimuth(value) if (planeName == "AZIMUTH") else callbacks.setElevation(value)
+            moveHandle.addDoneCallback(self.sendMoveResult)
+            return True
+
+        await self._reply("UNKNOWN_COMMAND")
+        return True
@@ -0,0 +1,462 @@
+import logging
+import math
+import time
+from dataclasses import dataclass, replace
+from threading import Event
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+from ConfigurationManager import ConfigurationManager
+from ControlLoop import ControlLoop
+from MotionExecutor import ControlParameters, MoveHandle, MoveStatus
+
+
+#------------------------------------------------------------------------------
+# Auto Tune Data Classes
+#------------------------------------------------------------------------------
+@dataclass(frozen=True)
+class PlantIdentification:
+    deadband: float                 # Voltage at which the turn table starts to move, in V
+    velocityGain: float             # Steady state velocity of the turn table per volt above the deadband, in deg/s/V
+    ultimateGain: float             # Proportional gain at which the closed loop oscillates, in V/deg
+    ultimatePeriod: float           # Period of the oscillation at the ultimate gain, in s
+    oscillationAmplitude: float     # Amplitude of the oscillation in the relay experiment, in deg
+
+    def summary(self) -> str:
+        return (
+            f"deadband={self.deadband:.3f}V velocity gain={self.velocityGain:.3f}deg/s/V "
+            f"ultimate gain={self.ultimateGain:.3f}V/deg ultimate period={self.ultimatePeriod:.3f}s "
+            f"oscillation amplitude={self.oscillationAmplitude:.3f}deg"
+        )
+
+
+@dataclass(frozen=True)
+class StepResponse:
+    target: float
+    distance: float
+    riseTime: Optional[float]       # Time from 10% to 90% of the distance, or None if 90% was not reached
+    settleTime: Optional[float]     # Time after which the position stayed within the tolerance, or None if it did not settle
+    overshoot: float                # Largest excursion beyond the target in the direction of the move, in deg
+    finalError: float
+    status: MoveStatus
+
+
+@dataclass(frozen=True)
+class BenchmarkReport:
+    parameters: ControlParameters
+    responses: List[StepResponse]
+
+    @property
+    def settledCount(self) -> int:
+        return sum(1 for response in self.responses if response.settleTime is not None)
+
+    @property
+    def allSettled(self) -> bool:
+        return self.settledCount == len(self.responses)
+
+    @property
+    def meanRiseTime(self) -> float:
+        riseTimes = [response.riseTime for response in self.responses if response.riseTime is not None]
+        return sum(riseTimes)/len(riseTimes) if riseTimes else math.inf
+
+    @property
+    def meanSettleTime(self) -> float:
+        settleTimes = [response.settleTime for response in self.responses if response.settleTime is not None]
+        return sum(settleTimes)/len(settleTimes) if settleTimes else math.inf
+
+    @property
+    def maximumOvershoot(self) -> float:
+        return max((response.overshoot for response in self.responses), default=0.000)
+
+    @property
+    def maximumFinalError(self) -> float:
+        return max((abs(response.finalError) for response in self.responses), default=0.000)
+
+    def summary(self) -> str:
+        return (
+            f"rise={self.meanRiseTime:.3f}s settle={self.meanSettleTime:.3f}s overshoot={self.maximumOvershoot:.3f}deg "
+            f"final error={self.maximumFinalError:.3f}deg settled={self.settledCount}/{len(self.responses)}"
+        )
+
+
+@dataclass(frozen=True)
+class AutoTuneReport:
+    identification: PlantIdentification
+    currentParameters: ControlParameters
+    proposedParameters: ControlParameters
+    currentBenchmark: BenchmarkReport
+    proposedBenchmark: BenchmarkReport
+
+    @property
+    def isImprovement(self) -> bool:
+        """
+        The proposed gains are better if more moves of the benchmark settle, or as many moves settle faster, or with a smaller final error
+        """
+        def rank(benchmark: BenchmarkReport) -> Tuple[int, float, float]:
+            return (-benchmark.settledCount, benchmark.meanSettleTime, benchmark.maximumFinalError)
+
+        return rank(self.proposedBenchmark) < rank(self.currentBenchmark)
+
+    def summary(self) -> str:
+        parameters = self.proposedParameters
+        return "\n".join((
+            f"Plant: {self.identification.summary()}",
+            f"Current gains:  {self.currentBenchmark.summary()}",
+            f"Proposed gains: {self.proposedBenchmark.summary()}",
+            f"Proposed: P={parameters.proportionalGain:.3f} I={parameters.integralGain:.3f} D={parameters.derivativeGain:.3f} "
+            f"feedforward={parameters.velocityFeedforwardGain:.3f} minimum signal={parameters.minimumControlSignalValue:.3f}",
+        ))
+
+
+#------------------------------------------------------------------------------
+# Tuning Functions
+#------------------------------------------------------------------------------
+def proposeParameters(identification: PlantIdentification, currentParameters: ControlParameters) -> ControlParameters:
+    """
+    Proposes PID gains from the ultimate gain and period with the "no overshoot" variant of the Ziegler-Nichols rules, as the turn
+    table should not overshoot a measurement position. The velocity feedforward is the inverse of the velocity gain, and the minimum
+    control signal compensates the deadband
+    """
+    proportionalGain = 0.2*identification.ultimateGain
+    integralTime = 0.5*identification.ultimatePeriod
+    derivativeTime = identification.ultimatePeriod/3
+
+    return replace(
+        currentParameters,
+        proportionalGain=round(proportionalGain, 3),
+        integralGain=round(proportionalGain/integralTime, 3),
+        derivativeGain=round(proportionalGain*derivativeTime, 3),
+        velocityFeedforwardGain=round(1/identification.velocityGain, 3),
+        minimumControlSignalValue=round(identification.deadband, 3),
+    )
+
+
+def measureStepResponse(trace: Sequence[Tuple[float, float]], target: float, tolerance: float, status: MoveStatus) -> StepResponse:
+    """
+    Measures the step response from a trace of (time since the start of the move, position) samples, which starts at the start position
+    """
+    startPosition = trace[0][1]
+    distance = target - startPosition
+    direction = math.copysign(1.0, distance)
+
+    def firstTimeAt(fraction: float) -> Optional[float]:
+        return next((timestamp for timestamp, position in trace if (position - startPosition)*direction >= fraction*abs(distance)), None)
+
+    tenPercentTime, ninetyPercentTime = firstTimeAt(0.1), firstTimeAt(0.9)
+    riseTime = None if (ninetyPercentTime is None) else (ninetyPercentTime - tenPercentTime)
+
+    # The move has settled at the first sample after the last sample outside of the tolerance
+    lastOutsideIndex = next((index for index in reversed(range(len(trace))) if abs(trace[index][1] - target) > tolerance), None)
+    if lastOutsideIndex is None:
+        settleTime = 0.000
+    elif lastOutsideIndex == (len(trace) - 1):
+        settleTime = None
+    else:
+        settleTime = trace[lastOutsideIndex + 1][0]
+
+    return StepResponse(
+        target=target,
+        distance=distance,
+        riseTime=riseTime,
+        settleTime=settleTime,
+        overshoot=max(max((position - target)*direction for _, position in trace), 0.000),
+        finalError=trace[-1][1] - target,
+        status=status,
+    )
+
+
+#------------------------------------------------------------------------------
+# Auto Tuner
+#------------------------------------------------------------------------------
+class AutoTuneCallbacks(NamedTuple):
+    getPosition: Callable[[], float]
+    getVelocity: Callable[[], float]
+    setVoltage: Callable[[float], None]
+    enableMotor: Callable[[], None]
+    disableMotor: Callable[[], None]
+    moveTo: Callable[[float, ControlParameters], MoveHandle]
+    cancelMove: Callable[[], bool]
+
+
+class AutoTuner:
+    """
+    Identifies the plant with three experiments on the turn table, proposes gains, and benchmarks them against the current gains:
+    The voltage at which the turn table starts to move while the voltage is ramped up slowly gives a first estimate of the deadband.
+    The steady state velocities at two constant voltages above it give the velocity gain as the slope, and the deadband as the voltage
+    at which the line through them crosses zero, which is not delayed by the lag of the velocity estimate. The ultimate gain and period come from a relay experiment
+    (Astrom-Hagglund), which switches the voltage between plus and minus the relay voltage whenever the position crosses the start
+    position, and from the describing function of the relay: the ultimate gain is 4h/(pi*a), where h is the relay voltage above the
+    deadband and a is the amplitude of the resulting oscillation.
+    Both sets of gains are benchmarked with the same moves forth and back around the start position, so that the turn table ends up
+    where it started. Every experiment is aborted if the turn table moves further than the maximum excursion from the start position.
+    The benchmark is refused if one of its targets is outside of the position limits, and a benchmark move is cancelled if the turn
+    table strays further than the maximum excursion from the path of the move, or if it has not finished within the move timeout.
+    """
+    def __init__(
+        self, callbacks: AutoTuneCallbacks,
+        createControlLoop: Callable[[], ControlLoop],
+        relayAmplitude: float = 1.000,
+        relayHysteresis: float = 0.020,
+        relayCycles: int = 6,
+        maximumVoltage: float = 7.000,
+        maximumExcursion: float = 10.000,
+        moveSet: Sequence[float] = (0.5, 5.0, 45.0),
+        tolerance: float = 0.025,
+        samplePeriod: float = 0.050,
+        settleTime: float = 1.000,
+        minimumPosition: float = -math.inf,
+        maximumPosition: float = math.inf,
+        moveTimeout: float = 30.000,
+        clock: Callable[[], float] = time.monotonic):
+
+        self._callbacks = callbacks
+        self._createControlLoop = createControlLoop
+        self.relayAmplitude = relayAmplitude
+        self.relayHysteresis = relayHysteresis
+        self.relayCycles = relayCycles
+        self.maximumVoltage = maximumVoltage
+        self.maximumExcursion = maximumExcursion
+        self.moveSet = moveSet
+        self.tolerance = tolerance
+        self.samplePeriod = samplePeriod
+        self.settleTime = settleTime
+        self.minimumPosition = minimumPosition
+        self.maximumPosition = maximumPosition
+        self.moveTimeout = moveTimeout
+        self._clock = clock
+
+        self._cancelEvent = Event()
+        self._controlLoop = None
+
+
+    @classmethod
+    def fromSettings(cls, settingsManager: ConfigurationManager, callbacks: AutoTuneCallbacks, createControlLoop: Callable[[], ControlLoop]) -> "AutoTuner":
+        return cls(
+            callbacks,
+            createControlLoop=createControlLoop,
+            relayAmplitude=settingsManager.autoTuneRelayAmplitude,
+            maximumVoltage=settingsManager.maximumVoltage,
+            moveSet=settingsManager.autoTuneMoveSet,
+            tolerance=settingsManager.maximumAllowedError,
+            samplePeriod=settingsManager.voltageUpdatePeriod,
+            minimumPosition=settingsManager.minimumGotoPosition,
+            maximumPosition=settingsManager.maximumGotoPosition,
+        )
+
+
+    def cancel(self):
+        self._cancelEvent.set()
+        controlLoop = self._controlLoop
+
+        if controlLoop is not None:
+            controlLoop.stop()
+
+
+    def run(self, currentParameters: ControlParameters) -> AutoTuneReport:
+        """
+        Runs the experiments and both benchmarks. Raises a RuntimeError if the auto tune is cancelled or an experiment fails
+        """
+        self._cancelEvent.clear()
+
+        identification = self.identifyPlant()
+        logging.info(f"Identified the plant: {identification.summary()}")
+
+        proposedParameters = proposeParameters(identification, currentParameters)
+        currentBenchmark = self.benchmark(currentParameters)
+        proposedBenchmark = self.benchmark(proposedParameters)
+
+        return AutoTuneReport(identification, currentParameters, proposedParameters, currentBenchmark, proposedBenchmark)
+
+
+#------------------------------------------------------------------------------
+# Experiment Methods
+#------------------------------------------------------------------------------
+    def identifyPlant(self) -> PlantIdentification:
+        breakawayVoltage = (self._measureBreakawayVoltage(1.0) + self._measureBreakawayVoltage(-1.0))/2
+        lowVoltage = min(breakawayVoltage + self.relayAmplitude/2, self.maximumVoltage)
+        highVoltage = min(breakawayVoltage + self.relayAmplitude, self.maximumVoltage)
+        lowVelocity = (self._measureVelocity(lowVoltage) + self._measureVelocity(-lowVoltage))/2
+        highVelocity = (self._measureVelocity(highVoltage) + self._measureVelocity(-highVoltage))/2
+
+        if highVelocity <= lowVelocity:
+            raise RuntimeError("The velocity of the turn table did not increase with the voltage")
+
+        velocityGain = (highVelocity - lowVelocity)/(highVoltage - lowVoltage)
+        deadband = max(lowVoltage - lowVelocity/velocityGain, 0.000)
+        relayVoltage = min(deadband + self.relayAmplitude, self.maximumVoltage)
+        ultimatePeriod, oscillationAmplitude = self._runRelayExperiment(relayVoltage)
+
+        return PlantIdentification(
+            deadband=deadband,
+            velocityGain=velocityGain,
+            ultimateGain=4*(relayVoltage - deadband)/(math.pi*oscillationAmplitude),
+            ultimatePeriod=ultimatePeriod,
+            oscillationAmplitude=oscillationAmplitude,
+        )
+
+
+    def benchmark(self, parameters: ControlParameters) -> BenchmarkReport:
+        startPosition = self._callbacks.getPosition()
+        targets = [target for step in self.moveSet for target in (startPosition + step, startPosition)]
+
+        for target in targets:
+            if not (self.minimumPosition <= target <= self.maximumPosition):
+                raise RuntimeError(f"The benchmark target {target:.3f} is outside of the range {self.minimumPosition:.3f} to {self.maximumPosition:.3f}")
+
+        responses = [self._measureMove(target, parameters) for target in targets]
+
+        report = BenchmarkReport(parameters, responses)
+        logging.info(f"Benchmarked P={parameters.proportionalGain:.3f} I={parameters.integralGain:.3f} D={parameters.derivativeGain:.3f}: {report.summary()}")
+        return report
+
+
+    def _measureBreakawayVoltage(self, direction: float, rampRate: float = 0.500, breakawayVelocity: float = 0.200) -> float:
+        """
+        Ramps the voltage up until the turn table moves, and returns the voltage at which it started to move
+        """
+        voltage = 0.000
+
+        def rampStep(timeStep: float) -> bool:
+            nonlocal voltage
+            if abs(self._callbacks.getVelocity()) > breakawayVelocity:
+                return False
+
+            voltage += rampRate*timeStep
+            if voltage > self.maximumVoltage:
+                raise RuntimeError(f"The turn table did not move up to the maximum voltage of {self.maximumVoltage:.3f}V")
+
+            self._callbacks.setVoltage(direction*voltage)
+            return True
+
+        self._runExperiment(rampStep)
+        return voltage
+
+
+    def _measureVelocity(self, voltage: float, duration: float = 1.500) -> float:
+        """
+        Applies a constant voltage, and returns the mean speed over the last third of the duration
+        """
+        startTime = self._clock()
+        velocities = []
+
+        def velocityStep(timeStep: float) -> bool:
+            elapsedTime = self._clock() - startTime
+            if elapsedTime > duration:
+                return False
+
+            if elapsedTime > 2*duration/3:
+                velocities.append(abs(self._callbacks.getVelocity()))
+
+            self._callbacks.setVoltage(voltage)
+            return True
+
+        self._runExperiment(velocityStep)
+
+        if not velocities:
+            raise RuntimeError("No velocity was measured in the velocity experiment")
+        return sum(velocities)/len(velocities)
+
+
+    def _runRelayExperiment(self, relayVoltage: float) -> Tuple[float, float]:
+        """
+        Returns the period and the amplitude of the oscillation around the start position under relay feedback. The first cycle is
+        discarded, as it starts from rest
+        """
+        setpoint = self._callbacks.getPosition()
+        switchCount = 2*(self.relayCycles + 1)
+        switchTimes = []
+        trace = []
+        output = relayVoltage
+
+        def relayStep(timeStep: float) -> bool:
+            nonlocal output
+            error = self._callbacks.getPosition() - setpoint
+
+            # A positive voltage decreases the angle, so the relay output has the same sign as the error
+            if ((error > self.relayHysteresis) and (output < 0)) or ((error < -self.relayHysteresis) and (output > 0)):
+                output = -output
+                switchTimes.append(self._clock())
+
+            trace.append((self._clock(), error))
+            self._callbacks.setVoltage(output)
+            return len(switchTimes) < switchCount
+
+        self._runExperiment(relayStep, setpoint)
+
+        if len(switchTimes) < switchCount:
+            raise RuntimeError("The relay experiment did not oscillate")
+
+        # Switches in the same direction are a full period apart
+        settledSwitchTimes = switchTimes[2:]
+        periods = [end - start for start, end in zip(settledSwitchTimes, settledSwitchTimes[2:])]
+        errors = [error for timestamp, error in trace if timestamp >= settledSwitchTimes[0]]
+        return sum(periods)/len(periods), (max(errors) - min(errors))/2
+
+
+    def _runExperiment(self, step: Callable[[float], bool], referencePosition: float = None):
+        """
+        Runs the step on a control loop with the motor enabled, and sets the voltage to zero and waits for the turn table to come to
+        rest afterwards
+        """
+        callbacks = self._callbacks
+        referencePosition = callbacks.getPosition() if (referencePosition is None) else referencePosition
+
+        def guardedStep(timeStep: float) -> bool:
+            if abs(callbacks.getPosition() - referencePosition) > self.maximumExcursion:
+                raise RuntimeError(f"The turn table moved further than {self.maximumExcursion:.3f} degrees in the experiment")
+            return step(timeStep)
+
+        if self._cancelEvent.is_set():
+            raise RuntimeError("The auto tune was cancelled")
+
+        self._controlLoop = self._createControlLoop()
+
+        try:
+            callbacks.enableMotor()
+            self._controlLoop.run(guardedStep)
+        finally:
+            callbacks.setVoltage(0.000)
+            callbacks.disableMotor()
+            self._controlLoop = None
+
+        if self._cancelEvent.wait(self.settleTime):
+            raise RuntimeError("The auto tune was cancelled")
+
+
+    def _measureMove(self, target: float, parameters: ControlParameters) -> StepResponse:
+        """
+        Moves to the target with the parameters and samples the position until the settle time after the move has finished, so that
+        a turn table that coasts out of the tolerance after the move is detected
+        """
+        if self._cancelEvent.is_set():
+            raise RuntimeError("The auto tune was cancelled")
+
+        callbacks = self._callbacks
+        startTime = self._clock()
+        startPosition = callbacks.getPosition()
+        trace = [(0.000, startPosition)]
+        handle = callbacks.moveTo(target, parameters)
+        finishTime = None
+
+        # The turn table may overshoot, but has to stay within the maximum excursion of the path from the start to the target
+        lowerBound = min(startPosition, target) - self.maximumExcursion
+        upperBound = max(startPosition, target) + self.maximumExcursion
+
+        while (finishTime is None) or ((self._clock() - finishTime) < self.settleTime):
+            if self._cancelEvent.wait(self.samplePeriod):
+                callbacks.cancelMove()
+                raise RuntimeError("The auto tune was cancelled")
+
+            position = callbacks.getPosition()
+            trace.append((self._clock() - startTime, position))
+
+            if not (lowerBound <= position <= upperBound):
+                callbacks.cancelMove()
+                raise RuntimeError(f"The turn table moved further than {self.maximumExcursion:.3f} degrees from the move to {target:.3f}")
+
+            if (finishTime is None) and handle.done():
+                finishTime = self._clock()
+            elif (finishTime is None) and ((self._clock() - startTime) > self.moveTimeout):
+                callbacks.cancelMove()
+                raise RuntimeError(f"The move to {target:.3f} did not finish within {self.moveTimeout:.3f}s")
+
+        return measureStepResponse(trace, target, self.tolerance, handle.result().status)
@@ -0,0 +1,152 @@
+import heapq
+import itertools
+import time
+from enum import IntEnum
+from threading import Condition
+from typing import Any, Callable, Dict
+
+from Instrumentation import LatencyHistogram
+
+
+#------------------------------------------------------------------------------
+# Command Priorities
+#------------------------------------------------------------------------------
+class CommandPriority(IntEnum):
+    EMERGENCY = 0
+    CONTROL = 1
+    TELEMETRY = 2
+
+    def __str__(self):
+        return self.name
+
+
+class CommandDropped(Exception):
+    pass
+
+
+#------------------------------------------------------------------------------
+# Command Queue Statistics
+#------------------------------------------------------------------------------
+class CommandQueueStatistics:
+    def __init__(self, name: str):
+        self.name = name
+        self.waitTimes: Dict[CommandPriority, LatencyHistogram] = {priority: LatencyHistogram() for priority in CommandPriority}
+        self.reset()
+
+
+    def reset(self):
+        for waitTimes in self.waitTimes.values():
+            waitTimes.reset()
+
+        self.executed = {priority: 0 for priority in CommandPriority}
+        self.dropped = {priority: 0 for priority in CommandPriority}
+        self.depth = 0
+        self.maximumDepth = 0
+
+
+    def summary(self) -> str:
+        priorities = ", ".join(
+            f"{priority} {self.executed[priority]} executed/{self.dropped[priority]} dropped "
+            f"wait p99={self.waitTimes[priority].percentile(99)*1e3:.2f}ms"
+            for priority in CommandPriority
+        )
+        return f"{self.name}: depth {self.depth} (max {self.maximumDepth}), {priorities}"
+
+
+#------------------------------------------------------------------------------
+# Command Queue
+#------------------------------------------------------------------------------
+class CommandQueue:
+    """
+    Grants exclusive access to the connection of a single device in order of priority instead of in order of arrival.
+    Every command is executed on the thread that submitted it once all waiting commands of a higher priority, and all earlier
+    commands of the same priority, have been executed. A command that is given a maximum wait is dropped if it has not been
+    granted the connection within that time, so that stale telemetry requests do not hold up the commands queued behind them.
+    An emergency command supersedes all the control commands that are waiting when it is queued, which are dropped instead of being
+    executed after it, so that a voltage that was requested before an emergency stop cannot be written after the stop.
+    """
+    def __init__(self, name: str, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._condition = Condition()
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._busy = False
+        self._emergencies = 0
+        self.statistics = CommandQueueStatistics(name)
+
+
+    @property
+    def depth(self) -> int:
+        return self.statistics.depth
+
+
+    def execute(self, priority: CommandPriority, command: Callable[[], Any], maximumWait: float = None) -> Any:
+        """
+        Executes the command once it is its turn and returns its result. CommandDropped is raised if the command was dropped,
+        and any exception raised by the command is propagated after the connection has been released.
+        """
+        self._acquire(priority, maximumWait)
+
+        try:
+            return command()
+        finally:
+            self._release()
+
+
+#------------------------------------------------------------------------------
+# Queue Helper Methods
+#------------------------------------------------------------------------------
+    def _acquire(self, priority: CommandPriority, maximumWait: float):
+        statistics = self.statistics
+
+        with self._condition:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+            statistics.depth = len(self._waiting)
+            statistics.maximumDepth = max(statistics.maximumDepth, statistics.depth)
+
+            emergencies = self._emergencies
+            if priority == CommandPriority.EMERGENCY:
+                self._emergencies += 1
+                self._condition.notify_all()
+
+            enqueueTime = self._clock()
+            deadline = None if (maximumWait is None) else (enqueueTime + maximumWait)
+
+            while True:
+                if (priority == CommandPriority.CONTROL) and (self._emergencies != emergencies):
+                    self._drop(ticket)
+                    raise CommandDropped(f"The {priority} command was superseded by an {CommandPriority.EMERGENCY} command")
+
+                if (not self._busy) and (self._waiting[0] == ticket):
+                    break
+
+                remainingTime = None if (deadline is None) else (deadline - self._clock())
+
+                if (remainingTime is not None) and (remainingTime <= 0):
+                    self._drop(ticket)
+                    raise CommandDropped(f"The {priority} command was not executed within {maximumWait} s")
+
+                self._condition.wait(remainingTime)
+
+            heapq.heappop(self._waiting)
+            self._busy = True
+            statistics.depth = len(self._waiting)
+            statistics.executed[priority] += 1
+            statistics.waitTimes[priority].record(self._clock() - enqueueTime)
+
+
+    def _drop(self, ticket):
+        statistics = self.statistics
+
+        self._waiting.remove(ticket)
+        heapq.heapify(self._waiting)
+        statistics.depth = len(self._waiting)
+        statistics.dropped[ticket[0]] += 1
+        self._condition.notify_all()
+
+
+    def _release(self):
+        with self._condition:
+            self._busy = False
+            self._condition.notify_all()
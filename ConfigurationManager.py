@@ -1,5 +1,6 @@
 import os
 import configparser
+from typing import List
 
 
 class ConfigurationManager:
@@ -52,6 +53,22 @@ class ConfigurationManager:
     def timeout(self, value: float):
         self.userConfig['TurnTableController']['TIMEOUT'] = str(value)
 
+    @property
+    def connectionBackend(self) -> str:
+        return self.userConfig['TurnTableController'].get('CONNECTION_BACKEND', 'threads')
+
+    @connectionBackend.setter
+    def connectionBackend(self, value: str):
+        self.userConfig['TurnTableController']['CONNECTION_BACKEND'] = value
+
+    @property
+    def statisticsLogPeriod(self) -> float:
+        return self.userConfig['TurnTableController'].getfloat('STATISTICS_LOG_PERIOD', 60.000)
+
+    @statisticsLogPeriod.setter
+    def statisticsLogPeriod(self, value: float):
+        self.userConfig['TurnTableController']['STATISTICS_LOG_PERIOD'] = str(value)
+
     @property
     def maximumVoltage(self) -> float:
         return self.userConfig['MotorController'].getfloat('MAXIMUM_VOLTAGE', 5.000)
@@ -112,6 +129,14 @@ class ConfigurationManager:
     def voltageUpdatePeriod(self, value: float):
         self.userConfig['MotorController']['VOLTAGE_UPDATE_PERIOD'] = str(value)
 
+    @property
+    def voltageCoalescingWindow(self) -> float:
+        return self.userConfig['MotorController'].getfloat('VOLTAGE_COALESCING_WINDOW', 0.05)
+
+    @voltageCoalescingWindow.setter
+    def voltageCoalescingWindow(self, value: float):
+        self.userConfig['MotorController']['VOLTAGE_COALESCING_WINDOW'] = str(value)
+
     @property
     def voltageStep(self) -> float:
         return self.userConfig['MotorController'].getfloat('VOLTAGE_STEP', 0.3)
@@ -128,6 +153,62 @@ class ConfigurationManager:
     def positionSamplePeriod(self, value: float):
         self.userConfig['ShaftEncoder']['POSITION_SAMPLE_PERIOD'] = str(value)
 
+    @property
+    def idlePositionSamplePeriod(self) -> float:
+        return self.userConfig['ShaftEncoder'].getfloat('IDLE_SAMPLE_PERIOD', 0.25)
+
+    @idlePositionSamplePeriod.setter
+    def idlePositionSamplePeriod(self, value: float):
+        self.userConfig['ShaftEncoder']['IDLE_SAMPLE_PERIOD'] = str(value)
+
+    @property
+    def adaptivePositionSampling(self) -> bool:
+        return self.userConfig['ShaftEncoder'].getboolean('ADAPTIVE_SAMPLING', True)
+
+    @adaptivePositionSampling.setter
+    def adaptivePositionSampling(self, value: bool):
+        self.userConfig['ShaftEncoder']['ADAPTIVE_SAMPLING'] = str(value)
+
+    @property
+    def pipelinedPositionRequests(self) -> bool:
+        return self.userConfig['ShaftEncoder'].getboolean('PIPELINED_REQUESTS', False)
+
+    @pipelinedPositionRequests.setter
+    def pipelinedPositionRequests(self, value: bool):
+        self.userConfig['ShaftEncoder']['PIPELINED_REQUESTS'] = str(value)
+
+    @property
+    def positionHistoryLength(self) -> float:
+        return self.userConfig['ShaftEncoder'].getfloat('HISTORY_LENGTH', 600.0)
+
+    @positionHistoryLength.setter
+    def positionHistoryLength(self, value: float):
+        self.userConfig['ShaftEncoder']['HISTORY_LENGTH'] = str(value)
+
+    @property
+    def estimatorAlpha(self) -> float:
+        return self.userConfig['ShaftEncoder'].getfloat('ESTIMATOR_ALPHA', 0.5)
+
+    @estimatorAlpha.setter
+    def estimatorAlpha(self, value: float):
+        self.userConfig['ShaftEncoder']['ESTIMATOR_ALPHA'] = str(value)
+
+    @property
+    def estimatorBeta(self) -> float:
+        return self.userConfig['ShaftEncoder'].getfloat('ESTIMATOR_BETA', 0.1)
+
+    @estimatorBeta.setter
+    def estimatorBeta(self, value: float):
+        self.userConfig['ShaftEncoder']['ESTIMATOR_BETA'] = str(value)
+
+    @property
+    def estimatorGamma(self) -> float:
+        return self.userConfig['ShaftEncoder'].getfloat('ESTIMATOR_GAMMA', 0.01)
+
+    @estimatorGamma.setter
+    def estimatorGamma(self, value: float):
+        self.userConfig['ShaftEncoder']['ESTIMATOR_GAMMA'] = str(value)
+
     @property
     def turnTableIPAddress(self) -> str:
         return self.userConfig['TurnTableController'].get('TURNTABLE_IP_ADDRESS', '127.0.0.1')
@@ -200,6 +281,103 @@ class ConfigurationManager:
     def controlDerivativeGain(self, value: float):
         self.userConfig['TurnTableController']['CONTROL_DERIVATIVE_GAIN'] = str(value)
 
+    @property
+    def controlDerivativeFilterTime(self) -> float:
+        return self.userConfig['TurnTableController'].getfloat('CONTROL_DERIVATIVE_FILTER_TIME', 0.050)
+
+    @controlDerivativeFilterTime.setter
+    def controlDerivativeFilterTime(self, value: float):
+        self.userConfig['TurnTableController']['CONTROL_DERIVATIVE_FILTER_TIME'] = str(value)
+
+    @property
+    def controlVelocityFeedforward(self) -> float:
+        return self.userConfig['TurnTableController'].getfloat('CONTROL_VELOCITY_FEEDFORWARD', 0.000)
+
+    @controlVelocityFeedforward.setter
+    def controlVelocityFeedforward(self, value: float):
+        self.userConfig['TurnTableController']['CONTROL_VELOCITY_FEEDFORWARD'] = str(value)
+
+    @property
+    def motionProfile(self) -> str:
+        return self.userConfig['TurnTableController'].get('MOTION_PROFILE', 'trapezoidal')
+
+    @motionProfile.setter
+    def motionProfile(self, value: str):
+        self.userConfig['TurnTableController']['MOTION_PROFILE'] = value
+
+    @property
+    def maximumVelocity(self) -> float:
+        return self.userConfig['TurnTableController'].getfloat('MAXIMUM_VELOCITY', 12.000)
+
+    @maximumVelocity.setter
+    def maximumVelocity(self, value: float):
+        self.userConfig['TurnTableController']['MAXIMUM_VELOCITY'] = str(value)
+
+    @property
+    def maximumAcceleration(self) -> float:
+        return self.userConfig['TurnTableController'].getfloat('MAXIMUM_ACCELERATION', 40.000)
+
+    @maximumAcceleration.setter
+    def maximumAcceleration(self, value: float):
+        self.userConfig['TurnTableController']['MAXIMUM_ACCELERATION'] = str(value)
+
+    @property
+    def controlTrigger(self) -> str:
+        return self.userConfig['TurnTableController'].get('CONTROL_TRIGGER', 'timer')
+
+    @controlTrigger.setter
+    def controlTrigger(self, value: str):
+        self.userConfig['TurnTableController']['CONTROL_TRIGGER'] = value
+
+    @property
+    def scanPlanOptimization(self) -> bool:
+        return self.userConfig['TurnTableController'].getboolean('SCAN_PLAN_OPTIMIZATION', True)
+
+    @scanPlanOptimization.setter
+    def scanPlanOptimization(self, value: bool):
+        self.userConfig['TurnTableController']['SCAN_PLAN_OPTIMIZATION'] = str(value)
+
+    @property
+    def scanApproachDirection(self) -> str:
+        return self.userConfig['TurnTableController'].get('SCAN_APPROACH_DIRECTION', 'none')
+
+    @scanApproachDirection.setter
+    def scanApproachDirection(self, value: str):
+        self.userConfig['TurnTableController']['SCAN_APPROACH_DIRECTION'] = value
+
+    @property
+    def scanApproachDistance(self) -> float:
+        return self.userConfig['TurnTableController'].getfloat('SCAN_APPROACH_DISTANCE', 1.000)
+
+    @scanApproachDistance.setter
+    def scanApproachDistance(self, value: float):
+        self.userConfig['TurnTableController']['SCAN_APPROACH_DISTANCE'] = str(value)
+
+    @property
+    def autoTuneRelayAmplitude(self) -> float:
+        return self.userConfig['TurnTableController'].getfloat('AUTO_TUNE_RELAY_AMPLITUDE', 1.000)
+
+    @autoTuneRelayAmplitude.setter
+    def autoTuneRelayAmplitude(self, value: float):
+        self.userConfig['TurnTableController']['AUTO_TUNE_RELAY_AMPLITUDE'] = str(value)
+
+    @property
+    def autoTuneMoveSet(self) -> List[float]:
+        moveSet = self.userConfig['TurnTableController'].get('AUTO_TUNE_MOVE_SET', '0.5, 5.0, 45.0')
+        return [float(step) for step in moveSet.split(',')]
+
+    @autoTuneMoveSet.setter
+    def autoTuneMoveSet(self, value: List[float]):
+        self.userConfig['TurnTableController']['AUTO_TUNE_MOVE_SET'] = ', '.join(str(step) for step in value)
+
+    @property
+    def autoTuneApplyGains(self) -> bool:
+        return self.userConfig['TurnTableController'].getboolean('AUTO_TUNE_APPLY_GAINS', False)
+
+    @autoTuneApplyGains.setter
+    def autoTuneApplyGains(self, value: bool):
+        self.userConfig['TurnTableController']['AUTO_TUNE_APPLY_GAINS'] = str(value)
+
     @property
     def maximumAllowedError(self) -> float:
         return self.userConfig['TurnTableController'].getfloat('MAXIMUM_ALLOWED_ERROR', 0.025)
@@ -231,6 +409,22 @@ class ConfigurationManager:
     @pollDelay.setter
     def pollDelay(self, value: float):
         self.userConfig['TCPServer']['POLL_DELAY'] = str(value)
+
+    @property
+    def tcpServerBackend(self) -> str:
+        return self.userConfig['TCPServer'].get('BACKEND', 'threads')
+
+    @tcpServerBackend.setter
+    def tcpServerBackend(self, value: str):
+        self.userConfig['TCPServer']['BACKEND'] = value
+
+    @property
+    def scanPlanDirectory(self) -> str:
+        return self.userConfig['TCPServer'].get('SCAN_PLAN_DIRECTORY', 'scan_plans')
+
+    @scanPlanDirectory.setter
+    def scanPlanDirectory(self, value: str):
+        self.userConfig['TCPServer']['SCAN_PLAN_DIRECTORY'] = value
         
     @property
     def byteOrder(self) -> str:
@@ -284,12 +478,20 @@ class ConfigurationManager:
             'VOLTAGE_STEP': '0.1',
             'VOLTAGE_SAMPLE_PERIOD': '0.05',
             'VOLTAGE_UPDATE_PERIOD': '0.05',
+            'VOLTAGE_COALESCING_WINDOW': '0.05',
         }
 
         self.userConfig['ShaftEncoder'] = {
             'PORT': '10003',
             'POSITION_SAMPLE_PERIOD': '0.05',
             'MINIMUM_SAMPLE_PERIOD': '0.03',
+            'IDLE_SAMPLE_PERIOD': '0.25',
+            'ADAPTIVE_SAMPLING': 'True',
+            'PIPELINED_REQUESTS': 'False',
+            'HISTORY_LENGTH': '600.0',
+            'ESTIMATOR_ALPHA': '0.5',
+            'ESTIMATOR_BETA': '0.1',
+            'ESTIMATOR_GAMMA': '0.01',
         }
 
         self.userConfig['Watchdog'] = {
@@ -301,9 +503,23 @@ class ConfigurationManager:
         self.userConfig['TurnTableController'] = {
             'TURNTABLE_IP_ADDRESS': '192.168.22.22',
             'TIMEOUT': '1',
+            'CONNECTION_BACKEND': 'threads',
+            'STATISTICS_LOG_PERIOD': '60.0',
             'CONTROL_PROPORTIONAL_GAIN': '1.000',
             'CONTROL_INTEGRAL_GAIN': '0.100',
             'CONTROL_DERIVATIVE_GAIN': '0.100',
+            'CONTROL_DERIVATIVE_FILTER_TIME': '0.050',
+            'CONTROL_VELOCITY_FEEDFORWARD': '0.000',
+            'CONTROL_TRIGGER': 'timer',
+            'MOTION_PROFILE': 'trapezoidal',
+            'MAXIMUM_VELOCITY': '12.0',
+            'MAXIMUM_ACCELERATION': '40.0',
+            'SCAN_PLAN_OPTIMIZATION': 'True',
+            'SCAN_APPROACH_DIRECTION': 'none',
+            'SCAN_APPROACH_DISTANCE': '1.0',
+            'AUTO_TUNE_RELAY_AMPLITUDE': '1.0',
+            'AUTO_TUNE_MOVE_SET': '0.5, 5.0, 45.0',
+            'AUTO_TUNE_APPLY_GAINS': 'False',
             'MAXIMUM_ALLOWED_ERROR': '0.025',
             'MINIMUM_CONTROL_SIGNAL_VALUE': '1.2',
             'MINIMUM_GOTO_POSITION': '-720.000',
@@ -317,6 +533,8 @@ class ConfigurationManager:
             'IP_ADDRESS': 'localhost',
             'POSITION_ERROR': '0.05',
             'POLL_DELAY': '0.5',
+            'BACKEND': 'threads',
+            'SCAN_PLAN_DIRECTORY': 'scan_plans',
         }
 
         self.userConfig['GUI'] = {
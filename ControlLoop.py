@@ -0,0 +1,202 @@
+import time
+from contextlib import contextmanager
+from threading import Event
+from typing import Callable, Optional
+
+from Instrumentation import LatencyHistogram
+
+
+#------------------------------------------------------------------------------
+# Control Loop Statistics
+#------------------------------------------------------------------------------
+class ControlLoopStatistics:
+    """
+    The timing of every iteration of a control loop: the jitter of the start of the iteration relative to its deadline, the time
+    spent computing and the time spent waiting on I/O, the measured time steps, and the number of overruns and missed deadlines.
+    """
+    def __init__(self, nominalPeriod: float):
+        self.nominalPeriod = nominalPeriod
+        self.iterations = 0
+        self.overruns = 0
+        self.missedDeadlines = 0
+        self.jitter = LatencyHistogram()
+        self.computeTimes = LatencyHistogram()
+        self.ioTimes = LatencyHistogram()
+        self.timeSteps = LatencyHistogram()
+        self.startTime = None
+        self.endTime = None
+
+
+    @property
+    def duration(self) -> float:
+        if (self.startTime is None) or (self.endTime is None):
+            return 0.000
+        return self.endTime - self.startTime
+
+
+    @property
+    def meanPeriod(self) -> float:
+        return self.timeSteps.mean
+
+
+    def summary(self) -> str:
+        return (
+            f"{self.iterations} iterations in {self.duration:.3f}s, "
+            f"period nominal={self.nominalPeriod*1e3:.1f}ms mean={self.meanPeriod*1e3:.1f}ms max={self.timeSteps.maximum*1e3:.1f}ms, "
+            f"jitter p50={self.jitter.percentile(50)*1e3:.2f}ms p99={self.jitter.percentile(99)*1e3:.2f}ms, "
+            f"compute p99={self.computeTimes.percentile(99)*1e3:.2f}ms, I/O p99={self.ioTimes.percentile(99)*1e3:.2f}ms, "
+            f"{self.overruns} overruns, {self.missedDeadlines} missed deadlines"
+        )
+
+
+#------------------------------------------------------------------------------
+# Control Loop
+#------------------------------------------------------------------------------
+class ControlLoop:
+    """
+    Runs a control step at a fixed rate on absolute deadlines of the monotonic clock, so that the time that the step takes to execute
+    does not add to the period of the loop. The step is passed the measured time since the previous iteration, and returns False once
+    the loop should finish. If a step overruns the period, the deadlines that have already passed are skipped.
+    The clock and the sleep function can be replaced, so that the loop can also be run on a simulated clock.
+    """
+    def __init__(self, period: float, clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = None):
+        self.period = period
+        self._clock = clock
+        self._stopEvent = Event()
+        self._sleep = self._stopEvent.wait if (sleep is None) else sleep
+        self._ioTime = 0.000
+        self.statistics = ControlLoopStatistics(period)
+
+
+    def stop(self):
+        self._stopEvent.set()
+
+
+    def isStopped(self) -> bool:
+        return self._stopEvent.is_set()
+
+
+    @contextmanager
+    def measureIO(self):
+        """
+        Attributes the time spent in the block to I/O instead of to the computation of the current iteration
+        """
+        startTime = self._clock()
+        try:
+            yield
+        finally:
+            self._ioTime += self._clock() - startTime
+
+
+    def run(self, step: Callable[[float], bool]) -> ControlLoopStatistics:
+        statistics = self.statistics
+        deadline = self._clock()
+        previousStartTime = None
+        statistics.startTime = deadline
+
+        while not self._stopEvent.is_set():
+            startTime = self._clock()
+            timeStep = self.period if (previousStartTime is None) else (startTime - previousStartTime)
+            previousStartTime = startTime
+
+            keepRunning, endTime = self._runStep(step, timeStep, startTime, deadline)
+
+            if not keepRunning:
+                break
+
+            deadline += self.period
+            if endTime > deadline:
+                # The iteration finished after the next deadline, so every deadline that has already passed is skipped
+                missedDeadlines = int((endTime - deadline) // self.period) + 1
+                statistics.overruns += 1
+                statistics.missedDeadlines += missedDeadlines
+                deadline += missedDeadlines*self.period
+
+            self._sleep(max(deadline - self._clock(), 0.000))
+
+        statistics.endTime = self._clock()
+        return statistics
+
+
+    def _runStep(self, step: Callable[[float], bool], timeStep: float, startTime: float, releaseTime: float):
+        statistics = self.statistics
+
+        self._ioTime = 0.000
+        keepRunning = step(timeStep)
+        endTime = self._clock()
+
+        statistics.iterations += 1
+        statistics.jitter.record(startTime - releaseTime)
+        statistics.ioTimes.record(self._ioTime)
+        statistics.computeTimes.record(endTime - startTime - self._ioTime)
+        if statistics.iterations > 1:
+            statistics.timeSteps.record(timeStep)
+
+        return keepRunning, endTime
+
+
+#------------------------------------------------------------------------------
+# Sample Triggered Control Loop
+#------------------------------------------------------------------------------
+class SampleTriggeredControlLoop(ControlLoop):
+    """
+    Runs the control step once for every new sample of the Shaft Encoder instead of on a timer, so that no step acts on a sample that
+    has already been used, and the time from the sample to the voltage write is a single I/O round trip.
+    The step is passed the time between the timestamps of the samples, and the jitter records the age of the sample when the step
+    starts. If no new sample arrives within the sample timeout, a missed deadline is recorded and the step is run anyway, so that
+    the move can still be finished or stopped. Stopping the loop calls wakeWaiters, so that a wait for a sample ends at once.
+    """
+    def __init__(
+        self, period: float,
+        waitForSample: Callable[[int, float, Callable[[], bool]], Optional["PositionSample"]],
+        sampleTimeout: float,
+        wakeWaiters: Callable[[], None] = None,
+        clock: Callable[[], float] = time.monotonic):
+
+        super().__init__(period, clock=clock)
+        self.sampleTimeout = sampleTimeout
+        self._waitForSample = waitForSample
+        self._wakeWaiters = wakeWaiters
+
+
+    def stop(self):
+        super().stop()
+        if self._wakeWaiters is not None:
+            self._wakeWaiters()
+
+
+    def run(self, step: Callable[[float], bool]) -> ControlLoopStatistics:
+        statistics = self.statistics
+        statistics.startTime = self._clock()
+        previousSequence = None
+        # The time up to which the previous step has integrated, either the timestamp of its sample or the time of a step without one
+        previousTime = None
+
+        while not self._stopEvent.is_set():
+            sample = self._waitForSample(previousSequence, self.sampleTimeout, self.isStopped)
+            startTime = self._clock()
+
+            if self._stopEvent.is_set():
+                break
+
+            if sample is None:
+                statistics.missedDeadlines += 1
+                timeStep = startTime - (statistics.startTime if (previousTime is None) else previousTime)
+                releaseTime = startTime
+                previousTime = startTime
+            else:
+                timeStep = self.period if (previousTime is None) else max(sample.timestamp - previousTime, 0.000)
+                releaseTime = sample.timestamp
+                previousTime = sample.timestamp
+                previousSequence = sample.sequence
+
+            keepRunning, endTime = self._runStep(step, timeStep, startTime, releaseTime)
+
+            if not keepRunning:
+                break
+
+            if (endTime - startTime) > self.period:
+                statistics.overruns += 1
+
+        statistics.endTime = self._clock()
+        return statistics
@@ -0,0 +1,348 @@
+import argparse
+import logging
+import math
+import random
+import sys
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from ConfigurationManager import ConfigurationManager
+from ControlLoop import ControlLoop
+from EncoderFrameDecoder import REVOLUTION_ANGLES, STEP_ANGLES
+from MotionExecutor import ControlParameters, MotionCallbacks, MotionExecutor, MoveStatus
+from MotionProfile import estimateMoveTime
+from PlantModel import PlantModel, PlantParameters
+from ShaftEncoderModel import PositionSample
+from StateEstimator import StateEstimator
+
+
+#------------------------------------------------------------------------------
+# Virtual Clock
+#------------------------------------------------------------------------------
+class VirtualClock:
+    """
+    A clock that only advances when it is slept on, so that a control loop that runs on it runs as fast as the code allows
+    """
+    def __init__(self, startTime: float = 0.000):
+        self.time = startTime
+
+
+    def __call__(self) -> float:
+        return self.time
+
+
+    def sleep(self, duration: float):
+        self.time += max(duration, 0.000)
+
+
+#------------------------------------------------------------------------------
+# Simulated Drive
+#------------------------------------------------------------------------------
+class SimulatedDrive:
+    """
+    The plant model of the turn table on a virtual clock, as it is seen by the control code: the plant is advanced to the current time
+    whenever it is accessed, the Shaft Encoder counts are decoded with the lookup tables of the EncoderFrameDecoder, and every voltage
+    write takes the I/O latency to reach the motor, during which the previous voltage is still applied. Like the watchdog outputs of
+    the turn table, the voltage only reaches the motor while it is enabled.
+    """
+    def __init__(self, plant: PlantModel, clock: VirtualClock, ioLatency: float = 0.005):
+        self.plant = plant
+        self.ioLatency = ioLatency
+        self.voltage = 0.000
+        self.enabled = False
+        self._clock = clock
+        self._lastUpdateTime = clock()
+        self._sequence = 0
+
+
+    def update(self):
+        now = self._clock()
+        self.plant.advance(now - self._lastUpdateTime, self.voltage if self.enabled else 0.000)
+        self._lastUpdateTime = now
+
+
+    def sample(self) -> PositionSample:
+        self.update()
+        revolution, step = self.plant.encoderCounts()
+        self._sequence += 1
+        return PositionSample(REVOLUTION_ANGLES[revolution] + STEP_ANGLES[step], revolution, step, self._clock(), self._sequence)
+
+
+    def setVoltage(self, voltage: float):
+        self._clock.sleep(self.ioLatency)
+        self.update()
+        self.voltage = voltage
+
+
+    def setEnabled(self, enabled: bool):
+        self.update()
+        self.enabled = enabled
+
+
+#------------------------------------------------------------------------------
+# Simulation Results
+#------------------------------------------------------------------------------
+@dataclass(frozen=True)
+class SimulatedMove:
+    start: float
+    target: float
+    arrived: bool
+    moveTime: float                 # Time until the control law reported the arrival, or until the move was aborted
+    settleTime: Optional[float]     # Time after which the angle stayed within the tolerance, or None if it did not settle
+    overshoot: float                # Largest excursion of the angle beyond the target in the direction of the move, in deg
+    finalError: float               # Angle of the plant minus the target at the end of the settle window, in deg
+    iterations: int
+
+
+def percentile(values: Sequence[float], percentile: float) -> float:
+    if not values:
+        return math.nan
+    orderedValues = sorted(values)
+    return orderedValues[min(int(len(orderedValues)*percentile/100), len(orderedValues) - 1)]
+
+
+class SimulationReport:
+    def __init__(self, moves: List[SimulatedMove], wallTime: float):
+        self.moves = moves
+        self.wallTime = wallTime
+
+
+    @property
+    def arrivedCount(self) -> int:
+        return sum(1 for move in self.moves if move.arrived)
+
+
+    @property
+    def settledCount(self) -> int:
+        return sum(1 for move in self.moves if move.settleTime is not None)
+
+
+    @property
+    def settleTimes(self) -> List[float]:
+        return [move.settleTime for move in self.moves if move.settleTime is not None]
+
+
+    @property
+    def maximumOvershoot(self) -> float:
+        return max((move.overshoot for move in self.moves), default=0.000)
+
+
+    @property
+    def maximumFinalError(self) -> float:
+        return max((abs(move.finalError) for move in self.moves), default=0.000)
+
+
+    @property
+    def movesPerSecond(self) -> float:
+        return len(self.moves)/self.wallTime if (self.wallTime > 0) else math.inf
+
+
+    def summary(self) -> str:
+        finalErrors = [abs(move.finalError) for move in self.moves]
+        overshoots = [move.overshoot for move in self.moves]
+        return (
+            f"{len(self.moves)} moves, {self.arrivedCount} arrived, {self.settledCount} settled, "
+            f"settle time p50={percentile(self.settleTimes, 50):.3f}s p99={percentile(self.settleTimes, 99):.3f}s, "
+            f"overshoot p50={percentile(overshoots, 50):.3f}deg max={self.maximumOvershoot:.3f}deg, "
+            f"final error p50={percentile(finalErrors, 50):.4f}deg max={self.maximumFinalError:.4f}deg, "
+            f"{self.movesPerSecond:.0f} moves/s"
+        )
+
+
+#------------------------------------------------------------------------------
+# Control Simulation
+#------------------------------------------------------------------------------
+class ControlSimulation:
+    """
+    Runs moves against the plant model on a virtual clock, faster than real time.
+    Every move is run by a MotionExecutor with a ControlLoop, the same code that moves the turn table, except that the clock and the
+    sleep of the control loop are the virtual clock. The angle comes from the decoded Shaft Encoder counts and the velocity from the
+    StateEstimator. Once the move has arrived and the MotionExecutor has set the voltage to zero and disabled the motor, the plant is
+    observed for the settle window, so that the final error includes the angle by which the turn table coasts after the move. A move
+    that has not arrived within the arrival timeout after the end of its motion profile is cancelled.
+    The settle time, overshoot and final error are measured on the angle of the plant instead of on the measured angle.
+    """
+    def __init__(
+        self, parameters: ControlParameters,
+        plantParameters: PlantParameters = None,
+        controlPeriod: float = 0.050,
+        ioLatency: float = 0.005,
+        estimatorGains: Tuple[float, float, float] = (0.5, 0.1, 0.01),
+        settleWindow: float = 1.000,
+        arrivalTimeout: float = 10.000):
+
+        self.parameters = parameters
+        self.plantParameters = PlantParameters() if (plantParameters is None) else plantParameters
+        self.controlPeriod = controlPeriod
+        self.ioLatency = ioLatency
+        self.estimatorGains = estimatorGains
+        self.settleWindow = settleWindow
+        self.arrivalTimeout = arrivalTimeout
+
+
+    @classmethod
+    def fromSettings(cls, settingsManager: ConfigurationManager, plantParameters: PlantParameters = None) -> "ControlSimulation":
+        return cls(
+            ControlParameters.fromSettings(settingsManager),
+            plantParameters=plantParameters,
+            controlPeriod=settingsManager.voltageUpdatePeriod,
+            estimatorGains=(settingsManager.estimatorAlpha, settingsManager.estimatorBeta, settingsManager.estimatorGamma),
+        )
+
+
+    def run(self, moves: Sequence[Tuple[float, float]]) -> SimulationReport:
+        startTime = time.perf_counter()
+        results = [self.simulateMove(start, target) for start, target in moves]
+        return SimulationReport(results, time.perf_counter() - startTime)
+
+
+    def simulateMove(self, start: float, target: float) -> SimulatedMove:
+        clock = VirtualClock()
+        drive = SimulatedDrive(PlantModel(self.plantParameters, initialAngle=start), clock, self.ioLatency)
+        estimator = StateEstimator(*self.estimatorGains)
+        plant = drive.plant
+
+        parameters = self.parameters
+        tolerance = parameters.maximumAllowedError
+        direction = math.copysign(1.0, target - start)
+        profileDuration = estimateMoveTime(target - start, parameters.maximumVelocity, parameters.maximumAcceleration) if (parameters.motionProfile == 'trapezoidal') else 0.000
+        timeout = profileDuration + self.arrivalTimeout
+        overshoot = 0.000
+        settleTime = None
+
+        def observe():
+            nonlocal overshoot, settleTime
+            error = plant.angle - target
+            overshoot = max(overshoot, error*direction)
+
+            if abs(error) > tolerance:
+                settleTime = None
+            elif settleTime is None:
+                settleTime = clock()
+
+        def getPosition() -> float:
+            sample = drive.sample()
+            estimator.update(sample)
+            observe()
+            return sample.angle
+
+        def sleep(duration: float):
+            clock.sleep(duration)
+            if clock() >= timeout:
+                executor.cancel()
+
+        executor = MotionExecutor(
+            MotionCallbacks(
+                getPosition=getPosition,
+                getVelocity=lambda: estimator.state.velocity,
+                setVoltage=drive.setVoltage,
+                enableMotor=lambda: drive.setEnabled(True),
+                disableMotor=lambda: drive.setEnabled(False),
+            ),
+            createParameters=lambda: parameters,
+            createControlLoop=lambda: ControlLoop(self.controlPeriod, clock=clock, sleep=sleep),
+            clock=clock,
+            name="Simulated Motion Executor",
+        )
+
+        try:
+            result = executor.moveTo(target).result()
+        finally:
+            executor.shutdown()
+
+        moveTime = clock()
+
+        while (clock() - moveTime) < self.settleWindow:
+            clock.sleep(self.controlPeriod)
+            drive.update()
+            observe()
+
+        return SimulatedMove(
+            start=start,
+            target=target,
+            arrived=result.status == MoveStatus.ARRIVED,
+            moveTime=moveTime,
+            settleTime=settleTime,
+            overshoot=overshoot,
+            finalError=plant.angle - target,
+            iterations=0 if (result.statistics is None) else result.statistics.iterations,
+        )
+
+
+#------------------------------------------------------------------------------
+# Move Sets
+#------------------------------------------------------------------------------
+STANDARD_STEPS = (0.1, 0.5, 1.0, 5.0, 10.0, 45.0, 90.0, 180.0)
+
+
+def createMoveSet(count: int, minimumPosition: float, maximumPosition: float, seed: int = 0) -> List[Tuple[float, float]]:
+    """
+    Returns the standard steps forth and back from zero, followed by random moves between the limits, which are reproducible for a
+    seed. The sizes of the random moves are distributed log-uniformly between the smallest and the largest standard step
+    """
+    moves = [move for step in STANDARD_STEPS for move in ((0.000, step), (step, 0.000), (0.000, -step), (-step, 0.000))]
+    generator = random.Random(seed)
+
+    while len(moves) < count:
+        start = generator.uniform(minimumPosition, maximumPosition)
+        step = math.exp(generator.uniform(math.log(STANDARD_STEPS[0]), math.log(STANDARD_STEPS[-1])))
+        target = start + generator.choice((-step, step))
+
+        if minimumPosition <= target <= maximumPosition:
+            moves.append((round(start, 3), round(target, 3)))
+
+    return moves[:count]
+
+
+#------------------------------------------------------------------------------
+# Main Function
+#------------------------------------------------------------------------------
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Simulates moves of the control law against the plant model faster than real time")
+    parser.add_argument("--config", default="./config.ini", help="The configuration file from which the control parameters are read")
+    parser.add_argument("--moves", type=int, default=1000, help="The number of moves, starting with the standard steps")
+    parser.add_argument("--seed", type=int, default=0, help="The seed of the random moves")
+    parser.add_argument("--motor-gain", type=float, default=PlantParameters.motorGain)
+    parser.add_argument("--time-constant", type=float, default=PlantParameters.timeConstant)
+    parser.add_argument("--deadband", type=float, default=PlantParameters.deadband)
+    parser.add_argument("--io-latency", type=float, default=0.005, help="The time from the position sample to the voltage write")
+    parser.add_argument("--maximum-settle-time", type=float, default=None, help="Fails if the 99th percentile of the settle time is larger")
+    parser.add_argument("--maximum-overshoot", type=float, default=None, help="Fails if any move overshoots further")
+    parser.add_argument("--maximum-final-error", type=float, default=None, help="Fails if the final error of any move is larger, by default than the maximum allowed error")
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    settingsManager = ConfigurationManager(arguments.config)
+    simulation = ControlSimulation.fromSettings(
+        settingsManager,
+        PlantParameters(motorGain=arguments.motor_gain, timeConstant=arguments.time_constant, deadband=arguments.deadband),
+    )
+    simulation.ioLatency = arguments.io_latency
+
+    moves = createMoveSet(arguments.moves, settingsManager.minimumGotoPosition, settingsManager.maximumGotoPosition, arguments.seed)
+    report = simulation.run(moves)
+    print(report.summary())
+
+    failures = []
+    if report.arrivedCount < len(report.moves):
+        failures.append(f"{len(report.moves) - report.arrivedCount} moves did not arrive")
+    if report.settledCount < len(report.moves):
+        failures.append(f"{len(report.moves) - report.settledCount} moves did not settle within {simulation.parameters.maximumAllowedError:.4f}deg")
+    if (arguments.maximum_settle_time is not None) and (percentile(report.settleTimes, 99) > arguments.maximum_settle_time):
+        failures.append(f"the settle time exceeds {arguments.maximum_settle_time:.3f}s")
+    if (arguments.maximum_overshoot is not None) and (report.maximumOvershoot > arguments.maximum_overshoot):
+        failures.append(f"the overshoot exceeds {arguments.maximum_overshoot:.3f}deg")
+    maximumFinalError = simulation.parameters.maximumAllowedError if (arguments.maximum_final_error is None) else arguments.maximum_final_error
+    if report.maximumFinalError > maximumFinalError:
+        failures.append(f"the final error exceeds {maximumFinalError:.4f}deg")
+
+    for failure in failures:
+        print(f"FAILED: {failure}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
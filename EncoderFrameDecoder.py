@@ -0,0 +1,156 @@
+import struct
+from array import array
+from dataclasses import dataclass
+from typing import NamedTuple, Tuple
+
+
+#------------------------------------------------------------------------------
+# Position Dataclass
+#------------------------------------------------------------------------------
+@dataclass
+class Position:
+    STEPS_PER_REVOLUTION = 8192
+    MAXIMUM_REVOLUTIONS = 4096
+    DEGREES_PER_STEP = 360.0/(STEPS_PER_REVOLUTION-1)
+    GEARBOX_REDUCTION = 73
+
+    step: int = 0
+    revolution: int = 0
+
+    @staticmethod
+    def signedCounts(revolution: int, step: int) -> Tuple[int, int]:
+        # Here we are changing the revolution and step values so that it is possible to account for negative angles.
+        # This is accomplished by using the Revolution count from the encoder to determine whether we are going in the positive or negative direction.
+        # If the turn count is in the count range of 0-2047, the angle is considered to be positive. If we are in the range of 2048-4095, the angle is considered to be negative
+        # This ends up halving the number of turns we can track, but this is find, since we will still be able to track 28 turns in the positive direction or 28 turns in the negative direction
+
+        # Furthermore, to ensure that the negative angle calculations are performed correctly, we offset the revolution count by 1 when it is negative. This ensures that the negative angles do
+        # not start at -360, as opposed to 0
+        # We also need to make sure that if we are moving in the negative direction that we count the steps down as the steps in the negative direction will start from 8191 and count downwards,
+        # thus we offset the step count by 8192 when the revolutions are negative
+        revolution = (revolution - 4096) if (revolution > 2047) else revolution
+        step = (step - 8192) if (revolution < 0) else step
+        revolution = (revolution + 1)  if (revolution < 0) else revolution
+        return revolution, step
+
+    @property
+    def angle(self) -> float:
+        revolution, step = self.signedCounts(self.revolution, self.step)
+        return -(step * self.DEGREES_PER_STEP + (revolution * 360))/self.GEARBOX_REDUCTION
+
+
+#------------------------------------------------------------------------------
+# Lookup Tables
+#------------------------------------------------------------------------------
+def _createRevolutionAngleTable() -> array:
+    """
+    The angle contributed by every possible revolution count, including the step offset that is applied to negative revolutions.
+    Adding the angle of the step count from the STEP_ANGLES table gives the same angle as Position.angle
+    """
+    angles = array('d')
+    for revolution in range(Position.MAXIMUM_REVOLUTIONS):
+        signedRevolution, stepOffset = Position.signedCounts(revolution, 0)
+        angles.append(-(stepOffset * Position.DEGREES_PER_STEP + (signedRevolution * 360))/Position.GEARBOX_REDUCTION)
+    return angles
+
+
+REVOLUTION_ANGLES = _createRevolutionAngleTable()
+STEP_ANGLES = array('d', (-(step * Position.DEGREES_PER_STEP)/Position.GEARBOX_REDUCTION for step in range(Position.STEPS_PER_REVOLUTION)))
+
+# The XOR of the high and low byte of every 16-bit word, so that the LRC of the multi-turn and single-turn words can each be found with a single lookup
+WORD_LRC = bytes(((word >> 8) ^ (word & 0xFF)) for word in range(0x10000))
+
+
+#------------------------------------------------------------------------------
+# Decoded Frame
+#------------------------------------------------------------------------------
+class DecodedFrame(NamedTuple):
+    revolution: int
+    step: int
+    angle: float
+
+
+#------------------------------------------------------------------------------
+# Encoder Frame Decoder
+#------------------------------------------------------------------------------
+class EncoderFrameDecoder:
+    """
+    Decodes the position response frames of the Baumer GXM7W-RS485, which have the following structure:
+    [SOH][EAD][MT_H][MT_L][ST_H][ST_L][LRC][EOT]
+    Each set of square brackets represents an 8-bit byte. The frame is valid if the SOH, EAD and EOT bytes are present, if the LRC byte
+    is equal to the XOR of the [EAD][MT_H][MT_L][ST_H][ST_L] bytes, and if the revolution and step counts are within the range of the encoder.
+    The frame is unpacked with a single precompiled struct, and the LRC and the angle are found with table lookups, so that every frame
+    is decoded exactly once without any bit shifting of a 64-bit integer.
+    """
+    FRAME = struct.Struct(">BBHHBB")
+    START_OF_HEADER = 0x01
+    END_OF_TRANSMISSION = 0x04
+
+    def __init__(self, serialAddress: int):
+        self.serialAddress = serialAddress
+
+
+    def decode(self, frame: bytes) -> DecodedFrame:
+        """
+        Returns the decoded revolution, step and angle of the frame, or None if the frame is not valid
+        """
+        if len(frame) != self.FRAME.size:
+            return None
+
+        startOfHeader, address, revolution, step, lrc, endOfTransmission = self.FRAME.unpack_from(memoryview(frame))
+
+        if ((startOfHeader & self.START_OF_HEADER) != self.START_OF_HEADER) or ((address & self.serialAddress) != self.serialAddress) or ((endOfTransmission & self.END_OF_TRANSMISSION) != self.END_OF_TRANSMISSION):
+            return None
+
+        if lrc != (address ^ WORD_LRC[revolution] ^ WORD_LRC[step]):
+            return None
+
+        # The encoder never reports counts outside of its range, so a frame that does is corrupted even though its LRC matches
+        if (revolution >= Position.MAXIMUM_REVOLUTIONS) or (step >= Position.STEPS_PER_REVOLUTION):
+            return None
+
+        return DecodedFrame(revolution, step, REVOLUTION_ANGLES[revolution] + STEP_ANGLES[step])
+
+
+#------------------------------------------------------------------------------
+# Batch Decoding
+#------------------------------------------------------------------------------
+class DecodedFrames(NamedTuple):
+    valid: "numpy.ndarray"
+    revolutions: "numpy.ndarray"
+    steps: "numpy.ndarray"
+    angles: "numpy.ndarray"
+
+
+def decodeFrames(frames: bytes, serialAddress: int) -> DecodedFrames:
+    """
+    Decodes a recording of back to back 8-byte position frames at once with NumPy, for the offline analysis of long recordings.
+    The angles of the invalid frames are set to NaN. NumPy is only required when this function is used.
+    """
+    import numpy
+
+    frameDataType = numpy.dtype([
+        ('startOfHeader', 'u1'), ('address', 'u1'), ('revolution', '>u2'), ('step', '>u2'), ('lrc', 'u1'), ('endOfTransmission', 'u1')
+    ])
+    decodedFrames = numpy.frombuffer(frames, dtype=frameDataType, count=len(frames) // frameDataType.itemsize)
+
+    revolutions = decodedFrames['revolution'].astype(numpy.uint16)
+    steps = decodedFrames['step'].astype(numpy.uint16)
+
+    calculatedLRC = decodedFrames['address'] ^ (revolutions >> 8).astype(numpy.uint8) ^ (revolutions & 0xFF).astype(numpy.uint8) ^ (steps >> 8).astype(numpy.uint8) ^ (steps & 0xFF).astype(numpy.uint8)
+    valid = (
+        ((decodedFrames['startOfHeader'] & EncoderFrameDecoder.START_OF_HEADER) == EncoderFrameDecoder.START_OF_HEADER)
+        & ((decodedFrames['address'] & serialAddress) == serialAddress)
+        & ((decodedFrames['endOfTransmission'] & EncoderFrameDecoder.END_OF_TRANSMISSION) == EncoderFrameDecoder.END_OF_TRANSMISSION)
+        & (decodedFrames['lrc'] == calculatedLRC)
+        & (revolutions < Position.MAXIMUM_REVOLUTIONS)
+        & (steps < Position.STEPS_PER_REVOLUTION)
+    )
+
+    revolutionAngles = numpy.frombuffer(REVOLUTION_ANGLES, dtype=numpy.float64)
+    stepAngles = numpy.frombuffer(STEP_ANGLES, dtype=numpy.float64)
+    # The counts of the invalid frames are wrapped only so that they can be looked up, their angles are discarded below
+    angles = revolutionAngles[revolutions % Position.MAXIMUM_REVOLUTIONS] + stepAngles[steps % Position.STEPS_PER_REVOLUTION]
+    angles[~valid] = numpy.nan
+
+    return DecodedFrames(valid, revolutions, steps, angles)
@@ -0,0 +1,163 @@
+from array import array
+from threading import Lock
+from typing import NamedTuple
+
+
+#------------------------------------------------------------------------------
+# History Slice
+#------------------------------------------------------------------------------
+class EncoderHistorySlice(NamedTuple):
+    timestamps: array
+    angles: array
+    revolutions: array
+    steps: array
+
+
+#------------------------------------------------------------------------------
+# Encoder History Ring Buffer
+#------------------------------------------------------------------------------
+class EncoderHistory:
+    """
+    A fixed capacity ring buffer of the most recent Shaft Encoder samples.
+    The samples are stored column wise in preallocated typed arrays, so that no Python objects are created per sample and the
+    memory used by the history is bounded by the capacity. Once the buffer is full, the oldest sample is overwritten.
+    The timestamps are taken from the monotonic clock and are therefore sorted in the order in which the samples were appended,
+    which allows the time range queries to use a binary search.
+    """
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("The capacity of the Encoder History must be at least 1")
+
+        self.capacity = capacity
+        self._timestamps = array('d', bytes(8*capacity))
+        self._angles = array('d', bytes(8*capacity))
+        self._revolutions = array('H', bytes(2*capacity))
+        self._steps = array('H', bytes(2*capacity))
+
+        self._head = 0
+        self._count = 0
+        self._lock = Lock()
+
+
+    def __len__(self) -> int:
+        return self._count
+
+
+#------------------------------------------------------------------------------
+# Append Methods
+#------------------------------------------------------------------------------
+    def append(self, timestamp: float, angle: float, revolution: int, step: int):
+        with self._lock:
+            head = self._head
+            self._timestamps[head] = timestamp
+            self._angles[head] = angle
+            self._revolutions[head] = revolution
+            self._steps[head] = step
+
+            self._head = (head + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+
+    def appendSample(self, sample):
+        self.append(sample.timestamp, sample.angle, sample.revolution, sample.step)
+
+
+    def clear(self):
+        with self._lock:
+            self._head = 0
+            self._count = 0
+
+
+#------------------------------------------------------------------------------
+# Query Methods
+#------------------------------------------------------------------------------
+    def latest(self, count: int) -> EncoderHistorySlice:
+        with self._lock:
+            count = max(0, min(count, self._count))
+            return self._slice(self._count - count, self._count)
+
+
+    def between(self, startTime: float, endTime: float) -> EncoderHistorySlice:
+        """
+        Returns all the samples with startTime <= timestamp <= endTime
+        """
+        with self._lock:
+            return self._slice(self._bisectLeft(startTime), self._bisectRight(endTime))
+
+
+    def interpolate(self, timestamp: float) -> float:
+        """
+        Returns the angle at the given time by linearly interpolating between the two samples on either side of it.
+        None is returned if the time falls outside of the range of time covered by the history.
+        """
+        with self._lock:
+            if self._count == 0:
+                return None
+
+            index = self._bisectLeft(timestamp)
+
+            if index == self._count:
+                return None
+
+            upperTimestamp = self._timestamps[self._physicalIndex(index)]
+            upperAngle = self._angles[self._physicalIndex(index)]
+
+            if upperTimestamp == timestamp:
+                return upperAngle
+
+            if index == 0:
+                return None
+
+            lowerTimestamp = self._timestamps[self._physicalIndex(index - 1)]
+            lowerAngle = self._angles[self._physicalIndex(index - 1)]
+
+            return lowerAngle + (upperAngle - lowerAngle)*(timestamp - lowerTimestamp)/(upperTimestamp - lowerTimestamp)
+
+
+#------------------------------------------------------------------------------
+# Ring Buffer Helper Methods
+#------------------------------------------------------------------------------
+    def _physicalIndex(self, logicalIndex: int) -> int:
+        """
+        Converts an index counted from the oldest sample in the history to the index in the underlying arrays
+        """
+        return (self._head - self._count + logicalIndex) % self.capacity
+
+
+    def _bisectLeft(self, timestamp: float) -> int:
+        lower, upper = 0, self._count
+        while lower < upper:
+            middle = (lower + upper) // 2
+            if self._timestamps[self._physicalIndex(middle)] < timestamp:
+                lower = middle + 1
+            else:
+                upper = middle
+        return lower
+
+
+    def _bisectRight(self, timestamp: float) -> int:
+        lower, upper = 0, self._count
+        while lower < upper:
+            middle = (lower + upper) // 2
+            if timestamp < self._timestamps[self._physicalIndex(middle)]:
+                upper = middle
+            else:
+                lower = middle + 1
+        return lower
+
+
+    def _slice(self, startIndex: int, endIndex: int) -> EncoderHistorySlice:
+        """
+        Copies the samples between two logical indices out of the ring buffer. The selected range is at most split into two
+        contiguous blocks in the underlying arrays, which are copied with array slicing instead of sample by sample.
+        """
+        if endIndex <= startIndex:
+            return EncoderHistorySlice(array('d'), array('d'), array('H'), array('H'))
+
+        start = self._physicalIndex(startIndex)
+        end = self._physicalIndex(endIndex - 1) + 1
+
+        def copy(column: array) -> array:
+            return column[start:end] if (start < end) else (column[start:] + column[:end])
+
+        return EncoderHistorySlice(copy(self._timestamps), copy(self._angles), copy(self._revolutions), copy(self._steps))
@@ -0,0 +1,441 @@
+import argparse
+import itertools
+import logging
+import math
+import sys
+import time
+from dataclasses import dataclass, replace
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from ConfigurationManager import ConfigurationManager
+from ControlSimulation import STANDARD_STEPS, createMoveSet
+from EncoderFrameDecoder import REVOLUTION_ANGLES, STEP_ANGLES
+from MotionExecutor import ControlParameters
+from MotionProfile import TrapezoidalProfile, estimateMoveTime
+from PlantModel import PlantModel, PlantParameters
+
+
+#------------------------------------------------------------------------------
+# Gain Candidates
+#------------------------------------------------------------------------------
+class GainCandidate(NamedTuple):
+    proportionalGain: float
+    integralGain: float
+    derivativeGain: float
+    minimumControlSignalValue: float
+
+
+def createGainGrid(
+    proportionalGains: Sequence[float],
+    integralGains: Sequence[float],
+    derivativeGains: Sequence[float],
+    minimumControlSignalValues: Sequence[float]) -> List[GainCandidate]:
+
+    return [GainCandidate(*gains) for gains in itertools.product(proportionalGains, integralGains, derivativeGains, minimumControlSignalValues)]
+
+
+DEFAULT_PROPORTIONAL_GAINS = (0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 4.0, 6.0, 8.0)
+DEFAULT_INTEGRAL_GAINS = (0.0, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0)
+DEFAULT_DERIVATIVE_GAINS = (0.0, 0.02, 0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.6, 0.8)
+DEFAULT_MINIMUM_CONTROL_SIGNAL_VALUES = (0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2, 1.3, 1.4, 1.5)
+
+
+#------------------------------------------------------------------------------
+# Sweep Results
+#------------------------------------------------------------------------------
+@dataclass(frozen=True)
+class CandidateResult:
+    candidate: GainCandidate
+    arrivedCount: int
+    settledCount: int
+    meanSettleTime: float           # Mean settle time of the settled moves, or NaN if no move settled
+    maximumSettleTime: float
+    maximumOvershoot: float
+    maximumFinalError: float
+    score: float                    # Mean charged settle time plus the weighted maximum overshoot and mean final error, lower is better
+
+    @property
+    def rank(self) -> float:
+        return self.score if not math.isnan(self.score) else math.inf
+
+    def summary(self) -> str:
+        candidate = self.candidate
+        return (
+            f"Kp={candidate.proportionalGain:.3f} Ki={candidate.integralGain:.3f} Kd={candidate.derivativeGain:.3f} "
+            f"min signal={candidate.minimumControlSignalValue:.3f}V: {self.settledCount} settled, "
+            f"settle time mean={self.meanSettleTime:.3f}s max={self.maximumSettleTime:.3f}s, "
+            f"overshoot max={self.maximumOvershoot:.3f}deg, final error max={self.maximumFinalError:.4f}deg, cost={self.score:.3f}s"
+        )
+
+
+class SweepReport:
+    def __init__(self, results: List[CandidateResult], moveCount: int, wallTime: float):
+        self.results = sorted(results, key=lambda result: result.rank)
+        self.moveCount = moveCount
+        self.wallTime = wallTime
+
+
+    @property
+    def best(self) -> Optional[CandidateResult]:
+        return self.results[0] if self.results else None
+
+
+    @property
+    def candidatesPerSecond(self) -> float:
+        return len(self.results)/self.wallTime if (self.wallTime > 0) else math.inf
+
+
+    def summary(self, count: int = 10) -> str:
+        lines = [f"{len(self.results)} candidates over {self.moveCount} moves in {self.wallTime:.2f}s ({self.candidatesPerSecond:.0f} candidates/s)"]
+        lines += [f"{index + 1:3d}. {result.summary()}" for index, result in enumerate(self.results[:count])]
+        return "\n".join(lines)
+
+
+#------------------------------------------------------------------------------
+# Gain Sweep
+#------------------------------------------------------------------------------
+class GainSweep:
+    """
+    Simulates the PositionControlLaw against the plant model for a whole grid of gain candidates at once, with NumPy arrays in which
+    every element is one move of one candidate, so that 10k candidates take seconds instead of the minutes of the ControlSimulation.
+    The simulation is a transcription of the ControlSimulation into array operations: the same motion profile, the same PID controller
+    with conditional integration, the same quantisation of the Shaft Encoder and the same alpha-beta-gamma estimator, the same I/O
+    latency and settle window. It therefore gives the same results as the ControlSimulation for each candidate.
+    Only the gains and the minimum control signal are swept, all other control parameters are taken from the base parameters.
+    The candidates are ranked on a single cost: the mean settle time over all moves, where a move that did not settle is charged the
+    whole time for which it was simulated, plus the weighted maximum overshoot and the weighted mean final error. A candidate that
+    settles most moves slowly therefore does not rank above one that settles nearly all of them quickly.
+    NumPy is only required when the sweep is run.
+    """
+    def __init__(
+        self, parameters: ControlParameters,
+        plantParameters: PlantParameters = None,
+        controlPeriod: float = 0.050,
+        ioLatency: float = 0.005,
+        estimatorGains: Tuple[float, float, float] = (0.5, 0.1, 0.01),
+        settleWindow: float = 1.000,
+        arrivalTimeout: float = 10.000,
+        overshootWeight: float = 10.000,
+        finalErrorWeight: float = 10.000):
+
+        self.parameters = parameters
+        self.plantParameters = PlantParameters() if (plantParameters is None) else plantParameters
+        self.controlPeriod = controlPeriod
+        self.ioLatency = ioLatency
+        self.estimatorGains = estimatorGains
+        self.settleWindow = settleWindow
+        self.arrivalTimeout = arrivalTimeout
+        self.overshootWeight = overshootWeight
+        self.finalErrorWeight = finalErrorWeight
+
+
+    @classmethod
+    def fromSettings(cls, settingsManager: ConfigurationManager, plantParameters: PlantParameters = None) -> "GainSweep":
+        return cls(
+            ControlParameters.fromSettings(settingsManager),
+            plantParameters=plantParameters,
+            controlPeriod=settingsManager.voltageUpdatePeriod,
+            estimatorGains=(settingsManager.estimatorAlpha, settingsManager.estimatorBeta, settingsManager.estimatorGamma),
+        )
+
+
+    def createParameters(self, candidate: GainCandidate) -> ControlParameters:
+        return replace(self.parameters, **candidate._asdict())
+
+
+    def run(self, candidates: Sequence[GainCandidate], moves: Sequence[Tuple[float, float]]) -> SweepReport:
+        import numpy
+
+        startTime = time.perf_counter()
+        settleTimes, overshoots, finalErrors, arrived = self.simulate(candidates, moves)
+
+        settled = ~numpy.isnan(settleTimes)
+        settledCounts = settled.sum(axis=1)
+        with numpy.errstate(invalid='ignore'):
+            meanSettleTimes = numpy.where(settled, settleTimes, 0.000).sum(axis=1)/settledCounts
+        maximumSettleTimes = numpy.where(settled, settleTimes, -numpy.inf).max(axis=1)
+        maximumSettleTimes[settledCounts == 0] = numpy.nan
+        maximumOvershoots = overshoots.max(axis=1)
+
+        # A move that did not settle is charged the time from its start to the end of its settle window after the arrival timeout
+        parameters = self.parameters
+        simulatedTimes = numpy.array([
+            estimateMoveTime(target - start, parameters.maximumVelocity, parameters.maximumAcceleration) + self.arrivalTimeout + self.settleWindow
+            for start, target in moves
+        ])
+        chargedSettleTimes = numpy.where(settled, settleTimes, simulatedTimes)
+        scores = chargedSettleTimes.mean(axis=1) + self.overshootWeight*maximumOvershoots + self.finalErrorWeight*numpy.abs(finalErrors).mean(axis=1)
+
+        results = [
+            CandidateResult(GainCandidate(*candidate), *values)
+            for candidate, values in zip(candidates, zip(
+                arrived.sum(axis=1).tolist(), settledCounts.tolist(), meanSettleTimes.tolist(), maximumSettleTimes.tolist(),
+                maximumOvershoots.tolist(), numpy.abs(finalErrors).max(axis=1).tolist(), scores.tolist(),
+            ))
+        ]
+        return SweepReport(results, len(moves), time.perf_counter() - startTime)
+
+
+    def simulate(self, candidates: Sequence[GainCandidate], moves: Sequence[Tuple[float, float]]):
+        """
+        Returns the settle times (NaN for moves that did not settle), overshoots, final errors and arrivals of every move of every
+        candidate, as arrays with one row per candidate and one column per move
+        """
+        import numpy
+
+        parameters = self.parameters
+        plantParameters = self.plantParameters
+        controlPeriod = self.controlPeriod
+        ioLatency = min(max(self.ioLatency, 0.000), controlPeriod)
+        alpha, beta, gamma = self.estimatorGains
+        tolerance = parameters.maximumAllowedError
+        outputLimit = parameters.maximumVoltage
+
+        candidateCount = len(candidates)
+        moveCount = len(moves)
+        gains = numpy.array(candidates, dtype=numpy.float64).reshape(candidateCount, 4)
+
+        # The clock of the ControlSimulation accumulates the control period, and so does the time of the motion profile
+        settleSteps = 0
+        observationTime = ioLatency
+        while observationTime < self.settleWindow:
+            observationTime += controlPeriod
+            settleSteps += 1
+
+        initialAngles = []
+        profiles = []
+        for start, target in moves:
+            plant = PlantModel(plantParameters, initialAngle=start)
+            revolution, step = plant.encoderCounts()
+            initialAngles.append(REVOLUTION_ANGLES[revolution] + STEP_ANGLES[step])
+            profiles.append(TrapezoidalProfile(
+                initialAngles[-1], target, maximumVelocity=parameters.maximumVelocity, maximumAcceleration=parameters.maximumAcceleration
+            ) if (parameters.motionProfile == 'trapezoidal') else None)
+
+        timeouts = [(0.000 if (profile is None) else profile.duration) + self.arrivalTimeout for profile in profiles]
+        times = [0.000]
+        while times[-1] < max(timeouts, default=0.000):
+            times.append(times[-1] + controlPeriod)
+        for _ in range(settleSteps):
+            times.append(times[-1] + controlPeriod)
+
+        # The reference of every move at every control step, which does not depend on the gains
+        referencePositions = numpy.empty((len(times), moveCount))
+        referenceVelocities = numpy.zeros((len(times), moveCount))
+        referenceFinished = numpy.ones((len(times), moveCount), dtype=bool)
+        for moveIndex, ((start, target), profile) in enumerate(zip(moves, profiles)):
+            if profile is None:
+                referencePositions[:, moveIndex] = target
+                continue
+            for stepIndex, profileTime in enumerate(times):
+                point = profile.sample(profileTime)
+                referencePositions[stepIndex, moveIndex] = point.position
+                referenceVelocities[stepIndex, moveIndex] = point.velocity
+                referenceFinished[stepIndex, moveIndex] = profile.isFinished(profileTime)
+
+        revolutionAngles = numpy.frombuffer(REVOLUTION_ANGLES, dtype=numpy.float64)
+        stepAngles = numpy.frombuffer(STEP_ANGLES, dtype=numpy.float64)
+        gearboxReduction = plantParameters.gearboxReduction
+        stepsPerRevolution = plantParameters.stepsPerRevolution
+        maximumRevolutions = plantParameters.maximumRevolutions
+        timeConstant = plantParameters.timeConstant
+        latencyDecay = math.exp(-ioLatency/timeConstant)
+        remainderDecay = math.exp(-(controlPeriod - ioLatency)/timeConstant)
+        filterTime = parameters.derivativeFilterTime
+        filterFactor = controlPeriod/(filterTime + controlPeriod) if (filterTime > 0) else 1.000
+
+        # One lane per move of every candidate, in the order of the result arrays
+        laneCount = candidateCount*moveCount
+        lanes = numpy.arange(laneCount)
+        moveIndices = lanes % moveCount
+        laneGains = numpy.repeat(gains, moveCount, axis=0)
+        proportionalGains, integralGains, derivativeGains, minimumSignals = laneGains.T
+        targets = numpy.array([target for start, target in moves])[moveIndices]
+        directions = numpy.copysign(1.0, targets - numpy.array([start for start, target in moves])[moveIndices])
+        laneTimeouts = numpy.array(timeouts)[moveIndices]
+
+        motorAngles = -numpy.array([start for start, target in moves])[moveIndices]*gearboxReduction
+        motorVelocities = numpy.zeros(laneCount)
+        voltages = numpy.zeros(laneCount)
+        estimatedAngles = numpy.array(initialAngles)[moveIndices]
+        estimatedVelocities = numpy.zeros(laneCount)
+        estimatedAccelerations = numpy.zeros(laneCount)
+        integrals = numpy.zeros(laneCount)
+        derivatives = numpy.zeros(laneCount)
+        overshoots = numpy.zeros(laneCount)
+        settleTimes = numpy.full(laneCount, numpy.nan)
+        stopSteps = numpy.full(laneCount, -1)
+        finishedStep = len(times)
+
+        resultSettleTimes = numpy.full(laneCount, numpy.nan)
+        resultOvershoots = numpy.zeros(laneCount)
+        resultFinalErrors = numpy.zeros(laneCount)
+        resultArrived = numpy.zeros(laneCount, dtype=bool)
+
+        def advance(decay: float, duration: float):
+            nonlocal motorAngles, motorVelocities
+            targetVelocities = plantParameters.motorGain*numpy.copysign(numpy.maximum(numpy.abs(voltages) - plantParameters.deadband, 0.000), voltages)
+            velocityErrors = motorVelocities - targetVelocities
+            motorAngles = motorAngles + targetVelocities*duration + velocityErrors*(timeConstant*(1 - decay))
+            motorVelocities = targetVelocities + velocityErrors*decay
+
+        def observe(mask, observationTime: float):
+            nonlocal overshoots, settleTimes
+            errors = -motorAngles/gearboxReduction - targets
+            overshoots = numpy.where(mask, numpy.maximum(overshoots, errors*directions), overshoots)
+            outside = numpy.abs(errors) > tolerance
+            settleTimes = numpy.where(mask & outside, numpy.nan, settleTimes)
+            settleTimes = numpy.where(mask & ~outside & numpy.isnan(settleTimes), observationTime, settleTimes)
+
+        for stepIndex, now in enumerate(times):
+            if lanes.size == 0:
+                break
+
+            active = stopSteps < 0
+
+            if active.any():
+                # Moves that have not arrived within the timeout are aborted without a new sample
+                timedOut = active & (now >= laneTimeouts)
+                stopSteps[timedOut] = stepIndex
+                active &= ~timedOut
+
+                totalSteps = numpy.floor(motorAngles*stepsPerRevolution/360.0).astype(numpy.int64)
+                revolutions, steps = numpy.divmod(totalSteps, stepsPerRevolution)
+                measuredAngles = revolutionAngles[revolutions % maximumRevolutions] + stepAngles[steps]
+
+                if stepIndex > 0:
+                    timeStep = now - times[stepIndex - 1]
+                    predictedAngles = estimatedAngles + estimatedVelocities*timeStep + 0.5*estimatedAccelerations*timeStep**2
+                    residuals = measuredAngles - predictedAngles
+                    estimatedAngles = predictedAngles + alpha*residuals
+                    estimatedVelocities = estimatedVelocities + estimatedAccelerations*timeStep + beta*residuals/timeStep
+                    estimatedAccelerations = estimatedAccelerations + 2*gamma*residuals/timeStep**2
+
+                observe(active, now)
+
+                profileFinished = referenceFinished[stepIndex][moveIndices]
+                arrivals = active & profileFinished & (numpy.abs(measuredAngles - targets) < tolerance)
+                stopSteps[arrivals] = stepIndex
+                resultArrived[lanes[arrivals]] = True
+                active &= ~arrivals
+
+                # The PID controller of the PositionControlLaw, with the derivative on the measured rate relative to the reference rate
+                setpointRates = referenceVelocities[stepIndex][moveIndices]
+                errors = measuredAngles - referencePositions[stepIndex][moveIndices]
+                derivatives = numpy.where(active, derivatives + filterFactor*(derivativeGains*(estimatedVelocities - setpointRates) - derivatives), derivatives)
+                proportionals = proportionalGains*errors - parameters.velocityFeedforwardGain*setpointRates
+                unsaturatedOutputs = proportionals + integrals + derivatives
+                integralSteps = integralGains*errors*controlPeriod
+                integrating = active & profileFinished & (
+                    (numpy.abs(unsaturatedOutputs) < outputLimit) | (numpy.copysign(1.0, integralSteps) != numpy.copysign(1.0, unsaturatedOutputs))
+                )
+                integrals = numpy.where(integrating, numpy.clip(integrals + integralSteps, -outputLimit, outputLimit), integrals)
+                outputs = numpy.clip(proportionals + integrals + derivatives, -outputLimit, outputLimit)
+                newVoltages = numpy.where(active, numpy.copysign(numpy.maximum(numpy.abs(outputs), minimumSignals), outputs), 0.000)
+            else:
+                newVoltages = numpy.zeros(lanes.size)
+
+            # The voltage is written after the I/O latency, during which the previous voltage is still applied
+            advance(latencyDecay, ioLatency)
+
+            observing = (stopSteps >= 0) & (stopSteps < stepIndex)
+            observe(observing, now + ioLatency)
+
+            finished = observing & (stepIndex - stopSteps >= settleSteps)
+            if finished.any():
+                finishedLanes = lanes[finished]
+                resultSettleTimes[finishedLanes] = settleTimes[finished]
+                resultOvershoots[finishedLanes] = overshoots[finished]
+                resultFinalErrors[finishedLanes] = -motorAngles[finished]/gearboxReduction - targets[finished]
+                stopSteps[finished] = finishedStep
+
+            voltages = newVoltages
+            advance(remainderDecay, controlPeriod - ioLatency)
+
+            # The finished lanes are dropped once they are half of the lanes, so that the arrays shrink as the moves settle
+            if numpy.count_nonzero(stopSteps == finishedStep) >= lanes.size//2:
+                keep = stopSteps != finishedStep
+                lanes, moveIndices, targets, directions, laneTimeouts = lanes[keep], moveIndices[keep], targets[keep], directions[keep], laneTimeouts[keep]
+                proportionalGains, integralGains, derivativeGains, minimumSignals = proportionalGains[keep], integralGains[keep], derivativeGains[keep], minimumSignals[keep]
+                motorAngles, motorVelocities, voltages = motorAngles[keep], motorVelocities[keep], voltages[keep]
+                estimatedAngles, estimatedVelocities, estimatedAccelerations = estimatedAngles[keep], estimatedVelocities[keep], estimatedAccelerations[keep]
+                integrals, derivatives, overshoots, settleTimes, stopSteps = integrals[keep], derivatives[keep], overshoots[keep], settleTimes[keep], stopSteps[keep]
+
+        shape = (candidateCount, moveCount)
+        return resultSettleTimes.reshape(shape), resultOvershoots.reshape(shape), resultFinalErrors.reshape(shape), resultArrived.reshape(shape)
+
+
+#------------------------------------------------------------------------------
+# Move Set
+#------------------------------------------------------------------------------
+def createStepMoveSet() -> List[Tuple[float, float]]:
+    """
+    Returns every standard step of the ControlSimulation forth and back from zero, as a short but representative move set for a sweep
+    """
+    return [move for step in STANDARD_STEPS for move in ((0.000, step), (step, 0.000))]
+
+
+#------------------------------------------------------------------------------
+# Main Function
+#------------------------------------------------------------------------------
+def parseValues(text: str) -> List[float]:
+    return [float(value) for value in text.split(',') if value.strip()]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Ranks a grid of control gains by simulating every combination against the plant model")
+    parser.add_argument("--config", default="./config.ini", help="The configuration file from which the other control parameters are read")
+    parser.add_argument("--output", default=None, help="Writes the configuration file with the gains of the best candidate to this path")
+    parser.add_argument("--proportional-gains", type=parseValues, default=DEFAULT_PROPORTIONAL_GAINS, help="Comma separated values")
+    parser.add_argument("--integral-gains", type=parseValues, default=DEFAULT_INTEGRAL_GAINS, help="Comma separated values")
+    parser.add_argument("--derivative-gains", type=parseValues, default=DEFAULT_DERIVATIVE_GAINS, help="Comma separated values")
+    parser.add_argument("--minimum-control-signal-values", type=parseValues, default=DEFAULT_MINIMUM_CONTROL_SIGNAL_VALUES, help="Comma separated values")
+    parser.add_argument("--moves", type=int, default=None, help="The number of moves of the ControlSimulation move set, instead of the standard steps")
+    parser.add_argument("--seed", type=int, default=0, help="The seed of the random moves")
+    parser.add_argument("--motor-gain", type=float, default=PlantParameters.motorGain)
+    parser.add_argument("--time-constant", type=float, default=PlantParameters.timeConstant)
+    parser.add_argument("--deadband", type=float, default=PlantParameters.deadband)
+    parser.add_argument("--io-latency", type=float, default=0.005, help="The time from the position sample to the voltage write")
+    parser.add_argument("--overshoot-weight", type=float, default=10.000, help="Seconds of mean settle time that one degree of overshoot is worth")
+    parser.add_argument("--final-error-weight", type=float, default=10.000, help="Seconds of mean settle time that one degree of mean final error is worth")
+    parser.add_argument("--top", type=int, default=10, help="The number of best candidates that are printed")
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    settingsManager = ConfigurationManager(arguments.config)
+    sweep = GainSweep.fromSettings(
+        settingsManager,
+        PlantParameters(motorGain=arguments.motor_gain, timeConstant=arguments.time_constant, deadband=arguments.deadband),
+    )
+    sweep.ioLatency = arguments.io_latency
+    sweep.overshootWeight = arguments.overshoot_weight
+    sweep.finalErrorWeight = arguments.final_error_weight
+
+    candidates = createGainGrid(arguments.proportional_gains, arguments.integral_gains, arguments.derivative_gains, arguments.minimum_control_signal_values)
+    if arguments.moves is None:
+        moves = createStepMoveSet()
+    else:
+        moves = createMoveSet(arguments.moves, settingsManager.minimumGotoPosition, settingsManager.maximumGotoPosition, arguments.seed)
+
+    report = sweep.run(candidates, moves)
+    print(report.summary(arguments.top))
+
+    # The gains of a candidate that leaves some moves unsettled are never written to a configuration file
+    best = report.best
+    if (best is None) or (best.settledCount < len(moves)):
+        print(f"FAILED: the best candidate settled {0 if (best is None) else best.settledCount} of {len(moves)} moves")
+        return 1
+
+    if arguments.output is not None:
+        # The profile is a copy of the configuration file with the gains of the best candidate, so it can replace the config.ini
+        settingsManager.configFilePath = arguments.output
+        sweep.createParameters(best.candidate).applyToSettings(settingsManager)
+        settingsManager.writeConfigFile()
+        print(f"Wrote the gains of the best candidate to {arguments.output}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
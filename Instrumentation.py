@@ -0,0 +1,165 @@
+from array import array
+from threading import Lock
+
+
+#------------------------------------------------------------------------------
+# Latency Histogram
+#------------------------------------------------------------------------------
+class LatencyHistogram:
+    """
+    A histogram of latencies with HDR style log-linear buckets.
+    Latencies are recorded in whole microseconds. Values below 2^SUB_BUCKET_BITS are counted exactly, and every power of two above that
+    is split into 2^(SUB_BUCKET_BITS-1) equally sized buckets, so that every recorded value is resolved to within 1/64 (about 1.6%) of
+    its size, while a range of one microsecond to over an hour only needs a couple of thousand counters.
+    """
+    SUB_BUCKET_BITS = 7
+    SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+    SUB_BUCKET_HALF_COUNT = SUB_BUCKET_COUNT >> 1
+    MAXIMUM_VALUE = (1 << 32) - 1
+
+    def __init__(self):
+        self.reset()
+
+
+    def reset(self):
+        self._counts = array('Q', bytes(8*(self._bucketIndex(self.MAXIMUM_VALUE) + 1)))
+
+        self.count = 0
+        self._total = 0
+        self._minimum = None
+        self._maximum = None
+
+
+#------------------------------------------------------------------------------
+# Bucket Helper Methods
+#------------------------------------------------------------------------------
+    @classmethod
+    def _bucketIndex(cls, value: int) -> int:
+        if value < cls.SUB_BUCKET_COUNT:
+            return value
+
+        shift = value.bit_length() - cls.SUB_BUCKET_BITS
+        return cls.SUB_BUCKET_COUNT + (shift - 1)*cls.SUB_BUCKET_HALF_COUNT + (value >> shift) - cls.SUB_BUCKET_HALF_COUNT
+
+
+    @classmethod
+    def _bucketValue(cls, index: int) -> int:
+        """
+        The highest value that is counted in the bucket
+        """
+        if index < cls.SUB_BUCKET_COUNT:
+            return index
+
+        shift, subBucket = divmod(index - cls.SUB_BUCKET_COUNT, cls.SUB_BUCKET_HALF_COUNT)
+        shift += 1
+        return ((subBucket + cls.SUB_BUCKET_HALF_COUNT + 1) << shift) - 1
+
+
+#------------------------------------------------------------------------------
+# Recording and Query Methods
+#------------------------------------------------------------------------------
+    def record(self, latency: float):
+        value = min(max(int(latency*1e6), 0), self.MAXIMUM_VALUE)
+
+        self._counts[self._bucketIndex(value)] += 1
+        self.count += 1
+        self._total += value
+        self._minimum = value if (self._minimum is None) else min(self._minimum, value)
+        self._maximum = value if (self._maximum is None) else max(self._maximum, value)
+
+
+    def merge(self, histogram: "LatencyHistogram"):
+        for index, count in enumerate(histogram._counts):
+            self._counts[index] += count
+
+        if histogram.count > 0:
+            self.count += histogram.count
+            self._total += histogram._total
+            self._minimum = histogram._minimum if (self._minimum is None) else min(self._minimum, histogram._minimum)
+            self._maximum = histogram._maximum if (self._maximum is None) else max(self._maximum, histogram._maximum)
+
+
+    @property
+    def minimum(self) -> float:
+        return 0.000 if (self._minimum is None) else self._minimum/1e6
+
+
+    @property
+    def maximum(self) -> float:
+        return 0.000 if (self._maximum is None) else self._maximum/1e6
+
+
+    @property
+    def mean(self) -> float:
+        return 0.000 if (self.count == 0) else self._total/self.count/1e6
+
+
+    def percentile(self, percentile: float) -> float:
+        """
+        Returns the latency in seconds below which the given percentage of the recorded latencies fall
+        """
+        if self.count == 0:
+            return 0.000
+
+        targetCount = max(1, round(self.count*percentile/100))
+        cumulativeCount = 0
+
+        for index, count in enumerate(self._counts):
+            cumulativeCount += count
+            if cumulativeCount >= targetCount:
+                return min(self._bucketValue(index), self._maximum)/1e6
+
+        return self.maximum
+
+
+#------------------------------------------------------------------------------
+# Device Statistics
+#------------------------------------------------------------------------------
+class DeviceStatistics:
+    """
+    The I/O statistics of the connection to a single device: the round-trip latency of every request/response exchange, the number
+    of timeouts and bad responses, and the number of bytes that were sent and received.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.roundTripTimes = LatencyHistogram()
+        self._lock = Lock()
+        self.reset()
+
+
+    def reset(self):
+        with self._lock:
+            self.roundTripTimes.reset()
+            self.timeouts = 0
+            self.badFrames = 0
+            self.bytesSent = 0
+            self.bytesReceived = 0
+
+
+    def recordExchange(self, roundTripTime: float, bytesSent: int, bytesReceived: int):
+        with self._lock:
+            self.roundTripTimes.record(roundTripTime)
+            self.bytesSent += bytesSent
+            self.bytesReceived += bytesReceived
+
+
+    def recordTimeout(self, bytesSent: int = 0):
+        with self._lock:
+            self.timeouts += 1
+            self.bytesSent += bytesSent
+
+
+    def recordBadFrame(self):
+        with self._lock:
+            self.badFrames += 1
+
+
+    def summary(self) -> str:
+        with self._lock:
+            roundTripTimes = self.roundTripTimes
+            return (
+                f"{self.name}: {roundTripTimes.count} exchanges, "
+                f"round trip p50={roundTripTimes.percentile(50)*1e3:.2f}ms p99={roundTripTimes.percentile(99)*1e3:.2f}ms max={roundTripTimes.maximum*1e3:.2f}ms, "
+                f"{self.timeouts} timeouts, {self.badFrames} bad frames, "
+                f"{self.bytesSent} bytes sent, {self.bytesReceived} bytes received"
+            )
@@ -0,0 +1,366 @@
+import heapq
+import itertools
+import logging
+import time
+from dataclasses import dataclass, replace
+from threading import Condition, Thread, current_thread
+from typing import Callable, Dict, List
+
+
+#------------------------------------------------------------------------------
+# Job Statistics Dataclass
+#------------------------------------------------------------------------------
+@dataclass
+class JobStatistics:
+    runs: int = 0
+    overruns: int = 0
+    missedDeadlines: int = 0
+    lastExecutionTime: float = 0.000
+    maximumExecutionTime: float = 0.000
+    lastLateness: float = 0.000
+    maximumLateness: float = 0.000
+
+
+#------------------------------------------------------------------------------
+# Scheduled Job
+#------------------------------------------------------------------------------
+class ScheduledJob:
+    """
+    A handle to a periodic job that is run by a JobScheduler.
+    It exposes the same start/stop interface as the TimedJobThread so that it can be used as a drop in replacement,
+    but the job is run on the dispatcher thread of the scheduler instead of on its own thread.
+    A blocking job, such as a request/response exchange with a device, is handed to a worker thread of its own when it is released,
+    so that a slow device cannot hold up the jobs of the other devices.
+    A job that is not periodic is run once, an interval after it was started, unless it is stopped before then.
+    """
+    def __init__(self, scheduler: "JobScheduler", interval: float, execute: Callable, args: List, kwargs: Dict, name: str, periodic: bool = True, blocking: bool = False):
+        self._scheduler = scheduler
+        self._interval = interval
+        self.periodic = periodic
+        self.blocking = blocking
+        self.execute = execute
+        self.args = args
+        self.kwargs = kwargs
+        self.name = name
+        self.statistics = JobStatistics()
+
+        self._generation = 0
+        self._deadline = None
+        self._executing = False
+        self._release = None
+        self._worker = None
+
+
+    @property
+    def interval(self) -> float:
+        return self._interval
+
+
+    @interval.setter
+    def interval(self, newInterval: float):
+        self._scheduler.setInterval(self, newInterval)
+
+
+    def isActive(self) -> bool:
+        return self._deadline is not None
+
+
+    def start(self):
+        self._scheduler.add(self)
+
+
+    def stop(self, wait: bool = False, timeout: float = None) -> bool:
+        return self._scheduler.remove(self, wait, timeout)
+
+
+#------------------------------------------------------------------------------
+# Job Scheduler
+#------------------------------------------------------------------------------
+class JobScheduler:
+    """
+    Releases all the periodic jobs of the application from a single dispatcher thread, which also runs the jobs that do not block.
+    The pending deadlines are kept in a heap that is ordered on the monotonic clock, and every job is released at a fixed rate,
+    i.e. the next deadline is calculated from the previous deadline and not from the time at which the job finished executing.
+    If a job takes longer than its interval to execute, an overrun is recorded, and all the deadlines that have already passed
+    are counted as missed and skipped instead of being run back to back.
+    """
+    def __init__(self, name: str = "Job Scheduler", clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self._clock = clock
+        self._condition = Condition()
+        self._deadlines = []
+        self._sequence = itertools.count()
+        self._jobs = []
+        self._thread = None
+        self._running = False
+
+
+#------------------------------------------------------------------------------
+# Start and Stop Methods
+#------------------------------------------------------------------------------
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+
+            self._running = True
+            self._thread = Thread(target=self._run, name=self.name)
+            self._thread.daemon = False
+            self._thread.start()
+
+
+    def stop(self):
+        with self._condition:
+            if not self._running:
+                return
+
+            self._running = False
+            thread = self._thread
+            self._thread = None
+            self._condition.notify_all()
+
+        if (thread is not None) and (thread is not current_thread()):
+            thread.join()
+
+
+    def isRunning(self) -> bool:
+        return self._running
+
+
+#------------------------------------------------------------------------------
+# Job Management Methods
+#------------------------------------------------------------------------------
+    def createJob(self, interval: float, execute: Callable, args: List=[], kwargs: Dict={}, name: str = None, blocking: bool = False) -> ScheduledJob:
+        return ScheduledJob(self, interval, execute, args, kwargs, name if (name is not None) else execute.__name__, blocking=blocking)
+
+
+    def schedule(self, interval: float, execute: Callable, args: List=[], kwargs: Dict={}, name: str = None, blocking: bool = False) -> ScheduledJob:
+        job = self.createJob(interval, execute, args=args, kwargs=kwargs, name=name, blocking=blocking)
+        job.start()
+        return job
+
+
+    def callLater(self, delay: float, execute: Callable, args: List=[], kwargs: Dict={}, name: str = None, blocking: bool = False) -> ScheduledJob:
+        """
+        Runs the function once after the delay, on the dispatcher thread or, if it is blocking, on a worker thread.
+        The call can be cancelled by stopping the returned job.
+        """
+        job = ScheduledJob(self, delay, execute, args, kwargs, name if (name is not None) else execute.__name__, periodic=False, blocking=blocking)
+        job.start()
+        return job
+
+
+    def add(self, job: ScheduledJob):
+        with self._condition:
+            if job.isActive():
+                return
+
+            if job.periodic and (job not in self._jobs):
+                self._jobs.append(job)
+
+            self._push(job, self._clock() + job.interval)
+
+        self.start()
+
+
+    def remove(self, job: ScheduledJob, wait: bool = False, timeout: float = None) -> bool:
+        """
+        Stops releasing the job. A release that has been handed to the worker thread of a blocking job but has not started yet is
+        discarded. If told to wait, the execution that is in flight is waited for, unless it is the calling thread that executes it.
+        Returns False if another thread was still executing the job when the timeout expired, or when not told to wait
+        """
+        with self._condition:
+            job._generation += 1
+            job._deadline = None
+
+            if job in self._jobs:
+                self._jobs.remove(job)
+
+            if job._release is not None:
+                job._release = None
+                job._executing = False
+
+            self._condition.notify_all()
+
+            if self._isExecutingThread(job):
+                return True
+
+            if wait:
+                return self._condition.wait_for(lambda: not job._executing, timeout)
+
+            return not job._executing
+
+
+    def setInterval(self, job: ScheduledJob, newInterval: float):
+        with self._condition:
+            previousInterval = job._interval
+            job._interval = newInterval
+
+            if job._executing and not job.blocking:
+                # The job is changing its own interval, or is being changed while it executes on the dispatcher thread. The deadline
+                # is the one being served, and the next deadline is calculated with the new interval once the job has finished
+                return
+
+            if job.isActive():
+                # The new interval is applied from the previous release of the job, so that the change takes effect straight away
+                # instead of only after the currently pending deadline has passed. The deadlines of the new interval that have already
+                # passed are only missed if the job was executing at the time, otherwise they were never due
+                self._push(job, self._nextDeadline(job, job._deadline - previousInterval, self._clock(), countMissed=job._executing))
+
+
+    def statistics(self) -> Dict[str, JobStatistics]:
+        with self._condition:
+            return {job.name: replace(job.statistics) for job in self._jobs}
+
+
+#------------------------------------------------------------------------------
+# Dispatcher Methods
+#------------------------------------------------------------------------------
+    def _isExecutingThread(self, job: ScheduledJob) -> bool:
+        return current_thread() is (job._worker if job.blocking else self._thread)
+
+
+    def _push(self, job: ScheduledJob, deadline: float):
+        job._generation += 1
+        job._deadline = deadline
+        heapq.heappush(self._deadlines, (deadline, next(self._sequence), job._generation, job))
+        self._condition.notify_all()
+
+
+    def _nextDeadline(self, job: ScheduledJob, lastDeadline: float, currentTime: float, countMissed: bool = True) -> float:
+        """
+        Calculates the next deadline from the last deadline so that the job runs at a fixed rate. Any deadlines that have
+        already passed are skipped, and are counted as missed unless told otherwise.
+        """
+        missedDeadlines = max(int((currentTime - lastDeadline) // job.interval), 0)
+        if countMissed:
+            job.statistics.missedDeadlines += missedDeadlines
+        return lastDeadline + (missedDeadlines + 1)*job.interval
+
+
+    def _nextReleasedJob(self):
+        with self._condition:
+            while self._running:
+                if not self._deadlines:
+                    self._condition.wait()
+                    continue
+
+                deadline, _, generation, job = self._deadlines[0]
+
+                if generation != job._generation:
+                    heapq.heappop(self._deadlines)
+                    continue
+
+                timeRemaining = deadline - self._clock()
+
+                if timeRemaining > 0:
+                    self._condition.wait(timeRemaining)
+                    continue
+
+                heapq.heappop(self._deadlines)
+
+                if job.blocking:
+                    self._dispatch(job, deadline)
+                    continue
+
+                job._executing = True
+                return deadline, generation, job
+
+        return None
+
+
+    def _dispatch(self, job: ScheduledJob, deadline: float):
+        """
+        Hands a released blocking job to its worker thread, and schedules its next release straight away. A release that finds
+        the previous one still executing is counted as a missed deadline.
+        """
+        if job._executing:
+            job.statistics.missedDeadlines += 1
+            logging.debug(f"The {job.name} job is still executing and its release has been skipped")
+        else:
+            job._executing = True
+            job._release = deadline
+
+            if job._worker is None:
+                job._worker = Thread(target=self._runWorker, args=(job,), name=f"{self.name} {job.name}")
+                job._worker.daemon = True
+                job._worker.start()
+
+        if job.periodic:
+            self._push(job, self._nextDeadline(job, deadline, self._clock()))
+        else:
+            job._deadline = None
+
+        self._condition.notify_all()
+
+
+    def _runWorker(self, job: ScheduledJob):
+        while True:
+            with self._condition:
+                while self._running and (job._release is None) and job.isActive():
+                    self._condition.wait()
+
+                if job._release is None:
+                    job._worker = None
+                    return
+
+                deadline = job._release
+                job._release = None
+
+            self._execute(job, deadline)
+
+            with self._condition:
+                job._executing = False
+                self._condition.notify_all()
+
+
+    def _execute(self, job: ScheduledJob, deadline: float):
+        startTime = self._clock()
+        try:
+            job.execute(*job.args, **job.kwargs)
+        except Exception as exception:
+            logging.exception(f"An unhandled exception occured while executing the {job.name} job", exc_info=exception)
+        endTime = self._clock()
+
+        with self._condition:
+            self._updateStatistics(job, deadline, startTime, endTime)
+
+        return endTime
+
+
+    def _run(self):
+        while True:
+            releasedJob = self._nextReleasedJob()
+
+            if releasedJob is None:
+                break
+
+            deadline, generation, job = releasedJob
+            endTime = self._execute(job, deadline)
+
+            with self._condition:
+                job._executing = False
+                self._condition.notify_all()
+
+                if (generation == job._generation) and not job.periodic:
+                    job._deadline = None
+                elif generation == job._generation:
+                    # The next deadline is calculated from the deadline that was just serviced, with the interval that the job may
+                    # have set for itself while it was executing
+                    self._push(job, self._nextDeadline(job, deadline, endTime))
+
+
+    def _updateStatistics(self, job: ScheduledJob, deadline: float, startTime: float, endTime: float):
+        executionTime = endTime - startTime
+        lateness = startTime - deadline
+
+        statistics = job.statistics
+        statistics.runs += 1
+        statistics.lastExecutionTime = executionTime
+        statistics.maximumExecutionTime = max(statistics.maximumExecutionTime, executionTime)
+        statistics.lastLateness = lateness
+        statistics.maximumLateness = max(statistics.maximumLateness, lateness)
+
+        if job.periodic and (executionTime > job.interval):
+            statistics.overruns += 1
+            logging.debug(f"The {job.name} job overran its interval of {job.interval:.3f}s by {executionTime - job.interval:.3f}s")
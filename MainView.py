@@ -97,9 +97,11 @@ class MainView(QMainWindow):
 
     def createSettingsMenu(self):
         self.applicationSettingsAction = QAction("Settings", self)
+        self.autoTuneAction = QAction("Auto Tune Control Gains", self)
 
         settingsManagerMenu = QMenu("Settings")
         settingsManagerMenu.addAction(self.applicationSettingsAction)
+        settingsManagerMenu.addAction(self.autoTuneAction)
 
         return settingsManagerMenu
 
@@ -119,6 +121,7 @@ class MainView(QMainWindow):
         self.currentPositionLineEdit = createReadOnlyLineEdit("+0.000")
         self.targetPositionLineEdit = createReadOnlyLineEdit("+0.000")
         self.positionErrorLineEdit = createReadOnlyLineEdit("+0.000")
+        self.velocityLineEdit = createReadOnlyLineEdit("+0.000")
 
         self.setCurrentPositionAsZeroButton = QPushButton("Set As Zero")        
         self.resetZeroPositionButton = QPushButton("Reset Zero")
@@ -127,9 +130,11 @@ class MainView(QMainWindow):
         positionInformationLayout.addWidget(createPositionLabel("Current"), 0, 0)
         positionInformationLayout.addWidget(createPositionLabel("Target"), 0, 1)
         positionInformationLayout.addWidget(createPositionLabel("Error"), 0, 2)
+        positionInformationLayout.addWidget(createPositionLabel("Velocity"), 0, 3)
         positionInformationLayout.addWidget(self.currentPositionLineEdit, 1, 0)
         positionInformationLayout.addWidget(self.targetPositionLineEdit, 1, 1)
         positionInformationLayout.addWidget(self.positionErrorLineEdit, 1, 2)
+        positionInformationLayout.addWidget(self.velocityLineEdit, 1, 3)
         positionInformationLayout.addWidget(self.setCurrentPositionAsZeroButton, 2, 0)
         positionInformationLayout.addWidget(self.resetZeroPositionButton, 3, 0)
 
@@ -263,6 +268,10 @@ class MainView(QMainWindow):
         updatePositionLineEdit(self.positionErrorLineEdit, newPosition.error)
 
 
+    def updateVelocityLineEdit(self, newVelocity: float):
+        updatePositionLineEdit(self.velocityLineEdit, newVelocity)
+
+
     def updateConnectionStatusLineEdits(self, shaftEncoder: bool, motorController: bool, watchdog: bool, tcpServer: bool):
         updateConnectionStatusLineEdit(self.shaftEncoderConnectionStatusLineEdit, shaftEncoder)
         updateConnectionStatusLineEdit(self.motorControllerConnectionStatusLineEdit, motorController)
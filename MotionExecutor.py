@@ -0,0 +1,439 @@
+import logging
+import math
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from enum import Enum
+from threading import Condition, Thread, current_thread
+from typing import Callable, NamedTuple
+
+from ConfigurationManager import ConfigurationManager
+from ControlLoop import ControlLoop, ControlLoopStatistics
+from MotionProfile import TrapezoidalProfile
+from PIDController import PIDController
+
+
+#------------------------------------------------------------------------------
+# Enumeration Constants
+#------------------------------------------------------------------------------
+class MoveStatus(Enum):
+    ARRIVED = 0
+    PREEMPTED = 1
+    CANCELLED = 2
+    FAILED = 3
+
+    def __str__(self):
+        return self.name
+
+
+#------------------------------------------------------------------------------
+# Control Parameters Dataclass
+#------------------------------------------------------------------------------
+@dataclass
+class ControlParameters:
+    proportionalGain: float = 1.000
+    integralGain: float = 0.100
+    derivativeGain: float = 0.100
+    derivativeFilterTime: float = 0.050
+    velocityFeedforwardGain: float = 0.000
+    maximumVoltage: float = 7.000
+    minimumControlSignalValue: float = 1.200
+    maximumAllowedError: float = 0.025
+    motionProfile: str = 'trapezoidal'
+    maximumVelocity: float = 12.000
+    maximumAcceleration: float = 40.000
+
+    @classmethod
+    def fromSettings(cls, settingsManager: ConfigurationManager) -> "ControlParameters":
+        return cls(
+            proportionalGain=settingsManager.controlProportionalGain,
+            integralGain=settingsManager.controlIntegralGain,
+            derivativeGain=settingsManager.controlDerivativeGain,
+            derivativeFilterTime=settingsManager.controlDerivativeFilterTime,
+            velocityFeedforwardGain=settingsManager.controlVelocityFeedforward,
+            maximumVoltage=settingsManager.maximumVoltage,
+            minimumControlSignalValue=settingsManager.minimumControlSignalValue,
+            maximumAllowedError=settingsManager.maximumAllowedError,
+            motionProfile=settingsManager.motionProfile,
+            maximumVelocity=settingsManager.maximumVelocity,
+            maximumAcceleration=settingsManager.maximumAcceleration,
+        )
+
+    def applyToSettings(self, settingsManager: ConfigurationManager):
+        """
+        Writes the gains and the minimum control signal to the settings. The settings still have to be written to the config file
+        """
+        settingsManager.controlProportionalGain = self.proportionalGain
+        settingsManager.controlIntegralGain = self.integralGain
+        settingsManager.controlDerivativeGain = self.derivativeGain
+        settingsManager.controlDerivativeFilterTime = self.derivativeFilterTime
+        settingsManager.controlVelocityFeedforward = self.velocityFeedforwardGain
+        settingsManager.minimumControlSignalValue = self.minimumControlSignalValue
+
+
+#------------------------------------------------------------------------------
+# Position Control Law
+#------------------------------------------------------------------------------
+class PositionControlLaw:
+    """
+    The control law of a move to a target position, without any I/O or timing, so that the same code that drives the turn table can
+    also be run against a plant model on a simulated clock.
+    The setpoint follows a trapezoidal motion profile from the position and velocity at which the target was set, and the PID controller
+    tracks it. A new target can be set while the move is running, in which case a new profile is planned from the current state and
+    the state of the PID controller is kept, so that the voltage does not jump.
+    """
+    def __init__(self, parameters: ControlParameters):
+        self.parameters = parameters
+        self.pidController = PIDController(
+            proportionalGain=parameters.proportionalGain,
+            integralGain=parameters.integralGain,
+            derivativeGain=parameters.derivativeGain,
+            outputLimit=parameters.maximumVoltage,
+            derivativeFilterTime=parameters.derivativeFilterTime,
+            velocityFeedforwardGain=parameters.velocityFeedforwardGain,
+        )
+        self.target = None
+        self.motionProfile = None
+        self.profileTime = None
+
+
+    def setTarget(self, target: float, position: float, velocity: float):
+        self.target = target
+        self.profileTime = None
+        self.motionProfile = None
+
+        if self.parameters.motionProfile == 'trapezoidal':
+            self.motionProfile = TrapezoidalProfile(
+                position,
+                target,
+                maximumVelocity=self.parameters.maximumVelocity,
+                maximumAcceleration=self.parameters.maximumAcceleration,
+                startVelocity=velocity
+            )
+
+
+    @property
+    def remainingTime(self) -> float:
+        if self.motionProfile is None:
+            return None
+        return max(self.motionProfile.duration - (self.profileTime or 0.000), 0.000)
+
+
+    def update(self, position: float, velocity: float, timeStep: float) -> float:
+        """
+        Returns the voltage for the current position and velocity, or None once the move has arrived at its target
+        """
+        parameters = self.parameters
+
+        # The profile is advanced by the measured time steps, so that it follows the clock of the control loop
+        self.profileTime = 0.000 if (self.profileTime is None) else (self.profileTime + timeStep)
+        profileFinished = (self.motionProfile is None) or self.motionProfile.isFinished(self.profileTime)
+
+        if profileFinished and (abs(position - self.target) < parameters.maximumAllowedError):
+            return None
+
+        reference = self.motionProfile.sample(self.profileTime) if (self.motionProfile is not None) else None
+        voltage = self.pidController.update(
+            self.target if (reference is None) else reference.position,
+            position,
+            timeStep,
+            measurementRate=velocity,
+            setpointRate=0.000 if (reference is None) else reference.velocity,
+            integrate=profileFinished,
+        )
+        return math.copysign(max(abs(voltage), parameters.minimumControlSignalValue), voltage)
+
+
+#------------------------------------------------------------------------------
+# Move Handle and Result
+#------------------------------------------------------------------------------
+@dataclass(frozen=True)
+class MoveResult:
+    target: float
+    finalPosition: float
+    duration: float
+    status: MoveStatus
+    statistics: ControlLoopStatistics = None
+
+
+class MoveHandle:
+    """
+    A handle to a single move of the MotionExecutor, whose future is resolved with a MoveResult once the move has arrived, or has
+    been preempted, cancelled or has failed.
+    """
+    def __init__(self, target: float, requestTime: float, parameters: ControlParameters = None):
+        self.target = target
+        self.requestTime = requestTime
+        self.parameters = parameters
+        self.moveResult = None
+        self.future = Future()
+
+
+    def done(self) -> bool:
+        return self.future.done()
+
+
+    def result(self, timeout: float = None) -> MoveResult:
+        return self.future.result(timeout)
+
+
+    def addDoneCallback(self, callback: Callable[[MoveResult], None]):
+        self.future.add_done_callback(lambda future: callback(future.result()))
+
+
+class MotionCallbacks(NamedTuple):
+    getPosition: Callable[[], float]
+    getVelocity: Callable[[], float]
+    setVoltage: Callable[[float], None]
+    enableMotor: Callable[[], None]
+    disableMotor: Callable[[], None]
+
+
+#------------------------------------------------------------------------------
+# Motion Executor
+#------------------------------------------------------------------------------
+class MotionExecutor:
+    """
+    Owns the motion of the turn table: every move is executed on a single thread, so that no two control loops can ever write
+    voltages at the same time.
+    A new target that arrives while a move is running preempts the move by updating its target in place, and the handle of the
+    preempted move is resolved. Cancelling a move stops its control loop, waits for the voltage to be set to zero, and is bounded
+    by a timeout.
+    """
+    def __init__(
+        self, callbacks: MotionCallbacks,
+        createParameters: Callable[[], ControlParameters],
+        createControlLoop: Callable[[], ControlLoop],
+        clock: Callable[[], float] = time.monotonic,
+        name: str = "Motion Executor"):
+
+        self._callbacks = callbacks
+        self._createParameters = createParameters
+        self._createControlLoop = createControlLoop
+        self._clock = clock
+        self.name = name
+
+        self._condition = Condition()
+        self._thread = None
+        self._running = False
+        self._activeHandle = None
+        self._pendingHandle = None
+        self._cancelRequested = False
+        self._controlLoop = None
+        self._controlLaw = None
+        self.lastMoveStatistics = None
+
+
+#------------------------------------------------------------------------------
+# Move Methods
+#------------------------------------------------------------------------------
+    def moveTo(self, target: float, parameters: ControlParameters = None) -> MoveHandle:
+        """
+        Starts a move to the target, optionally with its own control parameters instead of the current settings. A move that preempts
+        a running move keeps the control law, and therefore the parameters, of the running move
+        """
+        handle = MoveHandle(target, self._clock(), parameters)
+        preemptedHandle = None
+
+        with self._condition:
+            if self._pendingHandle is not None:
+                preemptedHandle = self._resolve(self._pendingHandle, MoveStatus.PREEMPTED)
+            elif self._activeHandle is not None:
+                preemptedHandle = self._resolve(self._activeHandle, MoveStatus.PREEMPTED)
+
+            self._pendingHandle = handle
+            self._condition.notify_all()
+
+        self._complete(preemptedHandle)
+        self._start()
+        return handle
+
+
+    def cancel(self, timeout: float = 1.000) -> bool:
+        """
+        Cancels the pending and the running move, and returns whether the turn table was stopped within the timeout
+        """
+        cancelledHandle = None
+
+        with self._condition:
+            if self._pendingHandle is not None:
+                cancelledHandle = self._resolve(self._pendingHandle, MoveStatus.CANCELLED)
+                self._pendingHandle = None
+
+            moving = self._activeHandle is not None
+            self._cancelRequested = moving
+            controlLoop = self._controlLoop
+
+        self._complete(cancelledHandle)
+
+        if not moving:
+            return True
+
+        if controlLoop is not None:
+            controlLoop.stop()
+
+        if current_thread() is self._thread:
+            return False
+
+        with self._condition:
+            return self._condition.wait_for(lambda: self._activeHandle is None, timeout)
+
+
+    def isMoving(self) -> bool:
+        return (self._activeHandle is not None) or (self._pendingHandle is not None)
+
+
+    @property
+    def predictedArrivalTime(self) -> float:
+        """
+        The time at which the running move is predicted to arrive at its target, or None if it is not following a motion profile
+        """
+        controlLaw = self._controlLaw
+        remainingTime = None if (controlLaw is None) else controlLaw.remainingTime
+        return None if (remainingTime is None) else (self._clock() + remainingTime)
+
+
+    def shutdown(self, timeout: float = 1.000):
+        self.cancel(timeout)
+
+        with self._condition:
+            self._running = False
+            thread = self._thread
+            self._thread = None
+            self._condition.notify_all()
+
+        if (thread is not None) and (thread is not current_thread()):
+            thread.join(timeout)
+
+
+#------------------------------------------------------------------------------
+# Executor Thread Methods
+#------------------------------------------------------------------------------
+    def _start(self):
+        with self._condition:
+            if self._running:
+                return
+
+            self._running = True
+            self._thread = Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: (self._pendingHandle is not None) or (not self._running))
+
+                if not self._running:
+                    break
+
+                self._activeHandle = self._pendingHandle
+                self._pendingHandle = None
+                self._cancelRequested = False
+
+            self._executeMove()
+
+
+    def _executeMove(self):
+        callbacks = self._callbacks
+        parameters = self._activeHandle.parameters
+        target = self._activeHandle.target
+        controlLaw = None
+        controlLoop = None
+        status = MoveStatus.ARRIVED
+
+        def controlStep(timeStep: float) -> bool:
+            with self._condition:
+                if self._cancelRequested:
+                    return False
+
+                # A new target preempts the move in place, so that the control loop and the state of the controller are kept
+                if self._pendingHandle is not None:
+                    self._activeHandle = self._pendingHandle
+                    self._pendingHandle = None
+                    controlLaw.setTarget(self._activeHandle.target, callbacks.getPosition(), callbacks.getVelocity())
+                    logging.info(f"Preempted the move with a new target of {controlLaw.target:.3f}")
+
+            voltage = controlLaw.update(callbacks.getPosition(), callbacks.getVelocity(), timeStep)
+
+            if voltage is None:
+                return False
+
+            with controlLoop.measureIO():
+                callbacks.setVoltage(voltage)
+            return True
+
+        try:
+            controlLaw = PositionControlLaw(self._createParameters() if (parameters is None) else parameters)
+            controlLaw.setTarget(target, callbacks.getPosition(), callbacks.getVelocity())
+            controlLoop = self._createControlLoop()
+
+            with self._condition:
+                self._controlLaw = controlLaw
+                self._controlLoop = controlLoop
+
+            if controlLaw.motionProfile is not None:
+                logging.info(f"Moving to {controlLaw.target:.3f} at up to {controlLaw.motionProfile.peakVelocity:.3f} deg/s, arriving in {controlLaw.motionProfile.duration:.3f}s")
+
+            callbacks.enableMotor()
+            controlLoop.run(controlStep)
+        except Exception as exception:
+            logging.exception(f"The move to {target:.3f} failed", exc_info=exception)
+            status = MoveStatus.FAILED
+        finally:
+            # Every step of the cleanup is guarded, so that the handle is always resolved and the executor thread keeps running
+            for cleanup in (lambda: callbacks.setVoltage(0.000), callbacks.disableMotor):
+                try:
+                    cleanup()
+                except Exception as exception:
+                    logging.exception(f"Unable to stop the motor after the move to {target:.3f}", exc_info=exception)
+                    status = MoveStatus.FAILED
+
+        with self._condition:
+            if (status != MoveStatus.FAILED) and self._cancelRequested:
+                status = MoveStatus.CANCELLED
+
+            self.lastMoveStatistics = None if (controlLoop is None) else controlLoop.statistics
+            target = self._activeHandle.target
+            finishedHandle = self._resolve(self._activeHandle, status, self.lastMoveStatistics)
+            self._activeHandle = None
+            self._controlLoop = None
+            self._controlLaw = None
+            self._condition.notify_all()
+
+        self._complete(finishedHandle)
+
+        if self.lastMoveStatistics is not None:
+            logging.info(f"Move to {target:.3f} {status}: {self.lastMoveStatistics.summary()}")
+        else:
+            logging.info(f"Move to {target:.3f} {status}")
+
+
+    def _resolve(self, handle: MoveHandle, status: MoveStatus, statistics: ControlLoopStatistics = None) -> MoveHandle:
+        """
+        Records the result of the move while the condition is held, and returns the handle, or None if it was already resolved. The handle
+        has to be completed with _complete once the condition has been released, because its done callbacks run on the completing thread
+        """
+        if handle.moveResult is not None:
+            return None
+
+        try:
+            finalPosition = self._callbacks.getPosition()
+        except Exception as exception:
+            logging.exception(f"Unable to read the final position of the move to {handle.target:.3f}", exc_info=exception)
+            finalPosition = math.nan
+
+        handle.moveResult = MoveResult(
+            target=handle.target,
+            finalPosition=finalPosition,
+            duration=self._clock() - handle.requestTime,
+            status=status,
+            statistics=statistics,
+        )
+        return handle
+
+
+    @staticmethod
+    def _complete(handle: MoveHandle):
+        if handle is not None:
+            handle.future.set_result(handle.moveResult)
@@ -0,0 +1,135 @@
+import math
+from dataclasses import dataclass
+from typing import List, NamedTuple
+
+
+#------------------------------------------------------------------------------
+# Profile Data Classes
+#------------------------------------------------------------------------------
+class ProfilePoint(NamedTuple):
+    position: float
+    velocity: float
+    acceleration: float
+
+
+@dataclass(frozen=True)
+class ProfileSegment:
+    startTime: float
+    duration: float
+    startPosition: float
+    startVelocity: float
+    acceleration: float
+
+    def sample(self, time: float) -> ProfilePoint:
+        t = min(max(time - self.startTime, 0.000), self.duration)
+        return ProfilePoint(
+            self.startPosition + self.startVelocity*t + 0.5*self.acceleration*t*t,
+            self.startVelocity + self.acceleration*t,
+            self.acceleration,
+        )
+
+    @property
+    def endPoint(self) -> ProfilePoint:
+        return self.sample(self.startTime + self.duration)
+
+
+#------------------------------------------------------------------------------
+# Trapezoidal Motion Profile
+#------------------------------------------------------------------------------
+class TrapezoidalProfile:
+    """
+    A time parameterised reference trajectory from a start position and velocity to a target position at rest, which accelerates
+    at the maximum acceleration up to the maximum velocity, cruises, and decelerates to stop exactly on the target.
+    If the move is too short to reach the maximum velocity, the velocity profile is a triangle. If the initial velocity points away
+    from the target, or is too high to stop before the target, the profile first decelerates to rest and then moves back to the target.
+    """
+    def __init__(self, startPosition: float, targetPosition: float, maximumVelocity: float, maximumAcceleration: float, startVelocity: float = 0.000):
+        if (maximumVelocity <= 0) or (maximumAcceleration <= 0):
+            raise ValueError("The maximum velocity and acceleration of a motion profile must be positive")
+
+        self.startPosition = startPosition
+        self.targetPosition = targetPosition
+        self.maximumVelocity = maximumVelocity
+        self.maximumAcceleration = maximumAcceleration
+        self.segments: List[ProfileSegment] = []
+
+        self._plan(startPosition, startVelocity)
+
+
+    @property
+    def duration(self) -> float:
+        if not self.segments:
+            return 0.000
+        lastSegment = self.segments[-1]
+        return lastSegment.startTime + lastSegment.duration
+
+
+    @property
+    def peakVelocity(self) -> float:
+        return max((abs(segment.startVelocity) for segment in self.segments), default=0.000)
+
+
+    def isFinished(self, time: float) -> bool:
+        return time >= self.duration
+
+
+    def sample(self, time: float) -> ProfilePoint:
+        """
+        Returns the reference position, velocity and acceleration at the given time since the start of the profile
+        """
+        for segment in self.segments:
+            if time < (segment.startTime + segment.duration):
+                return segment.sample(time)
+
+        return ProfilePoint(self.targetPosition, 0.000, 0.000)
+
+
+#------------------------------------------------------------------------------
+# Planning Helper Methods
+#------------------------------------------------------------------------------
+    def _appendSegment(self, duration: float, startPosition: float, startVelocity: float, acceleration: float):
+        if duration > 0:
+            self.segments.append(ProfileSegment(self.duration, duration, startPosition, startVelocity, acceleration))
+
+
+    def _plan(self, position: float, velocity: float):
+        acceleration = self.maximumAcceleration
+        distance = self.targetPosition - position
+        direction = math.copysign(1.0, distance if (distance != 0) else velocity)
+
+        # The velocity and distance are planned in the direction of the target, so that only positive values need to be handled
+        velocity *= direction
+        distance *= direction
+        stoppingDistance = velocity*velocity/(2*acceleration)
+
+        if (velocity < 0) or (stoppingDistance > distance):
+            stoppingTime = abs(velocity)/acceleration
+            self._appendSegment(stoppingTime, position, direction*velocity, -math.copysign(acceleration, direction*velocity))
+            self._plan(self.segments[-1].endPoint.position if self.segments else position, 0.000)
+            return
+
+        peakVelocity = min(self.maximumVelocity, math.sqrt(acceleration*distance + velocity*velocity/2))
+        accelerationTime = abs(peakVelocity - velocity)/acceleration
+        accelerationDistance = (velocity + peakVelocity)/2*accelerationTime
+        decelerationTime = peakVelocity/acceleration
+        decelerationDistance = peakVelocity*peakVelocity/(2*acceleration)
+        cruiseTime = max(distance - accelerationDistance - decelerationDistance, 0.000)/peakVelocity if (peakVelocity > 0) else 0.000
+
+        self._appendSegment(accelerationTime, position, direction*velocity, direction*math.copysign(acceleration, peakVelocity - velocity))
+        self._appendSegment(cruiseTime, position + direction*accelerationDistance, direction*peakVelocity, 0.000)
+        self._appendSegment(decelerationTime, position + direction*(distance - decelerationDistance), direction*peakVelocity, -direction*acceleration)
+
+
+#------------------------------------------------------------------------------
+# Move Time Estimation
+#------------------------------------------------------------------------------
+def estimateMoveTime(distance: float, maximumVelocity: float, maximumAcceleration: float) -> float:
+    """
+    Returns the duration of the trapezoidal profile of a move over the distance that starts and ends at rest, without planning
+    the segments of the profile
+    """
+    distance = abs(distance)
+
+    if distance >= maximumVelocity*maximumVelocity/maximumAcceleration:
+        return distance/maximumVelocity + maximumVelocity/maximumAcceleration
+    return 2*math.sqrt(distance/maximumAcceleration)
@@ -1,11 +1,15 @@
 import logging
+import time
 from dataclasses import dataclass
 from enum import Enum
 from threading import Lock
 
+from AsyncConnection import sendCommandAndGetResponse
+from CommandQueue import CommandDropped, CommandPriority, CommandQueue, CommandQueueStatistics
 from ConfigurationManager import ConfigurationManager
 from ConnectionInterface import ConnectionInterface
-from JobThread import TimedJobThread
+from Instrumentation import DeviceStatistics
+from JobScheduler import JobScheduler, ScheduledJob
 from Watchdog import Watchdog
 
 
@@ -44,7 +48,18 @@ class Voltage:
 # ------------------------------------------------------------------------------
 @dataclass
 class Jobs:
-    updateVoltage: TimedJobThread
+    updateVoltage: ScheduledJob
+
+
+@dataclass
+class VoltageWriteCache:
+    acknowledged: float = None
+    pending: float = None
+    pendingWrite: ScheduledJob = None
+    lastWriteTime: float = None
+    suppressedWrites: int = 0
+    coalescedWrites: int = 0
+    generation: int = 0
 
 
 # ------------------------------------------------------------------------------
@@ -54,9 +69,11 @@ class MotorControllerModel:
     def __init__(
         self, motorControllerConnection: ConnectionInterface, 
         watchdogConnection: ConnectionInterface, 
-        settingsManager: ConfigurationManager):
+        settingsManager: ConfigurationManager,
+        scheduler: JobScheduler):
 
         self._settingsManager = settingsManager
+        self._scheduler = scheduler
         
         self._serialAddress = '01'
         self._serialChannel = '0'
@@ -66,12 +83,14 @@ class MotorControllerModel:
         self._motorState = MotorState.STOPPED
 
         self._connection = motorControllerConnection
-        self._watchdog = Watchdog(watchdogConnection, settingsManager=self._settingsManager)
+        self.statistics = DeviceStatistics("Motor Controller")
+        self._watchdog = Watchdog(watchdogConnection, settingsManager=self._settingsManager, scheduler=self._scheduler)
         
-        self._jobs = Jobs(
-            updateVoltage=TimedJobThread(self._settingsManager.voltageUpdatePeriod, self._updateCurrentVoltage)
-        )
-        self._lock = Lock()
+        self._jobs = Jobs(updateVoltage=None)
+        self._commandQueue = CommandQueue("Motor Controller Commands")
+        self._writeCache = VoltageWriteCache()
+        self._writeCacheLock = Lock()
+        self._stopLock = Lock()
 
 
 #------------------------------------------------------------------------------
@@ -100,26 +119,41 @@ class MotorControllerModel:
 
             if self._jobs.updateVoltage is None:
                 logging.info("Starting the Motor Controller Voltage Update Thread")
-                self._jobs.updateVoltage = TimedJobThread(self._settingsManager.voltageUpdatePeriod, self._updateCurrentVoltage)
+                self._jobs.updateVoltage = self._scheduler.createJob(self._settingsManager.voltageUpdatePeriod, self._updateCurrentVoltage, name="Motor Controller Voltage Update", blocking=True)
                 self._jobs.updateVoltage.start()
 
 
     def stop(self):
-        if self._connection.isConnected():
-            self.setVoltage(0.000)
+        # The zero voltage write of a stop calls stop again if the Motor Controller does not respond, which is ignored, as is a stop that
+        # is requested by another thread while this one is in progress
+        if not self._stopLock.acquire(blocking=False):
+            return
 
-            logging.info("Stopping the Motor Controller Voltage Update Thread")
-            self._jobs.updateVoltage.stop()
-            self._jobs.updateVoltage = None
+        try:
+            if self._connection.isConnected():
+                self.setVoltage(0.000)
 
-            logging.info("Stopping the Watchdog Timer")
-            self._watchdog.stop()
+                if self._jobs.updateVoltage is not None:
+                    logging.info("Stopping the Motor Controller Voltage Update Thread")
+                    if not self._jobs.updateVoltage.stop(wait=True, timeout=self._settingsManager.timeout):
+                        logging.warning("The Motor Controller Voltage Update Thread did not finish within the timeout")
+                    self._jobs.updateVoltage = None
 
-            logging.info("Disconnecting from the Motor Controller")
-            self._connection.disconnect()
+                logging.info("Stopping the Watchdog Timer")
+                self._watchdog.stop()
+
+                logging.info("Disconnecting from the Motor Controller")
+                self._connection.disconnect()
+
+                with self._writeCacheLock:
+                    self._writeCache.acknowledged = None
+        finally:
+            self._stopLock.release()
 
 
     def emergencyStop(self):
+        self._cancelPendingVoltageWrite()
+
         if self.isWatchdogConnected() and self.isMotorControllerConnected():
             self._watchdog.stop()
             self._connection.disconnect()
@@ -151,6 +185,9 @@ class MotorControllerModel:
     def voltageUpdatePeriod(self, newUpdatePeriod: float):
         self._settingsManager.voltageUpdatePeriod = max(self._settingsManager.minimumVoltageUpdatePeriod, newUpdatePeriod)
 
+        if self._jobs.updateVoltage is not None:
+            self._jobs.updateVoltage.interval = self._settingsManager.voltageUpdatePeriod
+
 
     def isEnabled(self) -> bool:
         return self._watchdog.isEnabled()
@@ -164,31 +201,66 @@ class MotorControllerModel:
         return self._watchdog.isConnected()
 
 
+    @property
+    def watchdogStatistics(self) -> DeviceStatistics:
+        return self._watchdog.statistics
+
+
+    @property
+    def commandQueueStatistics(self) -> CommandQueueStatistics:
+        return self._commandQueue.statistics
+
+
     def getState(self) -> MotorState:
         return self._motorState
 
 
+    @property
+    def writeCache(self) -> VoltageWriteCache:
+        return self._writeCache
+
+
 #------------------------------------------------------------------------------
 #
 #------------------------------------------------------------------------------
-    def _sendCommandAndGetResponse(self, command: bytes) -> str:
-        with self._lock:
-            try:
-                response = self._connection.getResponse() if self._connection.sendCommand(command) else None
-            except TimeoutError as timeoutError:
-                logging.exception("Unable to get a response from the Motor Controller. Aborting attempt and turning off the Motor Controller", exc_info=timeoutError)
-                self.stop()
-                return None
+    def _sendCommandAndGetResponse(self, command: bytes, priority: CommandPriority, maximumWait: float = None, writeGeneration: int = None) -> str:
+        """
+        Queues the command on the Motor Controller link, where zero voltage writes are sent ahead of control writes and control
+        writes ahead of telemetry reads. Commands that were not sent within the maximum wait, and control writes that were
+        superseded by a zero voltage write, raise CommandDropped. A write of a voltage that was taken from the write cache is also
+        dropped if the write generation has changed by the time it is granted the link.
+        """
+        def sendCommand():
+            if writeGeneration is not None:
+                with self._writeCacheLock:
+                    if writeGeneration != self._writeCache.generation:
+                        raise CommandDropped(f"The {priority} command was superseded by a newer voltage write")
+
+            return sendCommandAndGetResponse(self._connection, command, self.statistics)
+
+        try:
+            response = self._commandQueue.execute(priority, sendCommand, maximumWait)
+        except TimeoutError as timeoutError:
+            logging.exception("Unable to get a response from the Motor Controller. Aborting attempt and turning off the Motor Controller", exc_info=timeoutError)
+            self.stop()
+            return None
 
         return None if (response is None) else response.decode(self._settingsManager.Encoding)
 
 
     def _updateCurrentVoltage(self):
-        response = self._sendCommandAndGetResponse(self._getVoltageCommand)
+        # A voltage readback that could not be sent within one update period is stale, since the next one is already due
+        maximumWait = self._settingsManager.voltageUpdatePeriod
+        try:
+            response = self._sendCommandAndGetResponse(self._getVoltageCommand, CommandPriority.TELEMETRY, maximumWait)
+        except CommandDropped:
+            logging.debug("Dropped a stale Motor Controller voltage readback")
+            return
 
         if (response is None) or ((response[0] != '!') and (response[-1] != '\r')):
             logging.debug(f"Command Sent: {self._getVoltageCommand}")
             logging.error(f"Bad response received from the Motor Controller on {self._connection}: {response}")
+            self.statistics.recordBadFrame()
             logging.warning("Turning off the Motor Controller")
             self.stop()
             return
@@ -200,7 +272,7 @@ class MotorControllerModel:
 # 
 #------------------------------------------------------------------------------
     def toggleEnable(self):
-        if self.isWatchdogConnected():
+        if not self.isWatchdogConnected():
             logging.debug("Watchdog is not connected")
             return
 
@@ -219,7 +291,71 @@ class MotorControllerModel:
             self.setVoltage(newVoltage=newVoltage)
 
 
+    def requestVoltage(self, newVoltage: float):
+        """
+        Requests a new voltage without waiting for it to be written, for callers such as the voltage slider that produce bursts of
+        voltages. A request is written straight away if nothing was written within the coalescing window, otherwise only the latest
+        request is written once the window has passed. A zero voltage is always written immediately.
+        """
+        coalescingWindow = self._settingsManager.voltageCoalescingWindow
+
+        if (newVoltage == 0.000) or (coalescingWindow <= 0):
+            self.setVoltage(newVoltage)
+            return
+
+        with self._writeCacheLock:
+            writeCache = self._writeCache
+
+            if writeCache.pending is not None:
+                writeCache.coalescedWrites += 1
+
+            writeCache.pending = newVoltage
+
+            if writeCache.pendingWrite is None:
+                timeSinceLastWrite = coalescingWindow if (writeCache.lastWriteTime is None) else (time.monotonic() - writeCache.lastWriteTime)
+                writeCache.pendingWrite = self._scheduler.callLater(
+                    max(coalescingWindow - timeSinceLastWrite, 0.000), 
+                    self._writePendingVoltage, 
+                    name="Motor Controller Voltage Write",
+                    blocking=True
+                )
+
+
+    def _writePendingVoltage(self):
+        with self._writeCacheLock:
+            newVoltage = self._writeCache.pending
+            writeGeneration = self._writeCache.generation
+            self._writeCache.pending = None
+            self._writeCache.pendingWrite = None
+
+        if newVoltage is not None:
+            self._writeVoltage(newVoltage, writeGeneration)
+
+
+    def _cancelPendingVoltageWrite(self):
+        """
+        Discards the voltage that is waiting to be written, and starts a new write generation, so that a pending voltage that was already
+        taken from the write cache is not written after a newer voltage, such as the zero voltage of a stop
+        """
+        with self._writeCacheLock:
+            if self._writeCache.pendingWrite is not None:
+                self._writeCache.pendingWrite.stop()
+
+            self._writeCache.pending = None
+            self._writeCache.pendingWrite = None
+            self._writeCache.generation += 1
+
+
     def setVoltage(self, newVoltage):
+        """
+        Writes the voltage immediately. Any voltage that is still waiting to be written by requestVoltage is discarded, since it is
+        older than this voltage.
+        """
+        self._cancelPendingVoltageWrite()
+        self._writeVoltage(newVoltage)
+
+
+    def _writeVoltage(self, newVoltage: float, writeGeneration: int = None):
         """
         Just some Pythonic source-ry to clamp the newVoltage value to the MAXIMUM or MINIMUM voltage values
         It works by taking a list of values [MINIMUM, valueOfInterest, MAXIMUM] and sorting the values in Ascending order
@@ -238,10 +374,32 @@ class MotorControllerModel:
 
         newVoltage = sorted((self._settingsManager.minimumVoltage, newVoltage, self._settingsManager.maximumVoltage))[1]
 
+        # The Motor Controller only resolves the voltage to 3 decimal places, so a voltage that rounds to the last acknowledged voltage
+        # would not change its output. A zero voltage is always written, since it is also used to stop the motor
+        newVoltage = round(newVoltage, 3)
+        with self._writeCacheLock:
+            if (newVoltage != 0.000) and (newVoltage == self._writeCache.acknowledged):
+                self._writeCache.suppressedWrites += 1
+                return
+
         command = f"#{self._serialAddress}{self._serialChannel}{newVoltage:+07.3f}\r".encode(self._settingsManager.Encoding)
-        response = self._sendCommandAndGetResponse(command)
-        
-        if (response is None) or (response != ">\r"):
+        priority = CommandPriority.EMERGENCY if (newVoltage == 0.000) else CommandPriority.CONTROL
+        try:
+            response = self._sendCommandAndGetResponse(command, priority, writeGeneration=writeGeneration)
+        except CommandDropped as commandDropped:
+            logging.debug(f"The voltage write of {newVoltage:+.3f} V was dropped: {commandDropped}")
+            return
+
+        acknowledged = (response is not None) and (response == ">\r")
+        with self._writeCacheLock:
+            self._writeCache.lastWriteTime = time.monotonic()
+            self._writeCache.acknowledged = newVoltage if acknowledged else None
+
+        if not acknowledged:
             logging.error("Bad response received from the Motor Controller")
+            self.statistics.recordBadFrame()
             self.stop()
             self._motorState = MotorState.STOPPED
+            return
+
+        self._motorState = self.updateMotorState(newVoltage, 0.000)
@@ -0,0 +1,63 @@
+import math
+
+
+#------------------------------------------------------------------------------
+# PID Controller
+#------------------------------------------------------------------------------
+class PIDController:
+    """
+    A PID controller with an integral accumulator, anti-windup and a low-pass filtered derivative on the measurement.
+    The error is the measurement minus the setpoint, which matches the turn table, where a positive voltage decreases the angle.
+    The derivative is taken on the measurement instead of on the error, so that a change of the setpoint does not kick the output.
+    When the setpoint follows a motion profile, the rate of the setpoint is subtracted from the rate of the measurement, and is fed
+    forward to the output with the velocity feedforward gain.
+    The integral is only accumulated while the output is not saturated, or while the error drives the output out of saturation,
+    so that the integral does not wind up while the output is at its limit.
+    """
+    def __init__(self, proportionalGain: float, integralGain: float, derivativeGain: float, outputLimit: float, derivativeFilterTime: float = 0.000, velocityFeedforwardGain: float = 0.000):
+        self.proportionalGain = proportionalGain
+        self.integralGain = integralGain
+        self.derivativeGain = derivativeGain
+        self.velocityFeedforwardGain = velocityFeedforwardGain
+        self.outputLimit = outputLimit
+        self.derivativeFilterTime = derivativeFilterTime
+        self.reset()
+
+
+    def reset(self):
+        self.integral = 0.000
+        self.derivative = 0.000
+        self.output = 0.000
+        self._previousMeasurement = None
+
+
+    def update(self, setpoint: float, measurement: float, timeStep: float, measurementRate: float = None, setpointRate: float = 0.000, integrate: bool = True) -> float:
+        """
+        Returns the saturated output for the new measurement. If the rate of change of the measurement is known, e.g. from a state
+        estimator, it is used for the derivative instead of the difference between successive measurements.
+        The integral can be held, e.g. while the setpoint is moving and the tracking error is mostly caused by the lag of the plant.
+        """
+        error = measurement - setpoint
+
+        if measurementRate is None:
+            measurementRate = 0.000 if ((self._previousMeasurement is None) or (timeStep <= 0)) else (measurement - self._previousMeasurement)/timeStep
+        self._previousMeasurement = measurement
+
+        # First order low-pass filter of the derivative term, discretised with the backward Euler method
+        if (self.derivativeFilterTime > 0) and (timeStep > 0):
+            self.derivative += (timeStep/(self.derivativeFilterTime + timeStep))*(self.derivativeGain*(measurementRate - setpointRate) - self.derivative)
+        else:
+            self.derivative = self.derivativeGain*(measurementRate - setpointRate)
+
+        # The output has to be negative to increase the measurement, so the feedforward has the opposite sign of the setpoint rate
+        proportional = self.proportionalGain*error - self.velocityFeedforwardGain*setpointRate
+        unsaturatedOutput = proportional + self.integral + self.derivative
+
+        # Conditional integration: the integral is frozen while the output is saturated in the direction in which the error pushes it
+        integralStep = self.integralGain*error*max(timeStep, 0.000)
+        isSaturated = abs(unsaturatedOutput) >= self.outputLimit
+        if integrate and ((not isSaturated) or (math.copysign(1, integralStep) != math.copysign(1, unsaturatedOutput))):
+            self.integral = sorted((-self.outputLimit, self.integral + integralStep, self.outputLimit))[1]
+
+        self.output = sorted((-self.outputLimit, proportional + self.integral + self.derivative, self.outputLimit))[1]
+        return self.output
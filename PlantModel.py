@@ -0,0 +1,73 @@
+import math
+from dataclasses import dataclass
+from typing import Tuple
+
+from EncoderFrameDecoder import Position
+
+
+#------------------------------------------------------------------------------
+# Plant Parameters Dataclass
+#------------------------------------------------------------------------------
+@dataclass
+class PlantParameters:
+    motorGain: float = 150.000          # Steady state motor shaft speed in degrees/s per volt above the deadband
+    timeConstant: float = 0.150         # Mechanical time constant of the motor and turn table in seconds
+    deadband: float = 1.100             # Voltage that is needed to overcome the static friction of the drive train, just below the minimum control signal
+    gearboxReduction: int = Position.GEARBOX_REDUCTION
+    stepsPerRevolution: int = Position.STEPS_PER_REVOLUTION
+    maximumRevolutions: int = Position.MAXIMUM_REVOLUTIONS
+
+
+#------------------------------------------------------------------------------
+# Plant Model
+#------------------------------------------------------------------------------
+class PlantModel:
+    """
+    A model of the motor, gearbox and Shaft Encoder of the turn table.
+    The motor is modelled as a first order system from the voltage above the deadband to the speed of the motor shaft. The Shaft Encoder
+    is mounted on the motor shaft, so the angle of the turn table is the motor shaft angle divided by the gearbox reduction. A positive
+    voltage turns the motor shaft in the direction in which the encoder counts up, which decreases the angle of the turn table.
+    The voltage is assumed to be constant between calls to advance, which allows the model to be advanced with the exact solution of
+    the first order system, so that the result does not depend on the size of the time step.
+    """
+    def __init__(self, parameters: PlantParameters = None, initialAngle: float = 0.000):
+        self.parameters = PlantParameters() if (parameters is None) else parameters
+        self.motorAngle = -initialAngle*self.parameters.gearboxReduction
+        self.motorVelocity = 0.000
+
+
+    @property
+    def angle(self) -> float:
+        return -self.motorAngle/self.parameters.gearboxReduction
+
+
+    @property
+    def velocity(self) -> float:
+        return -self.motorVelocity/self.parameters.gearboxReduction
+
+
+    def effectiveVoltage(self, voltage: float) -> float:
+        return math.copysign(max(abs(voltage) - self.parameters.deadband, 0.000), voltage)
+
+
+    def advance(self, timeStep: float, voltage: float):
+        if timeStep <= 0:
+            return
+
+        parameters = self.parameters
+        targetVelocity = parameters.motorGain*self.effectiveVoltage(voltage)
+        decay = math.exp(-timeStep/parameters.timeConstant)
+        velocityError = self.motorVelocity - targetVelocity
+
+        self.motorAngle += targetVelocity*timeStep + velocityError*parameters.timeConstant*(1 - decay)
+        self.motorVelocity = targetVelocity + velocityError*decay
+
+
+    def encoderCounts(self) -> Tuple[int, int]:
+        """
+        The revolution and step counts of the multi-turn Shaft Encoder, which wrap around at the maximum revolution count
+        """
+        parameters = self.parameters
+        totalSteps = math.floor(self.motorAngle*parameters.stepsPerRevolution/360.0)
+        revolution, step = divmod(totalSteps, parameters.stepsPerRevolution)
+        return revolution % parameters.maximumRevolutions, step
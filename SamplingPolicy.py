@@ -0,0 +1,47 @@
+import time
+from typing import Callable
+
+
+#------------------------------------------------------------------------------
+# Adaptive Sampling Policy
+#------------------------------------------------------------------------------
+class AdaptiveSamplingPolicy:
+    """
+    Selects the sample period of the Shaft Encoder from the motion state of the turn table.
+    While the turn table is moving, the encoder is sampled at the minimum sample period. Once the turn table has been idle for
+    longer than the idle delay, the sample period is doubled on every evaluation until it reaches the idle sample period, so that
+    the encoder link is not kept busy while the turn table is parked. A move or a voltage change is notified when it starts, so that
+    the minimum sample period is used straight away instead of from the next evaluation, which may be an idle sample period away.
+    """
+    def __init__(self, minimumSamplePeriod: float, idleSamplePeriod: float, isMotionActive: Callable[[], bool], idleDelay: float = 1.000, clock: Callable[[], float] = time.monotonic):
+        self.minimumSamplePeriod = minimumSamplePeriod
+        self.idleSamplePeriod = max(minimumSamplePeriod, idleSamplePeriod)
+        self.idleDelay = idleDelay
+        self._isMotionActive = isMotionActive
+        self._clock = clock
+
+        self._samplePeriod = self.minimumSamplePeriod
+        self._lastActiveTime = self._clock()
+
+
+    @property
+    def samplePeriod(self) -> float:
+        return self._samplePeriod
+
+
+    def notifyMotion(self) -> float:
+        self._lastActiveTime = self._clock()
+        self._samplePeriod = self.minimumSamplePeriod
+        return self._samplePeriod
+
+
+    def nextSamplePeriod(self) -> float:
+        now = self._clock()
+
+        if self._isMotionActive():
+            self._lastActiveTime = now
+            self._samplePeriod = self.minimumSamplePeriod
+        elif (now - self._lastActiveTime) > self.idleDelay:
+            self._samplePeriod = min(2*self._samplePeriod, self.idleSamplePeriod)
+
+        return self._samplePeriod
@@ -0,0 +1,444 @@
+import logging
+import operator
+import os
+import time
+from dataclasses import dataclass
+from enum import Enum
+from itertools import repeat
+from threading import Condition, Thread, current_thread
+from typing import Callable, List, Sequence
+
+from ConfigurationManager import ConfigurationManager
+from MotionExecutor import MoveHandle, MoveStatus
+from MotionProfile import estimateMoveTime
+
+
+#------------------------------------------------------------------------------
+# Enumeration Constants
+#------------------------------------------------------------------------------
+class ScanStatus(Enum):
+    COMPLETED = 0
+    CANCELLED = 1
+    FAILED = 2
+
+    def __str__(self):
+        return self.name
+
+
+#------------------------------------------------------------------------------
+# Scan Plan Data Classes
+#------------------------------------------------------------------------------
+@dataclass(frozen=True)
+class ScanPoint:
+    angle: float
+    dwellTime: float = 0.000
+    approachPosition: float = None
+
+
+@dataclass(frozen=True)
+class PointArrival:
+    index: int
+    target: float
+    angle: float
+    timestamp: float
+
+
+@dataclass(frozen=True)
+class ScanResult:
+    status: ScanStatus
+    pointsCompleted: int
+    pointCount: int
+    duration: float
+
+
+@dataclass(frozen=True)
+class OptimizedScanPlan:
+    points: List[ScanPoint]
+    order: List[int]
+    originalTime: float
+    optimizedTime: float
+
+
+def parseScanPoint(text: str) -> ScanPoint:
+    """
+    Parses a point of the form "angle" or "angle:dwellTime"
+    """
+    angle, _, dwellTime = text.partition(':')
+    return ScanPoint(float(angle), float(dwellTime) if dwellTime else 0.000)
+
+
+def loadScanPlan(path: str) -> List[ScanPoint]:
+    """
+    Loads a scan plan from a text file with one point per line. Every line holds an angle, optionally followed by a dwell time in
+    seconds, separated by whitespace or a comma. Empty lines and everything after a # are ignored.
+    """
+    points = []
+
+    with open(path, 'r') as scanPlanFile:
+        for lineNumber, line in enumerate(scanPlanFile, start=1):
+            fields = line.split('#', 1)[0].replace(',', ' ').split()
+
+            if not fields:
+                continue
+
+            try:
+                points.append(ScanPoint(float(fields[0]), float(fields[1]) if (len(fields) > 1) else 0.000))
+            except ValueError as valueError:
+                raise ValueError(f"Line {lineNumber} of the scan plan {path} is not a valid point: {line.strip()}") from valueError
+
+    return points
+
+
+def resolveScanPlanPath(directory: str, name: str) -> str:
+    """
+    Returns the path of the scan plan file with the name that was received from a client, which has to be a relative path inside the
+    scan plan directory. Absolute paths, paths that contain .. and paths that lead out of the directory through a link are rejected
+    with a ValueError.
+    """
+    if (not name) or os.path.isabs(name) or name.startswith(('/', '\\')) or os.path.splitdrive(name)[0] or ('..' in name.replace('\\', '/').split('/')):
+        raise ValueError(f"The scan plan {name} is not a relative path inside the scan plan directory")
+
+    scanPlanDirectory = os.path.realpath(directory)
+    path = os.path.realpath(os.path.join(scanPlanDirectory, name))
+
+    if os.path.commonpath((scanPlanDirectory, path)) != scanPlanDirectory:
+        raise ValueError(f"The scan plan {name} is outside of the scan plan directory")
+
+    return path
+
+
+def checkScanPoints(points: Sequence[ScanPoint], minimumAngle: float, maximumAngle: float):
+    """
+    Raises a ValueError if the angle of any of the points is outside of the range that the turn table may be moved to
+    """
+    for index, point in enumerate(points):
+        if not (minimumAngle <= point.angle <= maximumAngle):
+            raise ValueError(f"Point {index} of the scan plan at {point.angle:.3f} is outside of the range {minimumAngle:.3f} to {maximumAngle:.3f}")
+
+
+#------------------------------------------------------------------------------
+# Scan Plan Optimizer
+#------------------------------------------------------------------------------
+class ScanPlanOptimizer:
+    """
+    Reorders the points of a scan plan to minimise the estimated scan time, which is the sum of the durations of the trapezoidal
+    profiles of all moves and of the dwell times.
+    As the turn table only has a single axis and has to stop at every point, the fastest order is a sweep with at most one reversal:
+    either across all points from one end, or through the points on one side of the start position and then through the points on
+    the other side. Every candidate is built from a single sort, so plans with thousands of points are planned in milliseconds.
+    If an approach direction is set, every point is approached moving in that direction to take out the backlash of the gears, and
+    a point that would be approached from the other side gets an approach position at the approach distance before it.
+    """
+    def __init__(
+        self, minimumPosition: float, maximumPosition: float,
+        maximumVelocity: float, maximumAcceleration: float,
+        approachDirection: int = 0, approachDistance: float = 1.000):
+
+        self.minimumPosition = minimumPosition
+        self.maximumPosition = maximumPosition
+        self.maximumVelocity = maximumVelocity
+        self.maximumAcceleration = maximumAcceleration
+        self.approachDirection = approachDirection
+        self.approachDistance = approachDistance
+
+
+    @classmethod
+    def fromSettings(cls, settingsManager: ConfigurationManager) -> "ScanPlanOptimizer":
+        approachDirections = {'positive': 1, 'negative': -1}
+        return cls(
+            minimumPosition=settingsManager.minimumGotoPosition,
+            maximumPosition=settingsManager.maximumGotoPosition,
+            maximumVelocity=settingsManager.maximumVelocity,
+            maximumAcceleration=settingsManager.maximumAcceleration,
+            approachDirection=approachDirections.get(settingsManager.scanApproachDirection, 0),
+            approachDistance=settingsManager.scanApproachDistance,
+        )
+
+
+    def estimateTime(self, points: Sequence[ScanPoint], startPosition: float) -> float:
+        """
+        Returns the estimated time to run the points in the given order from the start position, including approach moves and dwell times
+        """
+        targets = [target for point in points for target in (point.approachPosition, point.angle) if target is not None]
+        return self._estimateTravelTime(targets, startPosition) + sum(point.dwellTime for point in points)
+
+
+    def optimize(self, points: Sequence[ScanPoint], startPosition: float, reorder: bool = True) -> OptimizedScanPlan:
+        """
+        Returns the points in the order with the lowest estimated scan time, with the approach positions set. Raises a ValueError if a
+        point is outside of the soft limits of the turn table
+        """
+        for index, point in enumerate(points):
+            if not (self.minimumPosition <= point.angle <= self.maximumPosition):
+                raise ValueError(f"Point {index} at {point.angle:.3f} is outside of the limits {self.minimumPosition:.3f} to {self.maximumPosition:.3f}")
+
+        # The dwell times do not depend on the order, so only the travel times of the candidate orders are compared
+        angles = [point.angle for point in points]
+        dwellTime = sum(point.dwellTime for point in points)
+        orders = [list(range(len(points)))] + (self._candidateOrders(angles, startPosition) if reorder else [])
+        travelTimes = self._estimateOrderTimes(angles, orders, startPosition)
+
+        bestOrder = orders[0]
+        bestTime = originalTime = travelTimes[0] + dwellTime
+
+        for order, travelTime in zip(orders[1:], travelTimes[1:]):
+            if travelTime + dwellTime < bestTime:
+                bestOrder, bestTime = order, travelTime + dwellTime
+
+        approachPositions = self._approachPositions([angles[index] for index in bestOrder], startPosition, warn=True)
+        plannedPoints = [ScanPoint(points[index].angle, points[index].dwellTime, approachPosition) for index, approachPosition in zip(bestOrder, approachPositions)]
+        return OptimizedScanPlan(plannedPoints, bestOrder, originalTime, bestTime)
+
+
+#------------------------------------------------------------------------------
+# Planning Helper Methods
+#------------------------------------------------------------------------------
+    def _candidateOrders(self, angles: Sequence[float], startPosition: float) -> List[List[int]]:
+        ascending = sorted(range(len(angles)), key=angles.__getitem__)
+        below = [index for index in ascending if angles[index] < startPosition]
+        above = ascending[len(below):]
+
+        return [
+            ascending,
+            ascending[::-1],
+            below[::-1] + above,
+            above + below[::-1],
+        ]
+
+
+    def _approachPositions(self, angles: Sequence[float], startPosition: float, warn: bool = False) -> List[float]:
+        direction = self.approachDirection
+        position = startPosition
+        approachPositions = []
+
+        for angle in angles:
+            approachPosition = None
+
+            # A point that would be reached moving against the approach direction is first overshot by the approach distance
+            if (direction != 0) and ((angle - position)*direction < 0):
+                approachPosition = min(max(angle - direction*self.approachDistance, self.minimumPosition), self.maximumPosition)
+
+                if (angle - approachPosition)*direction <= 0:
+                    if warn:
+                        logging.warning(f"The point at {angle:.3f} can not be approached from the approach direction within the limits")
+                    approachPosition = None
+
+            approachPositions.append(approachPosition)
+            position = angle
+
+        return approachPositions
+
+
+    def _estimateOrderTime(self, angles: Sequence[float], order: Sequence[int], startPosition: float) -> float:
+        orderedAngles = [angles[index] for index in order]
+
+        if self.approachDirection == 0:
+            return self._estimateTravelTime(orderedAngles, startPosition)
+
+        approachPositions = self._approachPositions(orderedAngles, startPosition)
+        targets = [target for approachPosition, angle in zip(approachPositions, orderedAngles) for target in (approachPosition, angle) if target is not None]
+        return self._estimateTravelTime(targets, startPosition)
+
+
+    def _estimateOrderTimes(self, angles: Sequence[float], orders: Sequence[Sequence[int]], startPosition: float) -> List[float]:
+        """
+        Returns the travel times of all the orders, which are computed at once on an array with one row per order and one column per
+        move if NumPy is available, and one order at a time otherwise
+        """
+        try:
+            import numpy
+        except ImportError:
+            return [self._estimateOrderTime(angles, order, startPosition) for order in orders]
+
+        if not angles:
+            return [0.000]*len(orders)
+
+        orderedAngles = numpy.asarray(angles, dtype=numpy.float64)[numpy.asarray(orders, dtype=numpy.intp)]
+        previousAngles = numpy.empty_like(orderedAngles)
+        previousAngles[:, 0] = startPosition
+        previousAngles[:, 1:] = orderedAngles[:, :-1]
+
+        direction = self.approachDirection
+        if direction == 0:
+            return self._estimateMoveTimes(numpy, orderedAngles - previousAngles).sum(axis=1).tolist()
+
+        # The same rule as in _approachPositions: a point that is reached against the approach direction is overshot first, unless
+        # the approach position would not be on the approach side of the point within the limits
+        approachPositions = numpy.clip(orderedAngles - direction*self.approachDistance, self.minimumPosition, self.maximumPosition)
+        approached = ((orderedAngles - previousAngles)*direction < 0) & ((orderedAngles - approachPositions)*direction > 0)
+        firstMoves = numpy.where(approached, approachPositions - previousAngles, orderedAngles - previousAngles)
+        secondMoves = numpy.where(approached, orderedAngles - approachPositions, 0.000)
+        return (self._estimateMoveTimes(numpy, firstMoves) + self._estimateMoveTimes(numpy, secondMoves)).sum(axis=1).tolist()
+
+
+    def _estimateMoveTimes(self, numpy, distances):
+        """
+        The vectorised form of estimateMoveTime
+        """
+        distances = numpy.abs(distances)
+        velocity = self.maximumVelocity
+        acceleration = self.maximumAcceleration
+        return numpy.where(distances >= velocity*velocity/acceleration, distances/velocity + velocity/acceleration, 2*numpy.sqrt(distances/acceleration))
+
+
+    def _estimateTravelTime(self, targets: Sequence[float], startPosition: float) -> float:
+        distances = map(operator.sub, targets, [startPosition, *targets])
+        return sum(map(estimateMoveTime, distances, repeat(self.maximumVelocity), repeat(self.maximumAcceleration)))
+
+
+#------------------------------------------------------------------------------
+# Scan Plan Executor
+#------------------------------------------------------------------------------
+class ScanPlanExecutor:
+    """
+    Runs a list of scan points back to back on a single thread: the turn table is moved to every point, an arrival notification with
+    the achieved angle and the wall clock time is published, and the table is held for the dwell time of the point before the move
+    to the next point is started.
+    A point with an approach position is approached by a move to the approach position first, which is not notified.
+    A paused scan finishes the move that is in progress and holds before the next point until it is resumed. The scan is cancelled
+    if it is cancelled explicitly, or if one of its moves does not arrive, e.g. because it was preempted by another move command.
+    """
+    def __init__(self, moveTo: Callable[[float], MoveHandle], clock: Callable[[], float] = time.monotonic, name: str = "Scan Plan Executor"):
+        self._moveTo = moveTo
+        self._clock = clock
+        self.name = name
+
+        self._condition = Condition()
+        self._thread = None
+        self._running = False
+        self._paused = False
+        self._cancelRequested = False
+        self.progress = (0, 0)
+
+
+    def start(self, points: Sequence[ScanPoint], onArrival: Callable[[PointArrival], None] = None, onFinished: Callable[[ScanResult], None] = None) -> bool:
+        """
+        Starts running the scan points, and returns False if another scan is still running
+        """
+        with self._condition:
+            if self.isRunning():
+                logging.warning("A scan is already running. The new scan plan is ignored")
+                return False
+
+            self._running = True
+            self._paused = False
+            self._cancelRequested = False
+            self.progress = (0, len(points))
+            self._thread = Thread(target=self._run, args=(list(points), onArrival, onFinished), name=self.name, daemon=True)
+            self._thread.start()
+            return True
+
+
+    def pause(self):
+        with self._condition:
+            self._paused = True
+
+
+    def resume(self):
+        with self._condition:
+            self._paused = False
+            self._condition.notify_all()
+
+
+    def cancel(self):
+        """
+        Cancels the scan before the next point. A move that is in progress has to be cancelled separately
+        """
+        with self._condition:
+            self._cancelRequested = True
+            self._condition.notify_all()
+
+
+    def join(self, timeout: float = None) -> bool:
+        thread = self._thread
+
+        if (thread is None) or (thread is current_thread()):
+            return True
+
+        thread.join(timeout)
+        return not thread.is_alive()
+
+
+    def isRunning(self) -> bool:
+        return self._running
+
+
+    def isPaused(self) -> bool:
+        return self._paused
+
+
+#------------------------------------------------------------------------------
+# Scan Thread Methods
+#------------------------------------------------------------------------------
+    def _waitWhilePaused(self, dwellTime: float = 0.000) -> bool:
+        """
+        Waits for the dwell time and for as long as the scan is paused, and returns False if the scan was cancelled in the meantime
+        """
+        with self._condition:
+            endTime = self._clock() + dwellTime
+
+            while not self._cancelRequested:
+                remainingTime = endTime - self._clock()
+
+                if self._paused:
+                    self._condition.wait()
+                elif remainingTime > 0:
+                    self._condition.wait(remainingTime)
+                else:
+                    break
+
+            return not self._cancelRequested
+
+
+    def _run(self, points: List[ScanPoint], onArrival: Callable[[PointArrival], None], onFinished: Callable[[ScanResult], None]):
+        startTime = self._clock()
+        status = ScanStatus.COMPLETED
+        pointsCompleted = 0
+
+        logging.info(f"Starting a scan of {len(points)} points")
+
+        for index, point in enumerate(points):
+            if not self._waitWhilePaused():
+                status = ScanStatus.CANCELLED
+                break
+
+            for position in (point.approachPosition, point.angle):
+                if position is None:
+                    continue
+
+                moveResult = self._moveTo(position).result()
+
+                if moveResult.status != MoveStatus.ARRIVED:
+                    logging.warning(f"The move to {position:.3f} for point {index} did not arrive ({moveResult.status}). Cancelling the scan")
+                    status = ScanStatus.FAILED if (moveResult.status == MoveStatus.FAILED) else ScanStatus.CANCELLED
+                    break
+
+            if moveResult.status != MoveStatus.ARRIVED:
+                break
+
+            pointsCompleted += 1
+            self.progress = (pointsCompleted, len(points))
+
+            if onArrival is not None:
+                try:
+                    onArrival(PointArrival(index, point.angle, moveResult.finalPosition, time.time()))
+                except Exception as exception:
+                    logging.exception("An error occured in the scan point arrival callback", exc_info=exception)
+
+            if not self._waitWhilePaused(point.dwellTime):
+                status = ScanStatus.CANCELLED
+                break
+
+        result = ScanResult(status, pointsCompleted, len(points), self._clock() - startTime)
+
+        # The scan is finished before the callback is called, so that the callback can already start the next scan
+        with self._condition:
+            self._running = False
+
+        logging.info(f"Scan {result.status} after {result.pointsCompleted} of {result.pointCount} points in {result.duration:.3f}s")
+
+        if onFinished is not None:
+            try:
+                onFinished(result)
+            except Exception as exception:
+                logging.exception("An error occured in the scan finished callback", exc_info=exception)
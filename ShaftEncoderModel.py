@@ -1,70 +1,74 @@
 import logging
+import math
+import time
+from collections import deque
+from concurrent.futures import Future
 from dataclasses import dataclass
+from functools import partial
+from threading import Condition
+from typing import Callable
 
+from AsyncConnection import AsyncLANConnection, sendCommandAndGetResponse
 from ConfigurationManager import ConfigurationManager
 from ConnectionInterface import ConnectionInterface
-from JobThread import TimedJobThread
+from EncoderFrameDecoder import EncoderFrameDecoder, Position
+from EncoderHistory import EncoderHistory
+from Instrumentation import DeviceStatistics
+from JobScheduler import JobScheduler
+from SamplingPolicy import AdaptiveSamplingPolicy
 
 
 #------------------------------------------------------------------------------
-# Mask Enumerations
+# Position Sample Dataclass
 #------------------------------------------------------------------------------
-@dataclass
-class MASKS:
-    REVOLUTIONS = int.from_bytes(b"\x00\x00\xFF\xFF\x00\x00\x00\x00", byteorder="big")
-    STEPS = int.from_bytes(b"\x00\x00\x00\x00\xFF\xFF\x00\x00", byteorder="big")
-    ERROR_CHECK = int.from_bytes(b"\x00\x00\x00\x00\x00\x00\xFF\x00", byteorder="big")
-
-
-#------------------------------------------------------------------------------
-# Position Dataclass
-#------------------------------------------------------------------------------
-@dataclass
-class Position:
-    STEPS_PER_REVOLUTION = 8192
-    MAXIMUM_REVOLUTIONS = 4096
-    DEGREES_PER_STEP = 360.0/(STEPS_PER_REVOLUTION-1)
-    GEARBOX_REDUCTION = 73
-
-    step: int = 0
+@dataclass(frozen=True)
+class PositionSample:
+    """
+    An immutable snapshot of a single validated sample from the Shaft Encoder.
+    The angle is calculated once when the sample is created, and the snapshot is published by replacing a single reference,
+    so readers on other threads can never observe a revolution count and a step count that belong to different samples.
+    """
+    angle: float = 0.000
     revolution: int = 0
+    step: int = 0
+    timestamp: float = 0.000
+    sequence: int = 0
 
-    @property
-    def angle(self) -> float:
-        step = self.step
-        revolution = self.revolution
-
-        # Here we are changing the revolution and step values so that it is possible to account for negative angles.
-        # This is accomplished by using the Revolution count from the encoder to determine whether we are going in the positive or negative direction.
-        # If the turn count is in the count range of 0-2047, the angle is considered to be positive. If we are in the range of 2048-4095, the angle is considered to be negative
-        # This ends up halving the number of turns we can track, but this is find, since we will still be able to track 28 turns in the positive direction or 28 turns in the negative direction
-
-        # Furthermore, to ensure that the negative angle calculations are performed correctly, we offset the revolution count by 1 when it is negative. This ensures that the negative angles do
-        # not start at -360, as opposed to 0
-        # We also need to make sure that if we are moving in the negative direction that we count the steps down as the steps in the negative direction will start from 8191 and count downwards,
-        # thus we offset the step count by 8192 when the revolutions are negative
-        revolution = (revolution - 2048) if (revolution > 2047) else revolution
-        revolution = (revolution + 1)  if (revolution < 0) else revolution
-        step = (step - 8192) if (revolution < 0) else step
-
-        return -(step * self.DEGREES_PER_STEP + (revolution * 360))/self.GEARBOX_REDUCTION
+    def age(self) -> float:
+        return time.monotonic() - self.timestamp
 
 
 #------------------------------------------------------------------------------
 # Shaft Encoder Model
 #------------------------------------------------------------------------------
 class ShaftEncoderModel:
-    def __init__(self, connection: ConnectionInterface, settingsManager: ConfigurationManager):
+    PIPELINE_RECOVERY_SAMPLES = 10
+
+    def __init__(self, connection: ConnectionInterface, settingsManager: ConfigurationManager, scheduler: JobScheduler):
         self._settingsManager = settingsManager
+        self._scheduler = scheduler
     
         self._serialAddress = '02'
         self._positionUpdateCommand = bytes.fromhex(f"0180{self._serialAddress}8004")
-        self._responseValidityCheckMask = int.from_bytes(bytes.fromhex(f"01{self._serialAddress}000000000004"), byteorder=self._settingsManager.byteOrder)
+        self._frameDecoder = EncoderFrameDecoder(int(self._serialAddress, 16))
 
         self._connection = connection
-        self.position = Position()
+        self.statistics = DeviceStatistics("Shaft Encoder")
+        self._latestSample = PositionSample()
+        self.history = EncoderHistory(math.ceil(self._settingsManager.positionHistoryLength/self._settingsManager.minimumPositionSamplePeriod))
+        self._sampleListeners = []
+        self._newSampleCondition = Condition()
+        self._publishedSample = self._latestSample
 
         self._positionUpdateJob = None
+        self._pendingResponse = None
+        self._samplingPolicy = None
+        self._achievedSamplePeriod = None
+
+        self._pipelinedRequests = self._settingsManager.pipelinedPositionRequests
+        self._requestTimestamps = deque()
+        self._strictSamplesRemaining = 0
+        self._halfRoundTripTime = 0.000
 
 
 #------------------------------------------------------------------------------
@@ -81,16 +85,22 @@ class ShaftEncoderModel:
 
         if self._connection.isConnected() and (self._positionUpdateJob is None):
             logging.info("Starting the Shaft Encoder Position Update Thread")
-            self._positionUpdateJob = TimedJobThread(self._settingsManager.positionSamplePeriod, self._updateCurrentPosition)
+            self._positionUpdateJob = self._scheduler.createJob(self._settingsManager.positionSamplePeriod, self._updateCurrentPosition, name="Shaft Encoder Position Update", blocking=True)
             self._positionUpdateJob.start()
 
 
     def stop(self):
         if self._connection.isConnected():
-            if self._positionUpdateJob is not None:
+            positionUpdateJob = self._positionUpdateJob
+            self._positionUpdateJob = None
+
+            if positionUpdateJob is not None:
                 logging.info("Stopping ShaftEncoder Position Update Thread")
-                self._positionUpdateJob.stop()
-                self._positionUpdateJob = None
+                # The connection is only closed once an exchange that is in flight has finished
+                if not positionUpdateJob.stop(wait=True, timeout=self._settingsManager.timeout):
+                    logging.warning("The Shaft Encoder Position Update Thread did not finish within the timeout")
+
+            self._requestTimestamps.clear()
 
             logging.info("Disconnecting from the Shaft Encoder")
             self._connection.disconnect()
@@ -101,7 +111,27 @@ class ShaftEncoderModel:
 #------------------------------------------------------------------------------
     @property
     def currentPosition(self) -> float:
-        return self.position.angle
+        return self._latestSample.angle
+
+
+    @property
+    def latestSample(self) -> PositionSample:
+        return self._latestSample
+
+
+    @property
+    def position(self) -> Position:
+        sample = self._latestSample
+        return Position(step=sample.step, revolution=sample.revolution)
+
+
+    def isSampleFresh(self, maximumAge: float = None) -> bool:
+        """
+        A sample is considered to be fresh if it was taken within the last two sample periods, unless a maximumAge is specified.
+        """
+        sample = self._latestSample
+        maximumAge = (2*self.currentSamplePeriod) if (maximumAge is None) else maximumAge
+        return (sample.sequence > 0) and (sample.age() <= maximumAge)
 
 
     @property
@@ -113,58 +143,330 @@ class ShaftEncoderModel:
     def samplePeriod(self, newUpdatePeriod: float):
         self._settingsManager.positionSamplePeriod = max(self._settingsManager.minimumPositionSamplePeriod, newUpdatePeriod)
 
+        if (self._positionUpdateJob is not None) and (self._samplingPolicy is None):
+            self._positionUpdateJob.interval = self._settingsManager.positionSamplePeriod
+
+
+    @property
+    def currentSamplePeriod(self) -> float:
+        return self.samplePeriod if (self._positionUpdateJob is None) else self._positionUpdateJob.interval
+
+
+    @property
+    def achievedSampleRate(self) -> float:
+        """
+        The rate at which valid samples are actually being received from the Shaft Encoder, averaged over the recent samples
+        """
+        return 0.000 if not self._achievedSamplePeriod else 1/self._achievedSamplePeriod
+
+
+    def setSamplingPolicy(self, samplingPolicy: AdaptiveSamplingPolicy):
+        """
+        Lets the sample period be selected by the sampling policy on every sample. Setting the policy to None restores the fixed samplePeriod.
+        """
+        self._samplingPolicy = samplingPolicy
+
+        if (samplingPolicy is None) and (self._positionUpdateJob is not None):
+            self._positionUpdateJob.interval = self.samplePeriod
+
+
+    def notifyMotion(self):
+        """
+        Switches the sampling policy to its moving sample period as soon as a move or a voltage change is started
+        """
+        samplingPolicy = self._samplingPolicy
+        positionUpdateJob = self._positionUpdateJob
+
+        if (samplingPolicy is None) or (positionUpdateJob is None):
+            return
+
+        samplePeriod = samplingPolicy.notifyMotion()
+        if samplePeriod != positionUpdateJob.interval:
+            positionUpdateJob.interval = samplePeriod
+
 
     def isConnected(self) -> bool:
         return self._connection.isConnected()
 
 
+    @property
+    def pipelinedRequests(self) -> bool:
+        return self._pipelinedRequests
+
+
+    @pipelinedRequests.setter
+    def pipelinedRequests(self, enabled: bool):
+        self._pipelinedRequests = enabled
+        self._settingsManager.pipelinedPositionRequests = enabled
+
+
+#------------------------------------------------------------------------------
+# Sample Listener Methods
+#------------------------------------------------------------------------------
+    def addSampleListener(self, listener: Callable[[PositionSample], None]):
+        """
+        Registers a callable that is called with every new validated PositionSample, on the thread that processed the sample
+        """
+        if listener not in self._sampleListeners:
+            self._sampleListeners = self._sampleListeners + [listener]
+
+
+    def removeSampleListener(self, listener: Callable[[PositionSample], None]):
+        self._sampleListeners = [sampleListener for sampleListener in self._sampleListeners if sampleListener != listener]
+
+
+    def waitForSample(self, afterSequence: int = None, timeout: float = None, cancelled: Callable[[], bool] = None) -> PositionSample:
+        """
+        Blocks until a sample that is newer than the given sequence number has been processed by all the sample listeners, and returns
+        it. Without a sequence number, the next new sample is awaited. Returns None if no new sample arrived within the timeout, or
+        if the wait was cancelled: the cancelled predicate is checked whenever the waiters are woken with wakeSampleWaiters.
+        """
+        cancelled = (lambda: False) if (cancelled is None) else cancelled
+
+        with self._newSampleCondition:
+            afterSequence = self._publishedSample.sequence if (afterSequence is None) else afterSequence
+            self._newSampleCondition.wait_for(lambda: (self._publishedSample.sequence > afterSequence) or cancelled(), timeout)
+            if self._publishedSample.sequence > afterSequence:
+                return self._publishedSample
+            return None
+
+
+    def wakeSampleWaiters(self):
+        with self._newSampleCondition:
+            self._newSampleCondition.notify_all()
+
+
 #------------------------------------------------------------------------------
 #
 #------------------------------------------------------------------------------
-    def _sendCommandAndGetResponse(self, command: bytes) -> int:
+    def _sendCommandAndGetResponse(self, command: bytes) -> bytes:
         if not self._connection.isConnected():
             logging.error(f"Unable to send command to the Shaft Encoder in {self._connection}, because the application is not connected")
             return None
 
         try:
-            response = self._connection.getResponse() if self._connection.sendCommand(command) else None
+            response = sendCommandAndGetResponse(self._connection, command, self.statistics)
         except TimeoutError as timeoutError:
             logging.exception("There was no response from the Shaft Encoder. Aborting attempt to communicate and disconnecting", exc_info=timeoutError)
             self.stop()
             return None
 
-        return None if (response is None) else int.from_bytes(response, byteorder=self._settingsManager.byteOrder)
+        return response
 
 
-    def _checkReceivedDataValidity(self, data: int) -> bool:
+    def _requestPositionUpdate(self):
         """
-        The function performs a check on the data received from the Shaft Encoder, as outlined in the documentation of the Baumer GXM7W-RS485
-        The documentation outlines the following packet structure for a received response:
-        [SOH][EAD][MT_H][MT_L][ST_H][ST_L][LRC][EOT]
-        Each set of square brackets represents an 8-bit byte.
-        To perform the validity check, we need to extract the LRC byte, which represents the error check byte. This is done by shifting masking the LRC bits and shifting the masked bits 
-        8 bits to the right
-        After that, we need to extract the remaining [EAD][MT_H][MT_L][ST_H][ST_L] bytes by shifting the bytes the necessary number of bits to the right and then masking it.
-        All the bytes are then XORed together to obtain a single byte value which is then compared to the LRC byte extracted earlier. If the two values match, the data received is valid.
+        Starts a non-blocking position request on an AsyncLANConnection. The response is processed on the event loop once it arrives,
+        so that a slow response from the Shaft Encoder does not hold up the other jobs that are run by the scheduler.
+        A new request is only made once the previous request has been completed.
         """
-        responseLRC = (data & MASKS.ERROR_CHECK) >> 8
-        calculatedLRC = ((data >> 16) & 0xFF) ^ ((data >> 24) & 0xFF) ^ ((data >> 32) & 0xFF) ^ ((data >> 40) & 0xFF) ^ ((data >> 48) & 0xFF)
-        return (responseLRC == calculatedLRC) and ((data & self._responseValidityCheckMask) == self._responseValidityCheckMask)
+        if (self._pendingResponse is not None) and (not self._pendingResponse.done()):
+            return
+
+        if not self._connection.isConnected():
+            logging.error(f"Unable to send command to the Shaft Encoder in {self._connection}, because the application is not connected")
+            return
+
+        self._pendingResponse = self._connection.exchange(self._positionUpdateCommand)
+        self._pendingResponse.add_done_callback(partial(self._onPositionResponse, time.monotonic()))
+
+
+    def _onPositionResponse(self, requestTime: float, pendingResponse: Future):
+        try:
+            response = pendingResponse.result()
+        except TimeoutError as timeoutError:
+            logging.exception("There was no response from the Shaft Encoder. Aborting attempt to communicate and disconnecting", exc_info=timeoutError)
+            self.statistics.recordTimeout(len(self._positionUpdateCommand))
+            self.stop()
+            return
+        except OSError as connectionError:
+            logging.exception("The connection to the Shaft Encoder failed. Disconnecting", exc_info=connectionError)
+            self.stop()
+            return
+
+        responseTime = time.monotonic()
+
+        if response is not None:
+            self.statistics.recordExchange(responseTime - requestTime, len(self._positionUpdateCommand), len(response))
+
+        self._processPositionResponse(response, self._estimateSampleTime(requestTime, responseTime))
+
+
+    def _requestPositionUpdatePipelined(self):
+        """
+        Keeps one position request in flight between the samples. On every sample, the response to the request that was sent on the
+        previous sample is read, which has normally already arrived, the next request is sent straight away and only then is the
+        response decoded. The round-trip time of the link is therefore overlapped with the sample period instead of being added to it.
+        Every response is matched to its request by the times at which the requests were sent, see _matchPipelinedResponse, and the
+        sample is timestamped with the time at which that request was sent plus half of the round-trip time measured by the strict
+        request/response exchanges. If a response times out, cannot be matched or fails validation, the responses to the requests that
+        are in flight are discarded and a number of strict exchanges are made before pipelining is resumed.
+        """
+        if (self._pendingResponse is not None) and (not self._pendingResponse.done()):
+            return
+
+        if not self._connection.isConnected():
+            logging.error(f"Unable to send command to the Shaft Encoder in {self._connection}, because the application is not connected")
+            return
+
+        requestTime = None
+        response = None
+
+        try:
+            if self._requestTimestamps:
+                response = self._connection.getResponse()
+                requestTime = self._matchPipelinedResponse(response, time.monotonic())
+
+                if requestTime is None:
+                    logging.warning("A pipelined response from the Shaft Encoder did not match the requests in flight. Falling back to strict request/response exchanges")
+                    self.statistics.recordBadFrame()
+                    self._discardRequestsAnsweredBy(response)
+                    self._fallBackToStrictRequests()
+                    return
+
+                response = response[-EncoderFrameDecoder.FRAME.size:]
+
+            if self._connection.sendCommand(self._positionUpdateCommand):
+                self._requestTimestamps.append(time.monotonic())
+        except TimeoutError:
+            logging.warning("A pipelined response from the Shaft Encoder timed out. Falling back to strict request/response exchanges")
+            self.statistics.recordTimeout(len(self._positionUpdateCommand))
+            # A late response to the request that timed out is discarded by the connection before the next request is sent
+            self._requestTimestamps.popleft()
+            self._fallBackToStrictRequests()
+            return
+
+        if requestTime is None:
+            return
+
+        if not self._processPositionResponse(response, requestTime + self._halfRoundTripTime):
+            logging.warning("A pipelined response from the Shaft Encoder was not valid. Falling back to strict request/response exchanges")
+            self._fallBackToStrictRequests()
+
+
+    def _matchPipelinedResponse(self, response: bytes, responseTime: float) -> float:
+        """
+        Matches a pipelined response to the request that it answers and returns the time at which that request was sent, or None if the
+        link is out of sync. A request that was sent more than the timeout before the response has expired, and its response may still
+        arrive, so the link is out of sync. A single read can return the responses to several requests back to back, in which case the
+        last response answers the latest of those requests. The latency of the exchange is the time at which the response was received
+        minus the time at which the matching request was sent.
+        """
+        frameSize = EncoderFrameDecoder.FRAME.size
+
+        if (not response) or ((len(response) % frameSize) != 0):
+            return None
+
+        respondedRequests = len(response) // frameSize
+        if (respondedRequests > len(self._requestTimestamps)) or (self._requestTimestamps[0] < (responseTime - self._settingsManager.timeout)):
+            return None
+
+        for _ in range(respondedRequests):
+            requestTime = self._requestTimestamps.popleft()
+
+        self.statistics.recordExchange(responseTime - requestTime, len(self._positionUpdateCommand), frameSize)
+        return requestTime
+
+
+    def _discardRequestsAnsweredBy(self, response: bytes):
+        answeredRequests = -(-len(response or b"") // EncoderFrameDecoder.FRAME.size)
+
+        for _ in range(min(answeredRequests, len(self._requestTimestamps))):
+            self._requestTimestamps.popleft()
+
+
+    def _fallBackToStrictRequests(self):
+        """
+        Discards the responses to the requests that are still in flight before the strict exchanges are made, so that none of them is
+        read as the response to a strict request
+        """
+        try:
+            while self._requestTimestamps and self._connection.isConnected():
+                response = self._connection.getResponse()
+                if not response:
+                    break
+
+                self._discardRequestsAnsweredBy(response)
+        except TimeoutError:
+            logging.warning("The responses to the pipelined requests that were in flight were not received and have been discarded")
+
+        self._requestTimestamps.clear()
+        self._strictSamplesRemaining = self.PIPELINE_RECOVERY_SAMPLES
+
+
+    def _estimateSampleTime(self, requestTime: float, responseTime: float) -> float:
+        """
+        The position is latched by the Shaft Encoder somewhere between the request and the response, so the middle of the exchange is used
+        """
+        halfRoundTripTime = (responseTime - requestTime)/2
+        self._halfRoundTripTime += 0.1*(halfRoundTripTime - self._halfRoundTripTime)
+        return requestTime + halfRoundTripTime
 
 
     def _updateCurrentPosition(self):
+        samplingPolicy = self._samplingPolicy
+        if (samplingPolicy is not None) and (self._positionUpdateJob is not None):
+            samplePeriod = samplingPolicy.nextSamplePeriod()
+            if samplePeriod != self._positionUpdateJob.interval:
+                self._positionUpdateJob.interval = samplePeriod
+
+        if self._pipelinedRequests and (self._strictSamplesRemaining == 0):
+            self._requestPositionUpdatePipelined()
+            return
+
+        self._strictSamplesRemaining = max(0, self._strictSamplesRemaining - 1)
+
+        if isinstance(self._connection, AsyncLANConnection):
+            self._requestPositionUpdate()
+            return
+
+        requestTime = time.monotonic()
         response = self._sendCommandAndGetResponse(self._positionUpdateCommand)
+        self._processPositionResponse(response, self._estimateSampleTime(requestTime, time.monotonic()))
 
+
+    def _processPositionResponse(self, response: bytes, sampleTime: float) -> bool:
         if (response is None):
             logging.error(f"A bad response was received from the Shaft Encoder on {self._connection}")
-            return
+            return False
 
-        if not self._checkReceivedDataValidity(response):
+        decodedFrame = self._frameDecoder.decode(response)
+
+        if decodedFrame is None:
             logging.error("An error in the received data from the Shaft Encoder was detected")
+            self.statistics.recordBadFrame()
+            return False
+
+        sample = PositionSample(
+            angle=decodedFrame.angle,
+            revolution=decodedFrame.revolution,
+            step=decodedFrame.step,
+            timestamp=sampleTime,
+            sequence=self._latestSample.sequence + 1,
+        )
+        self._updateAchievedSamplePeriod(sample.timestamp - self._latestSample.timestamp)
+        self.history.appendSample(sample)
+        self._latestSample = sample
+
+        for listener in self._sampleListeners:
+            try:
+                listener(sample)
+            except Exception as exception:
+                logging.exception(f"An error occured in the Shaft Encoder sample listener {listener}", exc_info=exception)
+
+        with self._newSampleCondition:
+            self._publishedSample = sample
+            self._newSampleCondition.notify_all()
+
+        return True
+
+
+    def _updateAchievedSamplePeriod(self, timeSinceLastSample: float):
+        # Samples that are more than a second apart are the first samples after a pause, and are not included in the average
+        if timeSinceLastSample > 1.000:
             return
 
-        revolution = ((response & MASKS.REVOLUTIONS) >> 32) & 0xFFFF
-        step = ((response & MASKS.STEPS) >> 16) & 0xFFFF
-
-        self.position.revolution = revolution
-        self.position.step = step
+        if self._achievedSamplePeriod is None:
+            self._achievedSamplePeriod = timeSinceLastSample
+        else:
+            self._achievedSamplePeriod += 0.1*(timeSinceLastSample - self._achievedSamplePeriod)
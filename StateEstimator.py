@@ -0,0 +1,68 @@
+from dataclasses import dataclass
+
+from ShaftEncoderModel import PositionSample
+
+
+#------------------------------------------------------------------------------
+# Motion State Dataclass
+#------------------------------------------------------------------------------
+@dataclass(frozen=True)
+class MotionState:
+    angle: float = 0.000
+    velocity: float = 0.000
+    acceleration: float = 0.000
+    timestamp: float = 0.000
+    sequence: int = 0
+
+
+#------------------------------------------------------------------------------
+# Alpha-Beta-Gamma State Estimator
+#------------------------------------------------------------------------------
+class StateEstimator:
+    """
+    An alpha-beta-gamma filter that estimates the angle, angular velocity (degrees/s) and angular acceleration (degrees/s^2)
+    of the turn table from the samples of the Shaft Encoder.
+    The filter is updated once for every new sample, using the time between the samples as its time step, so the estimates
+    do not depend on the rate at which they are read. Like the PositionSample, the estimate is published as an immutable
+    MotionState, so it can be read from any thread.
+    """
+    def __init__(self, alpha: float, beta: float, gamma: float):
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self._state = MotionState()
+
+
+    @property
+    def state(self) -> MotionState:
+        return self._state
+
+
+    def reset(self):
+        self._state = MotionState()
+
+
+    def update(self, sample: PositionSample) -> MotionState:
+        state = self._state
+
+        if state.sequence == 0:
+            self._state = MotionState(angle=sample.angle, timestamp=sample.timestamp, sequence=sample.sequence)
+            return self._state
+
+        timeStep = sample.timestamp - state.timestamp
+
+        if timeStep <= 0:
+            return state
+
+        predictedAngle = state.angle + state.velocity*timeStep + 0.5*state.acceleration*timeStep**2
+        predictedVelocity = state.velocity + state.acceleration*timeStep
+        residual = sample.angle - predictedAngle
+
+        self._state = MotionState(
+            angle=predictedAngle + self.alpha*residual,
+            velocity=predictedVelocity + self.beta*residual/timeStep,
+            acceleration=state.acceleration + 2*self.gamma*residual/timeStep**2,
+            timestamp=sample.timestamp,
+            sequence=sample.sequence,
+        )
+        return self._state
@@ -1,12 +1,16 @@
 import logging
-import time
+import queue
 import re
+import select
+import socket
 
 from threading import Thread
 from socketserver import BaseRequestHandler, ThreadingTCPServer
-from typing import NamedTuple, Callable
+from typing import NamedTuple, Callable, List
 
 from ConfigurationManager import ConfigurationManager
+from MotionExecutor import MoveResult, MoveStatus
+from ScanPlan import PointArrival, ScanResult, loadScanPlan, parseScanPoint, resolveScanPlanPath
 
 
 class TCPCallbacks(NamedTuple):
@@ -15,13 +19,22 @@ class TCPCallbacks(NamedTuple):
     setAzimuth: Callable
     setElevation: Callable
     stop: Callable
+    getVelocity: Callable
+    startScan: Callable
+    pauseScan: Callable
+    resumeScan: Callable
 
 
 class Commands(NamedTuple):
     getPosition=re.compile("GET_(AZIMUTH|ELEVATION)")
+    getVelocity=re.compile("GET_VELOCITY")
     setPosition=re.compile("SET_(AZIMUTH|ELEVATION) (\d{1,3}(\.\d{3})?)")
     stop=re.compile("STOP")
     halt=re.compile("HALT")
+    scan=re.compile("SCAN (.+)")
+    scanFile=re.compile("SCAN_FILE (.+)")
+    pauseScan=re.compile("PAUSE_SCAN")
+    resumeScan=re.compile("RESUME_SCAN")
     
 
 class Matches(NamedTuple):
@@ -29,6 +42,101 @@ class Matches(NamedTuple):
      STOP: re.Match
      GETPOSITION: re.Match
      SETPOSITION: re.Match
+     GETVELOCITY: re.Match
+     SCAN: re.Match
+     SCANFILE: re.Match
+     PAUSESCAN: re.Match
+     RESUMESCAN: re.Match
+
+
+def matchCommand(receivedCommand: str) -> Matches:
+    return Matches(
+        HALT=re.match(Commands.halt, receivedCommand),
+        STOP=re.match(Commands.stop, receivedCommand),
+        GETPOSITION=re.match(Commands.getPosition, receivedCommand),
+        SETPOSITION=re.match(Commands.setPosition, receivedCommand),
+        GETVELOCITY=re.match(Commands.getVelocity, receivedCommand),
+        SCAN=re.match(Commands.scan, receivedCommand),
+        SCANFILE=re.match(Commands.scanFile, receivedCommand),
+        PAUSESCAN=re.match(Commands.pauseScan, receivedCommand),
+        RESUMESCAN=re.match(Commands.resumeScan, receivedCommand),
+    )
+
+
+def formatPointArrival(arrival: PointArrival) -> str:
+    return f"POINT_REACHED {arrival.index} {arrival.angle:.3f} {arrival.timestamp:.3f}"
+
+
+def formatScanResult(result: ScanResult) -> str:
+    return f"SCAN_FINISHED {result.status} {result.pointsCompleted}/{result.pointCount} {result.duration:.3f}"
+
+
+def formatMoveResult(result: MoveResult) -> str:
+    """
+    The reply to a SET_ command, with the final angle, the time from the command to the end of the move, and the status of the move
+    """
+    reply = "AZIMUTH_FOUND" if (result.status == MoveStatus.ARRIVED) else "AZIMUTH_NOT_FOUND"
+    return f"{reply} {result.finalPosition:.3f} {result.duration:.3f} {result.status}"
+
+
+def encodeResponse(response: str, encoding: str) -> bytes:
+    return ('\n' + response + '\r').encode(encoding)
+
+
+class CommandFramer:
+    """
+    Splits the byte stream received from a client into commands, which are terminated by a carriage return or a line feed, so that
+    a client can send many commands without waiting for their replies, and a command can arrive in several segments.
+    Until a client has sent its first delimiter, a command that is not terminated is flushed once no more data arrives within the
+    timeout, so that clients which send every command on its own without a delimiter keep working.
+    """
+    DELIMITER = re.compile(b"[\r\n]")
+    UNTERMINATED_COMMAND_TIMEOUT = 0.050
+    # Large enough for a SCAN command with a few thousand points
+    MAXIMUM_COMMAND_LENGTH = 65536
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self._buffer = b''
+        self._terminatesCommands = False
+
+
+    @property
+    def flushTimeout(self) -> float:
+        """
+        The time to wait for more data before the partial command is flushed, or None to wait for the delimiter
+        """
+        if self._terminatesCommands or not self._buffer.strip():
+            return None
+        return self.UNTERMINATED_COMMAND_TIMEOUT
+
+
+    def feed(self, data: bytes) -> List[str]:
+        """
+        Returns the commands that were completed by the data
+        """
+        *frames, self._buffer = self.DELIMITER.split(self._buffer + data)
+        self._terminatesCommands |= bool(frames)
+
+        if len(self._buffer) > self.MAXIMUM_COMMAND_LENGTH:
+            logging.warning(f"Discarded a command from {self.name} that is longer than {self.MAXIMUM_COMMAND_LENGTH} bytes")
+            self._buffer = b''
+
+        return self._decode(frames)
+
+
+    def flush(self) -> List[str]:
+        """
+        Returns the command that has not been terminated yet, if any
+        """
+        frames = [self._buffer]
+        self._buffer = b''
+        return self._decode(frames)
+
+
+    def _decode(self, frames: List[bytes]) -> List[str]:
+        commands = (frame.decode('latin1').strip() for frame in frames)
+        return [command for command in commands if command]
 
 
 def commandHandlerFactory(callbacks: TCPCallbacks, settingsManager: ConfigurationManager) -> Callable:
@@ -69,74 +177,199 @@ class TCPServer(ThreadingTCPServer):
 
 
 class CommandHandler(BaseRequestHandler):
+    """
+    Handles the commands of a single client on the handler thread. Every reply and notification is queued to a sender thread of the
+    client, and the responses are written one at a time in the order in which they were queued. The handler thread waits for room in
+    the queue, so that a client that pipelines its commands is throttled, but the motion and scan executors never wait, and a client
+    that falls so far behind that a notification does not fit in the queue is disconnected.
+    """
+    # The size of a single read, a command can span several reads
+    RECEIVE_BUFFER_SIZE = 8192
+    SEND_QUEUE_SIZE = 256
+    SEND_QUEUE_POLL_INTERVAL = 0.100
+    # The time for which the replies that are still queued are sent after the client has closed its side of the connection
+    SEND_DRAIN_TIMEOUT = 1.000
+
     def __init__(self, callbacks: TCPCallbacks, settingsManager: ConfigurationManager, *args, **kwargs):
         self._callbacks = callbacks
         self._settingsManager = settingsManager
         BaseRequestHandler.__init__(self, *args, **kwargs)
 
 
+    def setup(self):
+        self._sendQueue = queue.Queue(self.SEND_QUEUE_SIZE)
+        self._closing = False
+        self._sender = Thread(target=self._sendResponses, name=f"TCP Sender {self.client_address}", daemon=True)
+        self._sender.start()
+
+
+    def finish(self):
+        # Notifications of moves that finish later are dropped, but the replies that are already queued are sent before the
+        # socket is closed, so that a client that half-closes the connection after its last command still receives them
+        self._closing = True
+        try:
+            self._sendQueue.put(None, timeout=self.SEND_DRAIN_TIMEOUT)
+        except queue.Full:
+            pass
+
+        self._sender.join(self.SEND_DRAIN_TIMEOUT)
+        if self._sender.is_alive():
+            logging.warning(f"Unable to send the remaining responses to {self.client_address}. Disconnecting the client")
+            self._disconnect()
+            self._sender.join(self.SEND_DRAIN_TIMEOUT)
+
+
     def handle(self):
+        framer = CommandFramer(name=str(self.client_address))
+
         while True:
-            receivedCommand = self.request.recv(50).decode('latin1').strip()
+            try:
+                # The socket is left blocking for the sender thread, so the flush timeout of the framer is waited for with select
+                readable, _, _ = select.select([self.request], [], [], framer.flushTimeout)
+                received = self.request.recv(self.RECEIVE_BUFFER_SIZE) if readable else None
+            except (OSError, ValueError) as connectionError:
+                logging.warning(f"The connection to {self.client_address} failed: {connectionError}")
+                break
+
+            receivedCommands = framer.flush() if not received else framer.feed(received)
+
+            if not all(self.handleCommand(receivedCommand) for receivedCommand in receivedCommands):
+                break
+
+            # The client has closed the connection, so the handler thread is released
+            if received == b'':
+                logging.debug(f"The connection was closed by {self.client_address}")
+                break
+
+
+    def handleCommand(self, receivedCommand: str) -> bool:
+        """
+        Handles a single command, and returns False if the connection has to be closed
+        """
+        logging.debug(f"Received Request: {receivedCommand}")
         
-            if receivedCommand is None:
-                continue
+        matches = matchCommand(receivedCommand)
         
-            logging.debug(f"Received Request: {receivedCommand}")
-            
-            matches = Matches(
-                HALT=re.match(Commands.halt, receivedCommand),
-                STOP=re.match(Commands.stop, receivedCommand),
-                GETPOSITION=re.match(Commands.getPosition, receivedCommand),
-                SETPOSITION=re.match(Commands.setPosition, receivedCommand),
-            )
-            
-            if matches.HALT:
-                self._callbacks.stop()
-                self.server.shutdown()
-                break
-            
-            if matches.STOP:
-                self._callbacks.stop()
-                continue
-            
-            if matches.GETPOSITION:
-                planeName = matches.GETPOSITION.groups(1)
-                angle = self._callbacks.getAzimuth() if (planeName == "AZIMUTH") else self._callbacks.getElevation()
-                self.sendResponse(f"CURRENT_{planeName} {angle:.3f}")
-                continue
-            
-            if matches.SETPOSITION:
-                planeName = matches.SETPOSITION.groups(1)
-            
-                try:
-                    logging.debug(f"{matches.SETPOSITION.group(2)}")
-                    value = float(matches.SETPOSITION.group(2))
-                    
-                except ValueError as valueError:
-                    logging.exception(f"Unable to parse value received from {self.client_address}", exc_info=valueError)
-                    value = self._callbacks.getAzimuth() if (planeName == "AZIMUTH") else self._callbacks.getElevation()
-                
-                def SetPosition(positionQueryCallback):
-                    while abs(positionQueryCallback() - value) > self._settingsManager.maximumAllowedError:
-                        time.sleep(self._settingsManager.pollDelay)
-                    
-                    response = f"AZIMUTH_FOUND {positionQueryCallback():.3f}"
-                    logging.debug("Triggered")
-                    self.sendResponse(response)
-                
-                if planeName == "AZIMUTH":
-                    self._callbacks.setAzimuth(value)
-                    jobThread = Thread(target=SetPosition, args=(self._callbacks.getAzimuth,))
+        if matches.HALT:
+            self._callbacks.stop()
+            self.server.shutdown()
+            return False
+        
+        if matches.STOP:
+            self._callbacks.stop()
+            return True
+        
+        if matches.GETPOSITION:
+            planeName = matches.GETPOSITION.group(1)
+            angle = self._callbacks.getAzimuth() if (planeName == "AZIMUTH") else self._callbacks.getElevation()
+            self.sendResponse(f"CURRENT_{planeName} {angle:.3f}")
+            return True
+        
+        if matches.GETVELOCITY:
+            self.sendResponse(f"CURRENT_VELOCITY {self._callbacks.getVelocity():.3f}")
+            return True
+
+        if matches.SCAN or matches.SCANFILE:
+            try:
+                if matches.SCANFILE:
+                    points = loadScanPlan(resolveScanPlanPath(self._settingsManager.scanPlanDirectory, matches.SCANFILE.group(1).strip()))
                 else:
-                    self._callbacks.setElevation(value)
-                    jobThread = Thread(target=SetPosition, args=(self._callbacks.getElevation,))
-                    
-                jobThread.start()
-                continue
+                    points = [parseScanPoint(point) for point in matches.SCAN.group(1).split()]
+                scanPlan = self._callbacks.startScan(points, self.sendPointArrival, self.sendScanResult)
+            except (OSError, ValueError) as exception:
+                logging.exception(f"Unable to read the scan plan received from {self.client_address}", exc_info=exception)
+                self.sendResponse("SCAN_ERROR")
+                return True
+
+            if scanPlan is not None:
+                self.sendResponse(f"SCAN_STARTED {len(points)} {scanPlan.optimizedTime:.3f} {scanPlan.originalTime:.3f}")
+            else:
+                self.sendResponse("SCAN_BUSY")
+            return True
+
+        if matches.PAUSESCAN:
+            self._callbacks.pauseScan()
+            self.sendResponse("SCAN_PAUSED")
+            return True
+
+        if matches.RESUMESCAN:
+            self._callbacks.resumeScan()
+            self.sendResponse("SCAN_RESUMED")
+            return True
+
+        if matches.SETPOSITION:
+            planeName = matches.SETPOSITION.group(1)
+        
+            try:
+                logging.debug(f"{matches.SETPOSITION.group(2)}")
+                value = float(matches.SETPOSITION.group(2))
+                
+            except ValueError as valueError:
+                logging.exception(f"Unable to parse value received from {self.client_address}", exc_info=valueError)
+                value = self._callbacks.getAzimuth() if (planeName == "AZIMUTH") else self._callbacks.getElevation()
+            
+            # The reply is sent from the done callback of the move, as soon as the move has arrived or was stopped
+            moveHandle = self._callbacks.setAzimuth(value) if (planeName == "AZIMUTH") else self._callbacks.setElevation(value)
+            moveHandle.addDoneCallback(self.sendMoveResult)
+            return True
+
+        self.sendResponse("UNKNOWN_COMMAND")
+        return True
+
+    def sendPointArrival(self, arrival: PointArrival):
+        self.sendNotification(formatPointArrival(arrival))
+
+
+    def sendScanResult(self, result: ScanResult):
+        self.sendNotification(formatScanResult(result))
+
+
+    def sendMoveResult(self, result: MoveResult):
+        self.sendNotification(formatMoveResult(result))
+
+
+    def sendNotification(self, response):
+        # Notifications are queued from the threads of the motion and scan executors, which must never wait for the client
+        if self._closing:
+            return
+
+        try:
+            self._sendQueue.put_nowait(encodeResponse(response, self._settingsManager.Encoding))
+        except queue.Full:
+            logging.warning(f"The send queue of {self.client_address} is full. Disconnecting the client")
+            self._disconnect()
 
-            self.sendResponse("UNKNOWN_COMMAND")
 
     def sendResponse(self, response):
-        response = '\n' + response + '\r'
-        self.request.sendall(response.encode(self._settingsManager.Encoding))
\ No newline at end of file
+        data = encodeResponse(response, self._settingsManager.Encoding)
+
+        while not self._closing:
+            try:
+                self._sendQueue.put(data, timeout=self.SEND_QUEUE_POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+
+    def _sendResponses(self):
+        while True:
+            response = self._sendQueue.get()
+            if response is None:
+                return
+
+            try:
+                self.request.sendall(response)
+            except OSError as connectionError:
+                if not self._closing:
+                    logging.warning(f"Unable to send {response} to {self.client_address}: {connectionError}")
+                self._disconnect()
+                return
+
+
+    def _disconnect(self):
+        # Shutting the socket down wakes up the handler thread, which then releases the client
+        self._closing = True
+        try:
+            self.request.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
\ No newline at end of file
@@ -1,18 +1,27 @@
 import logging
-import math
 import re
-import time
-from threading import Event, Thread
-from dataclasses import dataclass
+from threading import Lock, Thread
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, Optional, Sequence
 
+from AsyncConnection import AsyncLANConnection, DeviceEventLoop
+from AsyncTCPServer import AsyncTCPServer
+from AutoTuner import AutoTuneCallbacks, AutoTuner, AutoTuneReport
 from ConfigurationManager import ConfigurationManager
 from ZeroPointManager import ZeroPointManager
-from JobThread import TimedJobThread
+from JobScheduler import JobScheduler, ScheduledJob
+from ConnectionInterface import ConnectionInterface
+from ControlLoop import ControlLoop, ControlLoopStatistics, SampleTriggeredControlLoop
+from Instrumentation import DeviceStatistics
 from LANConnection import LANConnection
 from MainView import MainView
+from MotionExecutor import ControlParameters, MotionCallbacks, MotionExecutor, MoveHandle, MoveResult
 from SettingsView import SettingsView
-from MotorControllerModel import MotorControllerModel
+from MotorControllerModel import MotorControllerModel, MotorState
+from SamplingPolicy import AdaptiveSamplingPolicy
+from ScanPlan import OptimizedScanPlan, PointArrival, ScanPlanExecutor, ScanPlanOptimizer, ScanPoint, ScanResult, checkScanPoints
 from ShaftEncoderModel import ShaftEncoderModel
+from StateEstimator import MotionState, StateEstimator
 from TCPServer import TCPServer, TCPCallbacks
 from ZeroPointViews import LoadZeroPointView, SaveZeroPoint
 
@@ -22,15 +31,15 @@ def isValidIPAddress(ipAddress: str) -> bool:
     return bool(re.search(ipAddressRegex, ipAddress))
 
 
-def stopTimedJobThread(jobThread: TimedJobThread):
+def stopTimedJobThread(jobThread: ScheduledJob):
     if jobThread is not None:
         jobThread.stop()
 
 
 @dataclass
 class ControllerThreads:
-    gotoPosition: TimedJobThread = None
-    updateGUI: TimedJobThread = None
+    updateGUI: ScheduledJob = None
+    logStatistics: ScheduledJob = None
 
 
 @dataclass
@@ -59,11 +68,21 @@ class TurnTableController:
     def __init__(self, settingsManager: ConfigurationManager, zeroPointManager: ZeroPointManager):
         self._settingsManager = settingsManager
         self._zeroPointManager = zeroPointManager
-        self._stopTurnTableEvent = Event()
         self._jobThreads = ControllerThreads()
         self._position = Position()
+        self._scheduler = JobScheduler()
+        self._deviceEventLoop = DeviceEventLoop()
+
+        def connectionFactory(port: int, name: str) -> ConnectionInterface:
+            if self._settingsManager.connectionBackend == 'asyncio':
+                return AsyncLANConnection(
+                    self._settingsManager.turnTableIPAddress,
+                    port,
+                    self._deviceEventLoop,
+                    name=name,
+                    timeout=self._settingsManager.timeout
+                )
 
-        def connectionFactory(port: int, name: str) -> LANConnection:
             return LANConnection(
                 self._settingsManager.turnTableIPAddress,
                 port,
@@ -77,18 +96,65 @@ class TurnTableController:
             setAzimuth=self.createGotoPositionJob, 
             setElevation=self.createGotoPositionJob, 
             stop=self.stop,
+            getVelocity=self.getCurrentVelocity,
+            startScan=self.startScan,
+            pauseScan=self.pauseScan,
+            resumeScan=self.resumeScan,
         )
-        self._tcpServer = TCPServer(callbacks=callbacks, settingsManager=self._settingsManager)
+        if self._settingsManager.tcpServerBackend == 'asyncio':
+            self._tcpServer = AsyncTCPServer(callbacks=callbacks, settingsManager=self._settingsManager)
+        else:
+            self._tcpServer = TCPServer(callbacks=callbacks, settingsManager=self._settingsManager)
 
         self._shaftEncoder = ShaftEncoderModel(
             connectionFactory(self._settingsManager.shaftEncoderPort, "Shaft Encoder Connection"), 
-            settingsManager=settingsManager)
+            settingsManager=settingsManager,
+            scheduler=self._scheduler)
         self._motorController = MotorControllerModel(
             watchdogConnection=connectionFactory(self._settingsManager.watchdogPort, "Watchdog Connection"), 
             motorControllerConnection=connectionFactory(self._settingsManager.motorControllerPort, "Motor Controller Connection"),
             settingsManager=settingsManager,
+            scheduler=self._scheduler,
         )
 
+        self._stateEstimator = StateEstimator(
+            alpha=self._settingsManager.estimatorAlpha,
+            beta=self._settingsManager.estimatorBeta,
+            gamma=self._settingsManager.estimatorGamma,
+        )
+        self._shaftEncoder.addSampleListener(self._stateEstimator.update)
+
+        if self._settingsManager.adaptivePositionSampling:
+            self._shaftEncoder.setSamplingPolicy(AdaptiveSamplingPolicy(
+                minimumSamplePeriod=self._settingsManager.minimumPositionSamplePeriod,
+                idleSamplePeriod=self._settingsManager.idlePositionSamplePeriod,
+                isMotionActive=self.isMotionActive,
+            ))
+
+        self._motionExecutor = MotionExecutor(
+            MotionCallbacks(
+                getPosition=self.getCurrentPosition,
+                getVelocity=self.getCurrentVelocity,
+                setVoltage=self._motorController.setVoltage,
+                enableMotor=self._enableMotor,
+                disableMotor=self._disableMotor,
+            ),
+            createParameters=lambda: ControlParameters.fromSettings(self._settingsManager),
+            createControlLoop=self.createControlLoop,
+        )
+        self._scanPlanExecutor = ScanPlanExecutor(self.createGotoPositionJob)
+        self._autoTuneCallbacks = AutoTuneCallbacks(
+            getPosition=self.getCurrentPosition,
+            getVelocity=self.getCurrentVelocity,
+            setVoltage=self._motorController.setVoltage,
+            enableMotor=self._enableMotor,
+            disableMotor=self._disableMotor,
+            moveTo=self.createGotoPositionJob,
+            cancelMove=lambda: self._motionExecutor.cancel(timeout=self._settingsManager.timeout),
+        )
+        self._autoTuner = None
+        self._autoTuneLock = Lock()
+
         self._mainView = MainView()
         self._settingsManagerView = SettingsView(self._settingsManager)
         self.showMainView()
@@ -101,6 +167,7 @@ class TurnTableController:
         self._mainView.motorVoltageSlider.setRange(self._settingsManager.minimumVoltage, self._settingsManager.maximumVoltage)
 
         self._mainView.applicationSettingsAction.triggered.connect(self._settingsManagerView.show)
+        self._mainView.autoTuneAction.triggered.connect(self.startAutoTune)
         self._mainView.loadZeroPositionDataAction.triggered.connect(self.loadZeroPosition)
         self._mainView.saveZeroPositionDataAction.triggered.connect(self.saveZeroPosition)
         self._mainView.connectButton.clicked.connect(self.connect)
@@ -123,24 +190,45 @@ class TurnTableController:
 # Starting and Stopping Methods
 #------------------------------------------------------------------------------
     def start(self):
-        self._jobThreads.updateGUI = TimedJobThread(
+        self._scheduler.start()
+        self._jobThreads.updateGUI = self._scheduler.createJob(
             self._settingsManager.GUIUpdatePeriod, 
-            self.updateGUI
+            self.updateGUI,
+            name="GUI Update"
         )
         self._jobThreads.updateGUI.start()
 
+        if self._settingsManager.statisticsLogPeriod > 0:
+            self._jobThreads.logStatistics = self._scheduler.createJob(
+                self._settingsManager.statisticsLogPeriod,
+                self.logDeviceStatistics,
+                name="Statistics Log"
+            )
+            self._jobThreads.logStatistics.start()
+
 
     def stop(self):
         logging.debug("Stopping Turn Table Controller")
         self.stopMotion()
         self.disconnect()
+        stopTimedJobThread(self._jobThreads.updateGUI)
+        stopTimedJobThread(self._jobThreads.logStatistics)
+        self._motionExecutor.shutdown(timeout=self._settingsManager.timeout)
+        self._scanPlanExecutor.join(timeout=self._settingsManager.timeout)
+        self._scheduler.stop()
+        self._deviceEventLoop.stop()
         logging.debug("Turn Table Controller Stopped...")
 
 
     def stopMotion(self):
-        if self._jobThreads.gotoPosition is not None:
-            self._stopTurnTableEvent.set()
-            self._jobThreads.gotoPosition = None
+        self._scanPlanExecutor.cancel()
+
+        autoTuner = self._autoTuner
+        if autoTuner is not None:
+            autoTuner.cancel()
+
+        if not self._motionExecutor.cancel(timeout=self._settingsManager.timeout):
+            logging.warning("The move was not cancelled within the timeout")
 
         if self._motorController.getCurrentVoltage() != 0.000:
             self.resetMotorVoltage()
@@ -183,6 +271,45 @@ class TurnTableController:
         return self._position.current
 
 
+    def isMotionActive(self) -> bool:
+        return (self._motorController.getState() == MotorState.RUNNING) or self._motionExecutor.isMoving() or (self._autoTuner is not None)
+
+
+    def getMotionState(self) -> MotionState:
+        return self._stateEstimator.state
+
+
+    def getCurrentVelocity(self) -> float:
+        return self._stateEstimator.state.velocity
+
+
+#------------------------------------------------------------------------------
+# Instrumentation Methods
+#------------------------------------------------------------------------------
+    def getDeviceStatistics(self) -> Dict[str, DeviceStatistics]:
+        return {
+            statistics.name: statistics for statistics in (
+                self._shaftEncoder.statistics,
+                self._motorController.statistics,
+                self._motorController.watchdogStatistics,
+            )
+        }
+
+
+    def logDeviceStatistics(self):
+        for statistics in self.getDeviceStatistics().values():
+            logging.info(statistics.summary())
+
+        logging.info(self._motorController.commandQueueStatistics.summary())
+
+
+    def resetDeviceStatistics(self):
+        for statistics in self.getDeviceStatistics().values():
+            statistics.reset()
+
+        self._motorController.commandQueueStatistics.reset()
+
+
 #------------------------------------------------------------------------------
 # GUI Update Helper Methods
 #------------------------------------------------------------------------------
@@ -198,6 +325,7 @@ class TurnTableController:
             watchdogConnectionStatus, 
             tcpServerConnectionStatus)
         self._mainView.updatePositionLineEdits(self._position)
+        self._mainView.updateVelocityLineEdit(self.getCurrentVelocity())
 
 
 #------------------------------------------------------------------------------
@@ -206,7 +334,8 @@ class TurnTableController:
     def setMotorVoltage(self, newVoltage: float):
         if (not self._motorController.isEnabled()) and (newVoltage != 0.000):
             self._motorController.toggleEnable()
-        self._motorController.setVoltage(newVoltage=newVoltage)
+        self._shaftEncoder.notifyMotion()
+        self._motorController.requestVoltage(newVoltage)
 
 
     def resetMotorVoltage(self):
@@ -215,52 +344,121 @@ class TurnTableController:
         self._motorController.setVoltage(0.000)
 
 
-    def createGotoPositionJob(self, targetPosition: float):
-        self._jobThreads.gotoPosition = Thread(target=self.gotoPosition, args=(targetPosition,))
-        self._jobThreads.gotoPosition.start()
+    def createGotoPositionJob(self, targetPosition: float, parameters: ControlParameters = None) -> MoveHandle:
+        self._position.target = targetPosition
+        self._shaftEncoder.notifyMotion()
+        return self._motionExecutor.moveTo(targetPosition, parameters)
 
 
-    def stepPosition(self, step: float):
+    def stepPosition(self, step: float) -> MoveHandle:
         currentPosition = self.getCurrentPosition()
-        self.createGotoPositionJob(currentPosition + step)
+        return self.createGotoPositionJob(currentPosition + step)
 
 
-    def gotoPosition(self, targetPosition: float):
-        maxVoltage = self._settingsManager.maximumVoltage
-        updatePeriod = self._settingsManager.voltageUpdatePeriod
-        KP = self._settingsManager.controlProportionalGain
-        KI = self._settingsManager.controlIntegralGain
-        KD = self._settingsManager.controlDerivativeGain
-        minimumControlSignalValue = self._settingsManager.minimumControlSignalValue
-        maximumAllowedError = self._settingsManager.maximumAllowedError
+    def gotoPosition(self, targetPosition: float) -> MoveResult:
+        return self.createGotoPositionJob(targetPosition).result()
 
-        self._position.target = targetPosition
 
-        if not self._motorController.isEnabled():
-            self._motorController.toggleEnable()
+    def startScan(self, points: Sequence[ScanPoint], onArrival: Callable[[PointArrival], None] = None, onFinished: Callable[[ScanResult], None] = None) -> Optional[OptimizedScanPlan]:
+        """
+        Plans and starts the scan, and returns the plan, or None if another scan is still running. The arrival notifications carry
+        the index of the point in the submitted plan, even if the points were reordered. A ValueError is raised if any of the points is
+        outside of the goto position range
+        """
+        checkScanPoints(points, self._settingsManager.minimumGotoPosition, self._settingsManager.maximumGotoPosition)
+        optimizer = ScanPlanOptimizer.fromSettings(self._settingsManager)
+        scanPlan = optimizer.optimize(points, self.getCurrentPosition(), reorder=self._settingsManager.scanPlanOptimization)
+        logging.info(f"Planned a scan of {len(points)} points with an estimated time of {scanPlan.optimizedTime:.3f}s, {scanPlan.originalTime:.3f}s in the submitted order")
+
+        def onPlannedArrival(arrival: PointArrival):
+            onArrival(replace(arrival, index=scanPlan.order[arrival.index]))
+
+        if not self._scanPlanExecutor.start(scanPlan.points, None if (onArrival is None) else onPlannedArrival, onFinished):
+            return None
+        return scanPlan
+
+
+    def pauseScan(self):
+        self._scanPlanExecutor.pause()
+
+
+    def resumeScan(self):
+        self._scanPlanExecutor.resume()
+
+
+    def autoTune(self, applyGains: bool = False) -> Optional[AutoTuneReport]:
+        """
+        Identifies the turn table, proposes new gains and benchmarks them against the current gains. If the gains should be applied,
+        and the proposed gains settle faster, they are written to the config file. The auto tuner is created from the current settings
+        on every run, and only one can run at a time
+        """
+        with self._autoTuneLock:
+            if self._autoTuner is not None:
+                logging.warning("The auto tune is already running")
+                return None
+
+            self.stopMotion()
+            autoTuner = AutoTuner.fromSettings(self._settingsManager, self._autoTuneCallbacks, self.createControlLoop)
+            self._autoTuner = autoTuner
+
+        self._shaftEncoder.notifyMotion()
+
+        try:
+            report = autoTuner.run(ControlParameters.fromSettings(self._settingsManager))
+        except RuntimeError as runtimeError:
+            logging.exception("The auto tune failed", exc_info=runtimeError)
+            return None
+        finally:
+            with self._autoTuneLock:
+                self._autoTuner = None
+
+        logging.info(f"Auto tune report:\n{report.summary()}")
 
-        previousError = 0
+        if applyGains and report.isImprovement:
+            report.proposedParameters.applyToSettings(self._settingsManager)
+            self._settingsManager.writeConfigFile()
+            logging.info("The proposed gains were written to the config file")
+        elif applyGains:
+            logging.warning("The proposed gains do not settle faster than the current gains and were not applied")
 
-        if self._stopTurnTableEvent.is_set():
-            self._stopTurnTableEvent.clear()
+        return report
 
-        while True:
-            error = self._position.error
 
-            if (abs(error) < maximumAllowedError) or (self._stopTurnTableEvent.is_set()):
-                self._motorController.setVoltage(0.000)
-                self._motorController.toggleEnable()
-                break
+    def startAutoTune(self):
+        Thread(target=self.autoTune, args=(self._settingsManager.autoTuneApplyGains,), name="Auto Tune", daemon=True).start()
 
-            errorDelta = error - previousError
-            previousError = error
 
-            voltageControlSignal = (KP*error + KI*error*updatePeriod + KD*errorDelta/updatePeriod)
-            voltageControlSignal = sorted((-maxVoltage, voltageControlSignal, maxVoltage))[1]
-            voltageControlSignal = math.copysign(max(abs(voltageControlSignal), minimumControlSignalValue), voltageControlSignal)
+    def getLastMoveStatistics(self) -> ControlLoopStatistics:
+        return self._motionExecutor.lastMoveStatistics
 
-            self._motorController.setVoltage(voltageControlSignal)
-            time.sleep(updatePeriod)
+
+    def getPredictedArrivalTime(self) -> float:
+        """
+        The monotonic time at which the current move is predicted to arrive at its target, or None if it is not following a profile
+        """
+        return self._motionExecutor.predictedArrivalTime
+
+
+    def createControlLoop(self) -> ControlLoop:
+        if self._settingsManager.controlTrigger == 'sample':
+            return SampleTriggeredControlLoop(
+                self._settingsManager.minimumPositionSamplePeriod, 
+                waitForSample=self._shaftEncoder.waitForSample, 
+                sampleTimeout=self._settingsManager.timeout,
+                wakeWaiters=self._shaftEncoder.wakeSampleWaiters
+            )
+
+        return ControlLoop(self._settingsManager.voltageUpdatePeriod)
+
+
+    def _enableMotor(self):
+        if not self._motorController.isEnabled():
+            self._motorController.toggleEnable()
+
+
+    def _disableMotor(self):
+        if self._motorController.isEnabled():
+            self._motorController.toggleEnable()
 
 
     def saveZeroPosition(self):
@@ -0,0 +1,238 @@
+import argparse
+import asyncio
+import logging
+import re
+import time
+from typing import Callable
+
+from ConfigurationManager import ConfigurationManager
+from EncoderFrameDecoder import WORD_LRC
+from PlantModel import PlantModel, PlantParameters
+
+
+#------------------------------------------------------------------------------
+# Simulated Turn Table
+#------------------------------------------------------------------------------
+class SimulatedTurnTable:
+    """
+    The state that is shared by the three simulated devices: the plant model, the voltage applied by the motor controller and the
+    state of the watchdog. The plant is advanced to the current time whenever one of the devices is accessed.
+    The motor only turns while the enable bit of the watchdog command is set. The outputs of the watchdog, and therefore the motor,
+    are switched off if the trigger bit is not toggled within the watchdog timeout, or once the connection to the watchdog is lost.
+    """
+    TRIGGER_MASK = 2
+    ENABLE_MASK = 1
+
+    def __init__(self, plant: PlantModel, watchdogTimeout: float = 2.000, clock: Callable[[], float] = time.monotonic):
+        self.plant = plant
+        self.watchdogTimeout = watchdogTimeout
+        self._clock = clock
+
+        self.voltage = 0.000
+        self.watchdogCommand = None
+        self._lastTriggerTime = None
+        self._lastUpdateTime = self._clock()
+
+
+    def isWatchdogAlive(self, now: float = None) -> bool:
+        now = self._clock() if (now is None) else now
+        return (self._lastTriggerTime is not None) and ((now - self._lastTriggerTime) <= self.watchdogTimeout)
+
+
+    def isMotorEnabled(self, now: float = None) -> bool:
+        return self.isWatchdogAlive(now) and ((self.watchdogCommand & self.ENABLE_MASK) == self.ENABLE_MASK)
+
+
+    def update(self):
+        now = self._clock()
+
+        if self._lastTriggerTime is not None:
+            expiryTime = self._lastTriggerTime + self.watchdogTimeout
+            if self._lastUpdateTime < expiryTime < now:
+                self.plant.advance(expiryTime - self._lastUpdateTime, self.voltage if self.isMotorEnabled(expiryTime) else 0.000)
+                self._lastUpdateTime = expiryTime
+
+        self.plant.advance(now - self._lastUpdateTime, self.voltage if self.isMotorEnabled(now) else 0.000)
+        self._lastUpdateTime = now
+
+
+    def setVoltage(self, voltage: float):
+        self.update()
+        self.voltage = voltage
+
+
+    def triggerWatchdog(self, command: int):
+        self.update()
+
+        if (self.watchdogCommand is None) or ((command & self.TRIGGER_MASK) != (self.watchdogCommand & self.TRIGGER_MASK)):
+            self._lastTriggerTime = self._clock()
+
+        self.watchdogCommand = command
+
+
+    def disableWatchdog(self):
+        self.update()
+        self.watchdogCommand = None
+        self._lastTriggerTime = None
+
+
+    def encoderCounts(self):
+        self.update()
+        return self.plant.encoderCounts()
+
+
+#------------------------------------------------------------------------------
+# Turn Table Simulator
+#------------------------------------------------------------------------------
+class TurnTableSimulator:
+    """
+    Serves the Shaft Encoder, Motor Controller and Watchdog protocols on three TCP ports, so that the TurnTableController can be run
+    without the physical turn table. Every response is delayed by the configured link latency.
+    """
+    ENCODER_REQUEST = bytes.fromhex("0180028004")
+    ENCODER_ADDRESS = 0x02
+    MOTOR_CONTROLLER_ADDRESS = "01"
+    SET_VOLTAGE_COMMAND = re.compile(r"#010([+-]\d+\.\d+)")
+    GET_VOLTAGE_COMMAND = "$0180"
+    WATCHDOG_COMMAND_LENGTH = 8
+
+    def __init__(self, turnTable: SimulatedTurnTable, host: str, shaftEncoderPort: int, motorControllerPort: int, watchdogPort: int, latency: float = 0.000):
+        self.turnTable = turnTable
+        self.host = host
+        self.shaftEncoderPort = shaftEncoderPort
+        self.motorControllerPort = motorControllerPort
+        self.watchdogPort = watchdogPort
+        self.latency = latency
+        self._servers = []
+
+
+    async def start(self):
+        self._servers = [
+            await asyncio.start_server(self._handleShaftEncoder, self.host, self.shaftEncoderPort),
+            await asyncio.start_server(self._handleMotorController, self.host, self.motorControllerPort),
+            await asyncio.start_server(self._handleWatchdog, self.host, self.watchdogPort),
+        ]
+        logging.info(f"Simulating the turn table on {self.host} (Shaft Encoder: {self.shaftEncoderPort}, Motor Controller: {self.motorControllerPort}, Watchdog: {self.watchdogPort})")
+
+
+    async def stop(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+
+
+    async def serveForever(self):
+        await self.start()
+        await asyncio.gather(*(server.serve_forever() for server in self._servers))
+
+
+#------------------------------------------------------------------------------
+# Protocol Helper Methods
+#------------------------------------------------------------------------------
+    @classmethod
+    def createEncoderFrame(cls, revolution: int, step: int) -> bytes:
+        lrc = cls.ENCODER_ADDRESS ^ WORD_LRC[revolution] ^ WORD_LRC[step]
+        return bytes((0x01, cls.ENCODER_ADDRESS, revolution >> 8, revolution & 0xFF, step >> 8, step & 0xFF, lrc, 0x04))
+
+
+    async def _respond(self, writer: asyncio.StreamWriter, response: bytes):
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        writer.write(response)
+        await writer.drain()
+
+
+#------------------------------------------------------------------------------
+# Device Handlers
+#------------------------------------------------------------------------------
+    async def _handleShaftEncoder(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = await reader.readexactly(len(self.ENCODER_REQUEST))
+
+                if request != self.ENCODER_REQUEST:
+                    logging.warning(f"Unknown Shaft Encoder request: {request.hex()}")
+                    continue
+
+                revolution, step = self.turnTable.encoderCounts()
+                await self._respond(writer, self.createEncoderFrame(revolution, step))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+    async def _handleMotorController(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        encoding = "utf-8"
+        try:
+            while True:
+                command = (await reader.readuntil(b"\r")).decode(encoding).strip()
+                setVoltage = self.SET_VOLTAGE_COMMAND.fullmatch(command)
+
+                if setVoltage:
+                    self.turnTable.setVoltage(float(setVoltage.group(1)))
+                    await self._respond(writer, ">\r".encode(encoding))
+                elif command == self.GET_VOLTAGE_COMMAND:
+                    await self._respond(writer, f"!{self.MOTOR_CONTROLLER_ADDRESS}{self.turnTable.voltage:+07.3f}\r".encode(encoding))
+                else:
+                    logging.warning(f"Unknown Motor Controller command: {command}")
+                    await self._respond(writer, f"?{self.MOTOR_CONTROLLER_ADDRESS}\r".encode(encoding))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+    async def _handleWatchdog(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                command = await reader.readexactly(self.WATCHDOG_COMMAND_LENGTH)
+                self.turnTable.triggerWatchdog(int(command, 16))
+                await self._respond(writer, b"OK\r\n")
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            # Losing the connection to the watchdog switches off its outputs
+            self.turnTable.disableWatchdog()
+            writer.close()
+
+
+#------------------------------------------------------------------------------
+# Main Function
+#------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Simulates the Shaft Encoder, Motor Controller and Watchdog of the turn table")
+    parser.add_argument("--config", default="./config.ini", help="The configuration file from which the device ports are read")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--latency", type=float, default=0.005, help="The delay in seconds before every response is sent")
+    parser.add_argument("--initial-angle", type=float, default=0.000, help="The angle of the turn table when the simulator is started")
+    parser.add_argument("--motor-gain", type=float, default=PlantParameters.motorGain)
+    parser.add_argument("--time-constant", type=float, default=PlantParameters.timeConstant)
+    parser.add_argument("--deadband", type=float, default=PlantParameters.deadband)
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    settingsManager = ConfigurationManager(arguments.config)
+    plant = PlantModel(
+        PlantParameters(motorGain=arguments.motor_gain, timeConstant=arguments.time_constant, deadband=arguments.deadband),
+        initialAngle=arguments.initial_angle
+    )
+    simulator = TurnTableSimulator(
+        SimulatedTurnTable(plant),
+        arguments.host,
+        shaftEncoderPort=settingsManager.shaftEncoderPort,
+        motorControllerPort=settingsManager.motorControllerPort,
+        watchdogPort=settingsManager.watchdogPort,
+        latency=arguments.latency,
+    )
+
+    try:
+        asyncio.run(simulator.serveForever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
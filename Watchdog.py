@@ -3,8 +3,10 @@ import logging
 from enum import Enum
 from threading import Lock
 
+from AsyncConnection import sendCommandAndGetResponse
 from ConnectionInterface import ConnectionInterface
-from JobThread import TimedJobThread
+from Instrumentation import DeviceStatistics
+from JobScheduler import JobScheduler
 from ConfigurationManager import ConfigurationManager
 
 #------------------------------------------------------------------------------
@@ -25,13 +27,16 @@ class Watchdog:
     STOP_COMMAND = int.from_bytes(b"\x18\x00\x00\x00", byteorder=DEFAULT_BYTE_ORDER)
     DEFAULT_TRIGGER_COMMAND = int.from_bytes(b"\x18\x00\x00\x02", byteorder=DEFAULT_BYTE_ORDER)
     
-    def __init__(self, connection: ConnectionInterface, settingsManager: ConfigurationManager):
+    def __init__(self, connection: ConnectionInterface, settingsManager: ConfigurationManager, scheduler: JobScheduler):
         self._settingsManager = settingsManager
+        self._scheduler = scheduler
         self._triggerCommand = self.DEFAULT_TRIGGER_COMMAND
 
         self._connection = connection
+        self.statistics = DeviceStatistics("Watchdog")
         self._job = None
         self._lock = Lock()
+        self._stopLock = Lock()
 
 #------------------------------------------------------------------------------
 # Static Methods
@@ -60,8 +65,8 @@ class Watchdog:
                 return
             
         if self._job is None:
-            logging.info(f"Creating a Timed Thread Job to trigger the Watchdog Timer every {self._triggerPeriod} seconds")
-            self._job = TimedJobThread(self._settingsManager.watchdogTriggerPeriod, self._trigger)
+            logging.info(f"Creating a Scheduled Job to trigger the Watchdog Timer every {self.triggerPeriod} seconds")
+            self._job = self._scheduler.createJob(self._settingsManager.watchdogTriggerPeriod, self._trigger, name="Watchdog Trigger", blocking=True)
 
         if self._connection.isConnected() and (self._job is not None):
             logging.info("Starting the Watchdog Timer Timed Trigger")
@@ -70,20 +75,28 @@ class Watchdog:
 
 
     def stop(self):
-        if self._connection.isConnected():
-            if self._job is not None:
-                logging.info("Stopping the Watchdog Timer Timed Trigger Job")
-                self._job.stop()
-                self._job = None
-            
-            self._triggerCommand = self.STOP_COMMAND
+        # A STOP_COMMAND that is not acknowledged calls stop again, which is ignored
+        if not self._stopLock.acquire(blocking=False):
+            return
 
-            logging.info("Sending the STOP_COMMAND to turn off all the Watchdog Timer Outputs")
-            if not self._sendCommandAndGetResponse(self._triggerCommand):
-                logging.error("Unable to send the command to disable the Watchdog. The Watchdog is going to be disabled in an unsafe state")
+        try:
+            if self._connection.isConnected():
+                if self._job is not None:
+                    logging.info("Stopping the Watchdog Timer Timed Trigger Job")
+                    if not self._job.stop(wait=True, timeout=self._settingsManager.timeout):
+                        logging.warning("The Watchdog Timer Timed Trigger Job did not finish within the timeout")
+                    self._job = None
+                
+                self._triggerCommand = self.STOP_COMMAND
 
-            logging.info("Disconnecting from the Watchdog Timer")
-            self._connection.disconnect()
+                logging.info("Sending the STOP_COMMAND to turn off all the Watchdog Timer Outputs")
+                if not self._sendCommandAndGetResponse(self._triggerCommand):
+                    logging.error("Unable to send the command to disable the Watchdog. The Watchdog is going to be disabled in an unsafe state")
+
+                logging.info("Disconnecting from the Watchdog Timer")
+                self._connection.disconnect()
+        finally:
+            self._stopLock.release()
 
 
 #------------------------------------------------------------------------------
@@ -96,7 +109,10 @@ class Watchdog:
 
     @triggerPeriod.setter
     def triggerPeriod(self, newTriggerPeriod: float):
-        self._triggerPeriod = max(self._settingsManager.minimumWatchdogTriggerPeriod, newTriggerPeriod)
+        self._settingsManager.watchdogTriggerPeriod = max(self._settingsManager.minimumWatchdogTriggerPeriod, newTriggerPeriod)
+
+        if self._job is not None:
+            self._job.interval = self._settingsManager.watchdogTriggerPeriod
 
 
     def isConnected(self) -> bool:
@@ -112,8 +128,7 @@ class Watchdog:
             return False
 
         try:
-            self._connection.sendCommand(self._translateCommand(command))
-            response = self._connection.getResponse()
+            response = sendCommandAndGetResponse(self._connection, self._translateCommand(command), self.statistics)
         except TimeoutError as timeoutError:
             logging.exception("The communication attempt with the Watchdog timed out. Aborting attempt and disconnecting", exc_info=timeoutError)
             self.stop()
@@ -121,6 +136,7 @@ class Watchdog:
 
         if (response is None) or (response.decode(self.DEFAULT_ENCODING) != "OK\r\n"):
             logging.error(f"A bad response was received from the Watchdog Controller on {self._connection.connectionDetails()}. Stopping and disabling the Watchdog")
+            self.statistics.recordBadFrame()
             self.stop()
             return False
         return True
@@ -0,0 +1,51 @@
+import unittest
+
+from TCPServer import CommandFramer
+
+
+class CommandFramerTests(unittest.TestCase):
+    def test_commands_are_split_on_carriage_returns_and_line_feeds(self):
+        framer = CommandFramer()
+
+        self.assertEqual(framer.feed(b"GET_AZIMUTH\rGET_ELEVATION\nSET_AZIMUTH 10.000\r\n"), ["GET_AZIMUTH", "GET_ELEVATION", "SET_AZIMUTH 10.000"])
+        self.assertEqual(framer.flush(), [])
+
+
+    def test_a_command_can_arrive_in_several_segments(self):
+        framer = CommandFramer()
+
+        self.assertEqual(framer.feed(b"SET_"), [])
+        self.assertEqual(framer.feed(b"AZIMUTH 1"), [])
+        self.assertEqual(framer.feed(b"2.500\rGET"), ["SET_AZIMUTH 12.500"])
+        self.assertEqual(framer.feed(b"_AZIMUTH\r"), ["GET_AZIMUTH"])
+
+
+    def test_blank_commands_are_skipped(self):
+        framer = CommandFramer()
+
+        self.assertEqual(framer.feed(b"\r\n  \r\nGET_AZIMUTH \r\r"), ["GET_AZIMUTH"])
+
+
+    def test_unterminated_commands_are_flushed_until_a_delimiter_is_seen(self):
+        framer = CommandFramer()
+
+        self.assertIsNone(framer.flushTimeout)
+        self.assertEqual(framer.feed(b"GET_AZIMUTH"), [])
+        self.assertEqual(framer.flushTimeout, CommandFramer.UNTERMINATED_COMMAND_TIMEOUT)
+        self.assertEqual(framer.flush(), ["GET_AZIMUTH"])
+        self.assertIsNone(framer.flushTimeout)
+
+        # Once the client has terminated a command, the framer waits for the delimiter of every partial command
+        framer.feed(b"GET_ELEVATION\rGET_")
+        self.assertIsNone(framer.flushTimeout)
+
+
+    def test_overlong_commands_are_discarded(self):
+        framer = CommandFramer()
+
+        self.assertEqual(framer.feed(b"X"*(CommandFramer.MAXIMUM_COMMAND_LENGTH + 1)), [])
+        self.assertEqual(framer.feed(b"\rGET_AZIMUTH\r"), ["GET_AZIMUTH"])
+
+
+if __name__ == "__main__":
+    unittest.main()
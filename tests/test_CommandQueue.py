@@ -0,0 +1,104 @@
+import time
+import unittest
+from threading import Event, Thread
+
+from CommandQueue import CommandDropped, CommandPriority, CommandQueue
+
+
+class CommandQueueTests(unittest.TestCase):
+    def setUp(self):
+        self.queue = CommandQueue("Test Queue")
+        self.executed = []
+        self.dropped = []
+        self.threads = []
+        self._busy = Event()
+        self._release = Event()
+
+        # Holds the connection, so that the commands queued behind it wait
+        self.submit(CommandPriority.TELEMETRY, "busy", lambda: (self._busy.set(), self._release.wait(2.000)))
+        self.assertTrue(self._busy.wait(2.000))
+
+
+    def tearDown(self):
+        self._release.set()
+        for thread in self.threads:
+            thread.join(2.000)
+
+
+    def submit(self, priority: CommandPriority, name: str, command=None, maximumWait: float = None):
+        def execute():
+            try:
+                self.queue.execute(priority, command or (lambda: self.executed.append(name)), maximumWait)
+            except CommandDropped:
+                self.dropped.append(name)
+
+        thread = Thread(target=execute)
+        thread.start()
+        self.threads.append(thread)
+
+
+    def waitForDepth(self, depth: int):
+        deadline = time.monotonic() + 2.000
+        while (self.queue.depth != depth) and (time.monotonic() < deadline):
+            time.sleep(0.001)
+        self.assertEqual(self.queue.depth, depth)
+
+
+    def releaseAndJoin(self):
+        self._release.set()
+        for thread in self.threads:
+            thread.join(2.000)
+
+
+    def test_commands_are_executed_in_order_of_priority_and_arrival(self):
+        self.submit(CommandPriority.TELEMETRY, "telemetry 1")
+        self.waitForDepth(1)
+        self.submit(CommandPriority.CONTROL, "control 1")
+        self.waitForDepth(2)
+        self.submit(CommandPriority.TELEMETRY, "telemetry 2")
+        self.waitForDepth(3)
+        self.submit(CommandPriority.CONTROL, "control 2")
+        self.waitForDepth(4)
+
+        self.releaseAndJoin()
+
+        self.assertEqual(self.executed, ["control 1", "control 2", "telemetry 1", "telemetry 2"])
+        self.assertEqual(self.queue.statistics.executed[CommandPriority.CONTROL], 2)
+
+
+    def test_an_emergency_command_supersedes_the_waiting_control_commands(self):
+        self.submit(CommandPriority.CONTROL, "control")
+        self.waitForDepth(1)
+        self.submit(CommandPriority.TELEMETRY, "telemetry")
+        self.waitForDepth(2)
+        self.submit(CommandPriority.EMERGENCY, "stop")
+
+        deadline = time.monotonic() + 2.000
+        while (not self.dropped) and (time.monotonic() < deadline):
+            time.sleep(0.001)
+
+        self.releaseAndJoin()
+
+        self.assertEqual(self.dropped, ["control"])
+        self.assertEqual(self.executed, ["stop", "telemetry"])
+
+
+    def test_a_command_is_dropped_after_its_maximum_wait(self):
+        self.submit(CommandPriority.TELEMETRY, "stale", maximumWait=0.020)
+        self.threads[-1].join(2.000)
+
+        self.assertEqual(self.dropped, ["stale"])
+        self.assertEqual(self.queue.statistics.dropped[CommandPriority.TELEMETRY], 1)
+        self.assertEqual(self.queue.depth, 0)
+
+
+    def test_exceptions_of_the_command_are_propagated_and_release_the_connection(self):
+        self.releaseAndJoin()
+
+        with self.assertRaises(ZeroDivisionError):
+            self.queue.execute(CommandPriority.CONTROL, lambda: 1/0)
+        self.assertEqual(self.queue.execute(CommandPriority.CONTROL, lambda: 42), 42)
+
+
+if __name__ == "__main__":
+    unittest.main()
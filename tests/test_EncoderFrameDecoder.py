@@ -0,0 +1,77 @@
+import unittest
+
+from EncoderFrameDecoder import EncoderFrameDecoder, Position, decodeFrames
+
+SERIAL_ADDRESS = 0x01
+ONE_STEP = Position.DEGREES_PER_STEP/Position.GEARBOX_REDUCTION
+
+
+def createFrame(revolution: int, step: int, address: int = SERIAL_ADDRESS, lrc: int = None) -> bytes:
+    if lrc is None:
+        lrc = address ^ (revolution >> 8) ^ (revolution & 0xFF) ^ (step >> 8) ^ (step & 0xFF)
+    return bytes((EncoderFrameDecoder.START_OF_HEADER, address, revolution >> 8, revolution & 0xFF, step >> 8, step & 0xFF, lrc, EncoderFrameDecoder.END_OF_TRANSMISSION))
+
+
+class PositionTests(unittest.TestCase):
+    def test_zero(self):
+        self.assertEqual(Position(step=0, revolution=0).angle, 0.0)
+
+
+    def test_counting_up_decreases_the_angle(self):
+        self.assertAlmostEqual(Position(step=1, revolution=0).angle, -ONE_STEP)
+        self.assertAlmostEqual(Position(step=192, revolution=0).angle, -0.1156, places=4)
+
+
+    def test_counting_down_from_zero_increases_the_angle(self):
+        # The encoder counts down from revolution 4095 and step 8191 when it turns backwards through zero
+        self.assertAlmostEqual(Position(step=8191, revolution=4095).angle, ONE_STEP)
+        self.assertAlmostEqual(Position(step=8000, revolution=4095).angle, 0.1156, places=4)
+
+
+class EncoderFrameDecoderTests(unittest.TestCase):
+    def setUp(self):
+        self.decoder = EncoderFrameDecoder(SERIAL_ADDRESS)
+
+
+    def test_decodes_the_same_angle_as_the_position(self):
+        for revolution, step in ((0, 0), (0, 192), (4095, 8000), (12, 4567), (2047, 8191), (2048, 0), (4095, 8191)):
+            decodedFrame = self.decoder.decode(createFrame(revolution, step))
+
+            self.assertEqual((decodedFrame.revolution, decodedFrame.step), (revolution, step))
+            self.assertAlmostEqual(decodedFrame.angle, Position(step=step, revolution=revolution).angle, places=9)
+
+
+    def test_rejects_invalid_frames(self):
+        frame = createFrame(4095, 8000)
+
+        self.assertIsNone(self.decoder.decode(frame[:-1]))
+        self.assertIsNone(self.decoder.decode(b'\x00' + frame[1:]))
+        self.assertIsNone(self.decoder.decode(frame[:-1] + b'\x00'))
+        self.assertIsNone(self.decoder.decode(createFrame(4095, 8000, lrc=frame[6] ^ 0xFF)))
+        self.assertIsNone(self.decoder.decode(createFrame(4095, 8000, address=0x02)))
+
+
+    def test_rejects_counts_outside_of_the_range_of_the_encoder(self):
+        self.assertIsNone(self.decoder.decode(createFrame(Position.MAXIMUM_REVOLUTIONS, 0)))
+        self.assertIsNone(self.decoder.decode(createFrame(0, Position.STEPS_PER_REVOLUTION)))
+
+
+    def test_batch_decoding_matches_the_decoder(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest("NumPy is not installed")
+
+        frames = [createFrame(0, 192), createFrame(4095, 8000), createFrame(4095, 8000, lrc=0), createFrame(4096, 0), createFrame(1000, 1234)]
+        decodedFrames = decodeFrames(b''.join(frames), SERIAL_ADDRESS)
+
+        self.assertEqual(decodedFrames.valid.tolist(), [True, True, False, False, True])
+        for frame, valid, angle in zip(frames, decodedFrames.valid, decodedFrames.angles):
+            if valid:
+                self.assertAlmostEqual(angle, self.decoder.decode(frame).angle, places=12)
+            else:
+                self.assertTrue(numpy.isnan(angle))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+from EncoderHistory import EncoderHistory
+
+
+class EncoderHistoryTests(unittest.TestCase):
+    def createHistory(self, capacity: int, count: int) -> EncoderHistory:
+        history = EncoderHistory(capacity)
+        for index in range(count):
+            history.append(float(index), 10.0*index, index, 100 + index)
+        return history
+
+
+    def test_the_capacity_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            EncoderHistory(0)
+
+
+    def test_the_oldest_samples_are_overwritten_once_full(self):
+        history = self.createHistory(4, 6)
+
+        self.assertEqual(len(history), 4)
+        self.assertEqual(list(history.latest(10).timestamps), [2.0, 3.0, 4.0, 5.0])
+        self.assertEqual(list(history.latest(2).angles), [40.0, 50.0])
+        self.assertEqual(list(history.latest(2).revolutions), [4, 5])
+        self.assertEqual(list(history.latest(2).steps), [104, 105])
+
+
+    def test_between_includes_both_ends_across_the_wrap(self):
+        history = self.createHistory(4, 6)
+
+        self.assertEqual(list(history.between(3.0, 5.0).timestamps), [3.0, 4.0, 5.0])
+        self.assertEqual(list(history.between(2.5, 3.5).timestamps), [3.0])
+        self.assertEqual(list(history.between(6.0, 7.0).timestamps), [])
+
+
+    def test_interpolate(self):
+        history = self.createHistory(4, 6)
+
+        self.assertAlmostEqual(history.interpolate(3.25), 32.5)
+        self.assertEqual(history.interpolate(4.0), 40.0)
+        self.assertIsNone(history.interpolate(1.5))
+        self.assertIsNone(history.interpolate(5.5))
+        self.assertIsNone(EncoderHistory(4).interpolate(0.0))
+
+
+    def test_clear(self):
+        history = self.createHistory(4, 3)
+        history.clear()
+
+        self.assertEqual(len(history), 0)
+        self.assertEqual(list(history.latest(4).timestamps), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+from Instrumentation import LatencyHistogram
+
+
+class LatencyHistogramTests(unittest.TestCase):
+    def test_an_empty_histogram(self):
+        histogram = LatencyHistogram()
+
+        self.assertEqual(histogram.count, 0)
+        self.assertEqual(histogram.percentile(99), 0.0)
+        self.assertEqual(histogram.mean, 0.0)
+
+
+    def test_percentiles_are_within_the_precision_of_the_buckets(self):
+        histogram = LatencyHistogram()
+        for microseconds in range(1, 10001):
+            histogram.record(microseconds*1e-6)
+
+        self.assertEqual(histogram.count, 10000)
+        # The latencies are recorded in whole microseconds
+        self.assertAlmostEqual(histogram.minimum, 1e-6, delta=1e-6)
+        self.assertAlmostEqual(histogram.maximum, 10000e-6, delta=1e-6)
+        self.assertAlmostEqual(histogram.mean, 5000.5e-6, delta=1e-6)
+
+        # Above the linear range, every bucket spans 1/64 of its value
+        for percentile in (50, 90, 99):
+            self.assertAlmostEqual(histogram.percentile(percentile), percentile*100e-6, delta=percentile*100e-6/64)
+        self.assertEqual(histogram.percentile(100), histogram.maximum)
+
+
+    def test_small_values_are_exact(self):
+        histogram = LatencyHistogram()
+        for microseconds in (3, 5, 7):
+            histogram.record(microseconds*1e-6)
+
+        self.assertAlmostEqual(histogram.percentile(50), 5e-6)
+
+
+    def test_reset(self):
+        histogram = LatencyHistogram()
+        histogram.record(0.010)
+        histogram.reset()
+
+        self.assertEqual(histogram.count, 0)
+        self.assertEqual(histogram.percentile(50), 0.0)
+        histogram.record(0.002)
+        self.assertAlmostEqual(histogram.percentile(100), 0.002, delta=0.002/64)
+
+
+    def test_merge(self):
+        first = LatencyHistogram()
+        second = LatencyHistogram()
+        first.record(0.001)
+        second.record(0.003)
+        second.record(0.005)
+        first.merge(second)
+
+        self.assertEqual(first.count, 3)
+        self.assertAlmostEqual(first.minimum, 0.001)
+        self.assertAlmostEqual(first.maximum, 0.005)
+        self.assertAlmostEqual(first.mean, 0.003)
+
+
+if __name__ == "__main__":
+    unittest.main()
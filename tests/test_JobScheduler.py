@@ -0,0 +1,113 @@
+import time
+import unittest
+from threading import Event
+
+from JobScheduler import JobScheduler
+
+
+class JobSchedulerTests(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = JobScheduler(name="Test Scheduler")
+
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+
+    def test_jobs_are_released_in_order_of_their_deadlines(self):
+        executed = []
+        done = Event()
+
+        self.scheduler.callLater(0.060, lambda: (executed.append("late"), done.set()))
+        self.scheduler.callLater(0.010, lambda: executed.append("early"))
+        self.scheduler.callLater(0.030, lambda: executed.append("middle"))
+
+        self.assertTrue(done.wait(2.000))
+        self.assertEqual(executed, ["early", "middle", "late"])
+
+
+    def test_a_call_later_job_runs_once(self):
+        executed = []
+        job = self.scheduler.callLater(0.010, lambda: executed.append(1))
+
+        time.sleep(0.100)
+
+        self.assertEqual(executed, [1])
+        self.assertFalse(job.isActive())
+
+
+    def test_next_deadline_is_fixed_rate_and_skips_missed_deadlines(self):
+        job = self.scheduler.createJob(0.100, lambda: None)
+
+        self.assertAlmostEqual(self.scheduler._nextDeadline(job, 1.000, 1.020), 1.100)
+        self.assertEqual(job.statistics.missedDeadlines, 0)
+
+        # Two deadlines have passed while the job was executing, so the next one is the first deadline that is still ahead
+        self.assertAlmostEqual(self.scheduler._nextDeadline(job, 1.000, 1.250), 1.300)
+        self.assertEqual(job.statistics.missedDeadlines, 2)
+
+
+    def test_a_periodic_job_keeps_running_until_it_is_stopped(self):
+        executed = []
+        job = self.scheduler.schedule(0.010, lambda: executed.append(1))
+
+        time.sleep(0.100)
+        job.stop()
+        runs = len(executed)
+        time.sleep(0.050)
+
+        self.assertGreater(runs, 3)
+        self.assertEqual(len(executed), runs)
+        self.assertFalse(job.isActive())
+
+
+    def test_remove_waits_for_the_execution_in_flight(self):
+        started = Event()
+        finished = Event()
+
+        def execute():
+            started.set()
+            time.sleep(0.100)
+            finished.set()
+
+        job = self.scheduler.callLater(0.000, execute, blocking=True)
+        self.assertTrue(started.wait(2.000))
+
+        self.assertTrue(job.stop(wait=True, timeout=2.000))
+        self.assertTrue(finished.is_set())
+
+
+    def test_remove_without_waiting_reports_the_execution_in_flight(self):
+        started = Event()
+        release = Event()
+
+        def execute():
+            started.set()
+            release.wait(2.000)
+
+        job = self.scheduler.callLater(0.000, execute, blocking=True)
+        self.assertTrue(started.wait(2.000))
+
+        self.assertFalse(job.stop())
+        self.assertFalse(job.stop(wait=True, timeout=0.010))
+
+        release.set()
+        self.assertTrue(job.stop(wait=True, timeout=2.000))
+
+
+    def test_a_job_can_stop_itself_while_waiting(self):
+        results = []
+        done = Event()
+
+        def execute():
+            results.append(job.stop(wait=True, timeout=1.000))
+            done.set()
+
+        job = self.scheduler.schedule(0.010, execute)
+
+        self.assertTrue(done.wait(2.000))
+        self.assertEqual(results, [True])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+
+from MotionProfile import TrapezoidalProfile, estimateMoveTime
+
+
+class TrapezoidalProfileTests(unittest.TestCase):
+    def assertProfileIsContinuous(self, profile: TrapezoidalProfile):
+        for previousSegment, segment in zip(profile.segments, profile.segments[1:]):
+            endPoint = previousSegment.endPoint
+            self.assertAlmostEqual(endPoint.position, segment.startPosition, places=9)
+            self.assertAlmostEqual(endPoint.velocity, segment.startVelocity, places=9)
+
+
+    def test_a_long_move_cruises_at_the_maximum_velocity(self):
+        profile = TrapezoidalProfile(0.0, 100.0, maximumVelocity=10.0, maximumAcceleration=5.0)
+
+        self.assertEqual(len(profile.segments), 3)
+        self.assertAlmostEqual(profile.peakVelocity, 10.0)
+        self.assertAlmostEqual(profile.duration, 12.0)
+        self.assertAlmostEqual(profile.duration, estimateMoveTime(100.0, 10.0, 5.0))
+        self.assertProfileIsContinuous(profile)
+
+
+    def test_a_short_move_has_a_triangular_velocity_profile(self):
+        profile = TrapezoidalProfile(10.0, 5.0, maximumVelocity=10.0, maximumAcceleration=5.0)
+
+        self.assertEqual(len(profile.segments), 2)
+        self.assertAlmostEqual(profile.peakVelocity, 5.0)
+        self.assertAlmostEqual(profile.duration, 2.0)
+        self.assertAlmostEqual(profile.duration, estimateMoveTime(-5.0, 10.0, 5.0))
+        self.assertAlmostEqual(profile.sample(1.0).velocity, -5.0)
+        self.assertProfileIsContinuous(profile)
+
+
+    def test_the_profile_ends_at_rest_on_the_target(self):
+        profile = TrapezoidalProfile(0.0, 30.0, maximumVelocity=10.0, maximumAcceleration=5.0)
+
+        self.assertFalse(profile.isFinished(profile.duration - 0.001))
+        self.assertTrue(profile.isFinished(profile.duration))
+        self.assertAlmostEqual(profile.segments[-1].endPoint.position, 30.0)
+        self.assertAlmostEqual(profile.segments[-1].endPoint.velocity, 0.0)
+        self.assertEqual(tuple(profile.sample(profile.duration + 1.0)), (30.0, 0.0, 0.0))
+
+
+    def test_a_start_velocity_away_from_the_target_is_stopped_first(self):
+        profile = TrapezoidalProfile(0.0, 10.0, maximumVelocity=10.0, maximumAcceleration=5.0, startVelocity=-5.0)
+
+        self.assertAlmostEqual(profile.segments[0].duration, 1.0)
+        self.assertAlmostEqual(profile.segments[0].endPoint.position, -2.5)
+        self.assertAlmostEqual(profile.segments[-1].endPoint.position, 10.0)
+        self.assertProfileIsContinuous(profile)
+
+
+    def test_a_start_velocity_too_high_to_stop_overshoots_and_returns(self):
+        profile = TrapezoidalProfile(0.0, 1.0, maximumVelocity=10.0, maximumAcceleration=5.0, startVelocity=10.0)
+
+        self.assertAlmostEqual(profile.segments[0].endPoint.position, 10.0)
+        self.assertAlmostEqual(profile.segments[-1].endPoint.position, 1.0)
+        self.assertProfileIsContinuous(profile)
+
+
+    def test_a_move_without_a_distance_is_empty(self):
+        profile = TrapezoidalProfile(3.0, 3.0, maximumVelocity=10.0, maximumAcceleration=5.0)
+
+        self.assertEqual(profile.duration, 0.0)
+        self.assertTrue(profile.isFinished(0.0))
+
+
+    def test_the_limits_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            TrapezoidalProfile(0.0, 1.0, maximumVelocity=0.0, maximumAcceleration=5.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
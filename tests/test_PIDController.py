@@ -0,0 +1,90 @@
+import unittest
+
+from PIDController import PIDController
+
+
+class PIDControllerTests(unittest.TestCase):
+    def test_a_measurement_above_the_setpoint_gives_a_positive_output(self):
+        controller = PIDController(2.0, 0.0, 0.0, outputLimit=10.0)
+
+        self.assertAlmostEqual(controller.update(setpoint=1.0, measurement=2.5, timeStep=0.05), 3.0)
+        self.assertAlmostEqual(controller.update(setpoint=1.0, measurement=0.5, timeStep=0.05), -1.0)
+
+
+    def test_the_output_is_saturated(self):
+        controller = PIDController(2.0, 0.0, 0.0, outputLimit=5.0)
+
+        self.assertEqual(controller.update(setpoint=0.0, measurement=10.0, timeStep=0.05), 5.0)
+        self.assertEqual(controller.update(setpoint=0.0, measurement=-10.0, timeStep=0.05), -5.0)
+
+
+    def test_the_integral_accumulates_the_error(self):
+        controller = PIDController(0.0, 2.0, 0.0, outputLimit=10.0)
+
+        for _ in range(10):
+            output = controller.update(setpoint=0.0, measurement=0.5, timeStep=0.1)
+
+        self.assertAlmostEqual(controller.integral, 1.0)
+        self.assertAlmostEqual(output, 1.0)
+
+
+    def test_the_integral_does_not_wind_up_while_saturated(self):
+        controller = PIDController(1.0, 1.0, 0.0, outputLimit=5.0)
+
+        for _ in range(100):
+            controller.update(setpoint=0.0, measurement=10.0, timeStep=0.1)
+
+        self.assertEqual(controller.integral, 0.0)
+
+        # Without any wound up integral, the output follows the error as soon as it drops below the limit
+        self.assertAlmostEqual(controller.update(setpoint=0.0, measurement=1.0, timeStep=0.1), 1.1)
+
+
+    def test_the_integral_unwinds_while_the_error_drives_the_output_out_of_saturation(self):
+        controller = PIDController(1.0, 1.0, 1.0, outputLimit=5.0)
+
+        # The derivative saturates the output upwards, while the error integrates downwards
+        output = controller.update(setpoint=0.0, measurement=-0.5, timeStep=0.1, measurementRate=10.0)
+
+        self.assertEqual(output, 5.0)
+        self.assertAlmostEqual(controller.integral, -0.05)
+
+
+    def test_the_integral_can_be_held(self):
+        controller = PIDController(1.0, 1.0, 0.0, outputLimit=5.0)
+        controller.update(setpoint=0.0, measurement=1.0, timeStep=0.1, integrate=False)
+
+        self.assertEqual(controller.integral, 0.0)
+
+
+    def test_a_setpoint_change_does_not_kick_the_derivative(self):
+        controller = PIDController(0.0, 0.0, 1.0, outputLimit=100.0)
+        controller.update(setpoint=0.0, measurement=1.0, timeStep=0.1)
+
+        self.assertEqual(controller.update(setpoint=50.0, measurement=1.0, timeStep=0.1), 0.0)
+        self.assertAlmostEqual(controller.update(setpoint=50.0, measurement=1.5, timeStep=0.1), 5.0)
+
+
+    def test_the_derivative_is_filtered(self):
+        controller = PIDController(0.0, 0.0, 1.0, outputLimit=100.0, derivativeFilterTime=0.1)
+        output = controller.update(setpoint=0.0, measurement=0.0, timeStep=0.1, measurementRate=10.0)
+
+        self.assertAlmostEqual(output, 5.0)
+
+
+    def test_the_setpoint_rate_is_fed_forward(self):
+        controller = PIDController(0.0, 0.0, 0.0, outputLimit=100.0, velocityFeedforwardGain=0.5)
+
+        self.assertAlmostEqual(controller.update(setpoint=0.0, measurement=0.0, timeStep=0.1, setpointRate=4.0), -2.0)
+
+
+    def test_reset(self):
+        controller = PIDController(1.0, 1.0, 1.0, outputLimit=5.0)
+        controller.update(setpoint=0.0, measurement=1.0, timeStep=0.1)
+        controller.reset()
+
+        self.assertEqual((controller.integral, controller.derivative, controller.output), (0.0, 0.0, 0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import random
+import unittest
+
+from ScanPlan import ScanPlanOptimizer, ScanPoint
+
+
+class ScanPlanOptimizerTests(unittest.TestCase):
+    def createOptimizer(self, approachDirection: int = 0) -> ScanPlanOptimizer:
+        return ScanPlanOptimizer(-90.0, 90.0, maximumVelocity=12.0, maximumAcceleration=6.0, approachDirection=approachDirection, approachDistance=1.0)
+
+
+    def test_points_are_swept_in_one_direction(self):
+        points = [ScanPoint(angle) for angle in (30.0, -20.0, 10.0, -5.0, 40.0)]
+        plan = self.createOptimizer().optimize(points, startPosition=-30.0)
+
+        self.assertEqual([point.angle for point in plan.points], [-20.0, -5.0, 10.0, 30.0, 40.0])
+        self.assertEqual(sorted(plan.order), list(range(len(points))))
+        self.assertLess(plan.optimizedTime, plan.originalTime)
+
+
+    def test_the_original_order_is_kept_when_it_is_the_fastest(self):
+        points = [ScanPoint(angle, dwellTime=1.0) for angle in (10.0, 20.0, 30.0)]
+        optimizer = self.createOptimizer()
+        plan = optimizer.optimize(points, startPosition=0.0)
+
+        self.assertEqual(plan.order, [0, 1, 2])
+        self.assertAlmostEqual(plan.optimizedTime, plan.originalTime)
+        self.assertAlmostEqual(plan.originalTime, optimizer.estimateTime(points, 0.0))
+
+
+    def test_reordering_can_be_disabled(self):
+        points = [ScanPoint(angle) for angle in (30.0, -20.0, 10.0)]
+        plan = self.createOptimizer().optimize(points, startPosition=0.0, reorder=False)
+
+        self.assertEqual(plan.order, [0, 1, 2])
+
+
+    def test_points_approached_against_the_approach_direction_get_an_approach_position(self):
+        points = [ScanPoint(angle) for angle in (10.0, 5.0)]
+        plan = self.createOptimizer(approachDirection=1).optimize(points, startPosition=0.0, reorder=False)
+
+        self.assertEqual([point.approachPosition for point in plan.points], [None, 4.0])
+        self.assertAlmostEqual(plan.optimizedTime, self.createOptimizer(approachDirection=1).estimateTime(plan.points, 0.0))
+
+
+    def test_points_outside_of_the_limits_are_rejected(self):
+        with self.assertRaises(ValueError):
+            self.createOptimizer().optimize([ScanPoint(0.0), ScanPoint(91.0)], startPosition=0.0)
+
+
+    def test_the_batched_order_times_match_the_single_order_times(self):
+        generator = random.Random(0)
+        angles = [generator.uniform(-90.0, 90.0) for _ in range(50)]
+
+        for approachDirection in (0, 1, -1):
+            optimizer = self.createOptimizer(approachDirection)
+            orders = [list(range(len(angles)))] + optimizer._candidateOrders(angles, 12.0)
+            expectedTimes = [optimizer._estimateOrderTime(angles, order, 12.0) for order in orders]
+
+            for time, expectedTime in zip(optimizer._estimateOrderTimes(angles, orders, 12.0), expectedTimes):
+                self.assertAlmostEqual(time, expectedTime, places=9)
+
+
+    def test_an_empty_plan(self):
+        plan = self.createOptimizer().optimize([], startPosition=0.0)
+
+        self.assertEqual((plan.points, plan.order, plan.optimizedTime), ([], [], 0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
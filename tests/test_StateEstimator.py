@@ -0,0 +1,46 @@
+import unittest
+
+from ShaftEncoderModel import PositionSample
+from StateEstimator import StateEstimator
+
+
+class StateEstimatorTests(unittest.TestCase):
+    def test_the_first_sample_initialises_the_angle(self):
+        estimator = StateEstimator(0.5, 0.1, 0.01)
+        state = estimator.update(PositionSample(angle=12.0, timestamp=1.0, sequence=1))
+
+        self.assertEqual(state.angle, 12.0)
+        self.assertEqual(state.velocity, 0.0)
+        self.assertEqual(state.sequence, 1)
+
+
+    def test_converges_to_a_constant_velocity(self):
+        estimator = StateEstimator(0.5, 0.1, 0.01)
+
+        for sequence in range(1, 500):
+            timestamp = 0.010*sequence
+            state = estimator.update(PositionSample(angle=5.0*timestamp, timestamp=timestamp, sequence=sequence))
+
+        self.assertAlmostEqual(state.angle, 5.0*timestamp, places=6)
+        self.assertAlmostEqual(state.velocity, 5.0, places=4)
+        self.assertAlmostEqual(state.acceleration, 0.0, places=3)
+
+
+    def test_a_sample_without_a_time_step_is_ignored(self):
+        estimator = StateEstimator(0.5, 0.1, 0.01)
+        estimator.update(PositionSample(angle=1.0, timestamp=1.0, sequence=1))
+        state = estimator.update(PositionSample(angle=2.0, timestamp=1.1, sequence=2))
+
+        self.assertIs(estimator.update(PositionSample(angle=9.0, timestamp=1.1, sequence=3)), state)
+
+
+    def test_reset(self):
+        estimator = StateEstimator(0.5, 0.1, 0.01)
+        estimator.update(PositionSample(angle=1.0, timestamp=1.0, sequence=1))
+        estimator.reset()
+
+        self.assertEqual(estimator.update(PositionSample(angle=3.0, timestamp=2.0, sequence=2)).angle, 3.0)
+
+
+if __name__ == "__main__":
+    unittest.main()